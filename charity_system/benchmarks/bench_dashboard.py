@@ -0,0 +1,58 @@
+"""Time to load the dashboard tiles: cold, cached, and after a new donation.
+
+Run from the charity_system directory:
+    python -m benchmarks.bench_dashboard --donations 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from database import db_connection
+from database_init import create_database
+from benchmarks.seed import populate
+from models.donation import Donation
+from services import analytics
+from gui.dashboard_view import TILES
+
+
+def load_tiles():
+    """Fetch every tile the way DashboardView does, returning ms per tile"""
+    timings = {}
+    for name, (_, fetch) in TILES.items():
+        started = time.perf_counter()
+        fetch()
+        timings[name] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donations', type=int, default=1_000_000)
+    parser.add_argument('--db', help='existing database file (default: seed a temporary one)')
+    args = parser.parse_args()
+
+    db_path = args.db
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        create_database(db_path)
+        print(f'Seeding {args.donations:,} donations into {db_path} ...')
+        populate(db_path, donations=args.donations)
+    db_connection.configure(db_path)
+
+    runs = [('cold', None), ('cached', None), ('after one donation', 'insert')]
+    print(f"{'run':20} " + ' '.join(f'{name:>16}' for name in TILES) + f" {'total ms':>9}")
+    donation_id = None
+    for label, action in runs:
+        if action == 'insert':
+            donation_id = Donation.create(10.0, None, True, 'benchmark', 1, None, 1)
+        timings = load_tiles()
+        print(f'{label:20} ' + ' '.join(f'{timings[name]:16.2f}' for name in TILES)
+              + f' {sum(timings.values()):9.2f}')
+    if donation_id:
+        Donation.delete(donation_id)
+    print(f'cache hits {analytics.cache.hits}, misses {analytics.cache.misses}')
+
+
+if __name__ == '__main__':
+    main()
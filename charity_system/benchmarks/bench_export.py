@@ -0,0 +1,51 @@
+"""Export throughput and memory for each output format.
+
+Run from the charity_system directory:
+    python -m benchmarks.bench_export --donations 5000000
+"""
+import argparse
+import os
+import resource
+import tempfile
+
+from database import db_connection
+from database_init import create_database
+from benchmarks.seed import populate
+from services.export import FORMATS, export_donations
+
+EXTENSIONS = {'csv': '.csv', 'jsonl': '.jsonl', 'columnar': '.col'}
+
+
+def max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donations', type=int, default=5_000_000)
+    parser.add_argument('--db', help='existing database file (default: seed a temporary one)')
+    args = parser.parse_args()
+
+    db_path = args.db
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        create_database(db_path)
+        print(f'Seeding {args.donations:,} donations into {db_path} ...')
+        populate(db_path, donations=args.donations)
+    db_connection.configure(db_path)
+    out_dir = tempfile.mkdtemp()
+
+    # Memory is sampled as the process high-water mark after each run, so a
+    # format that buffered its output would show up as growth here
+    print(f"{'format':10} {'rows':>11} {'seconds':>9} {'rows/s':>11} {'MB out':>9} {'max RSS MB':>11}")
+    for fmt in FORMATS:
+        path = os.path.join(out_dir, 'donations' + EXTENSIONS[fmt])
+        report = export_donations(path, fmt=fmt)
+        print(f'{fmt:10} {report.rows_written:11,} {report.elapsed:9.2f} '
+              f'{report.rows_per_second:11,.0f} {report.bytes_written / 2**20:9.1f} {max_rss_mb():11.1f}')
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
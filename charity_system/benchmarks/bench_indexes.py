@@ -0,0 +1,85 @@
+"""Lookup latency before and after the index migration.
+
+Run from the charity_system directory:
+    python -m benchmarks.bench_indexes --donations 1000000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from database import db_connection
+from database.migrations import MIGRATIONS, migrate
+from database_init import create_database
+from benchmarks.seed import populate
+from models.donation import Donation
+from models.donor import Donor
+from models.volunteer import Volunteer
+
+
+def time_call(func, *args, repeat=20):
+    """Median wall time of func(*args) in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def run_lookups():
+    return {
+        'Donation.search(donor_id)': time_call(Donation.search, None, 123),
+        'Donation.get_total_by_donor': time_call(Donation.get_total_by_donor, 123),
+        'Donation.get_total_by_event': time_call(Donation.get_total_by_event, 45),
+        'Donor.delete (dependency check)': time_call(Donor.delete, 123),
+        'Volunteer.delete (dependency check)': time_call(Volunteer.delete, 7),
+    }
+
+
+def drop_indexes(db_path):
+    conn = sqlite3.connect(db_path)
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'")]
+    for name in names:
+        conn.execute(f'DROP INDEX {name}')
+    conn.execute('DELETE FROM schema_version')
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donations', type=int, default=1_000_000)
+    parser.add_argument('--db', help='database file (default: temporary file)')
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'bench.db')
+    create_database(db_path)
+    print(f'Seeding {args.donations:,} donations into {db_path} ...')
+    populate(db_path, donations=args.donations)
+
+    drop_indexes(db_path)
+    db_connection.configure(db_path)
+    before = run_lookups()
+
+    conn = sqlite3.connect(db_path)
+    started = time.perf_counter()
+    migrate(conn, target=MIGRATIONS[0][0])
+    conn.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+    print(f'Index migration took {time.perf_counter() - started:.2f}s')
+
+    db_connection.configure(db_path)
+    after = run_lookups()
+
+    print(f"{'lookup':40} {'before ms':>12} {'after ms':>12}")
+    for name in before:
+        print(f'{name:40} {before[name]:12.3f} {after[name]:12.3f}')
+
+
+if __name__ == '__main__':
+    main()
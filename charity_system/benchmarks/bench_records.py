@@ -0,0 +1,82 @@
+"""Memory held by a full donation listing: sqlite3.Row lists versus records.
+
+Run from the charity_system directory:
+    python -m benchmarks.bench_records --donations 1000000
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from database import db_connection
+from database.db_connection import get_db
+from database_init import create_database
+from benchmarks.seed import populate
+from models.donation import DONATION_SELECT, Donation
+from models.records import fetch_records, record_cursor
+
+QUERY = DONATION_SELECT + ' ORDER BY d.donation_date DESC, d.donation_id DESC'
+
+
+def row_list():
+    """The pre-records Donation.get_all: a list of sqlite3.Row"""
+    with get_db() as conn:
+        return conn.execute(QUERY).fetchall()
+
+
+def record_list():
+    """Records without sharing the repeated name strings"""
+    with get_db() as conn:
+        cursor = record_cursor(conn)
+        cursor.execute(QUERY)
+        return fetch_records(cursor, 'DonationRecord')
+
+
+def stream_total():
+    """Sum every amount through the streaming iterator, keeping nothing"""
+    return sum(row.amount for row in Donation.iter_all())
+
+
+def measure(func):
+    """(peak MB, MB still held by the result, seconds) for one call"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak / 2**20, held / 2**20, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donations', type=int, default=1_000_000)
+    parser.add_argument('--db', help='existing database file (default: seed a temporary one)')
+    args = parser.parse_args()
+
+    db_path = args.db
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        create_database(db_path)
+        print(f'Seeding {args.donations:,} donations into {db_path} ...')
+        populate(db_path, donations=args.donations)
+    db_connection.configure(db_path)
+
+    cases = [
+        ('sqlite3.Row list', row_list),
+        ('record list', record_list),
+        ('records, shared strings', Donation.get_all),
+        ('iter_all (streaming)', stream_total),
+    ]
+    print(f"{'representation':26} {'peak MB':>9} {'held MB':>9} {'seconds':>9}")
+    for name, func in cases:
+        peak, held, elapsed = measure(func)
+        print(f'{name:26} {peak:9.1f} {held:9.1f} {elapsed:9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Donor search latency: LIKE scans versus the FTS5 index.
+
+Run from the charity_system directory:
+    python -m benchmarks.bench_search --donors 1000000
+"""
+import argparse
+import os
+import tempfile
+
+from database import db_connection
+from database.db_connection import get_db
+from database_init import create_database
+from benchmarks.bench_indexes import time_call
+from benchmarks.seed import populate
+from models.donor import Donor
+
+TERMS = ['Ashburton', 'alice wick', 'ab12 9cd', 'pen', 'Smith']
+
+
+def like_search(term):
+    """The pre-FTS Donor.search query"""
+    with get_db() as conn:
+        search_term = f'%{term}%'
+        return conn.execute('''
+            SELECT * FROM donors
+            WHERE first_name LIKE ?
+            OR surname LIKE ?
+            OR business_name LIKE ?
+            OR postcode LIKE ?
+        ''', (search_term, search_term, search_term, search_term)).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donors', type=int, default=1_000_000)
+    parser.add_argument('--db', help='database file (default: temporary file)')
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'bench.db')
+    create_database(db_path)
+    print(f'Seeding {args.donors:,} donors into {db_path} ...')
+    populate(db_path, donations=0, donors=args.donors)
+    db_connection.configure(db_path)
+
+    print(f"{'term':14} {'matches':>9} {'LIKE ms':>10} {'FTS ms':>10} {'FTS top 50 ms':>14}")
+    for term in TERMS:
+        matches = len(Donor.search(term))
+        like_ms = time_call(like_search, term, repeat=5)
+        fts_ms = time_call(Donor.search, term, repeat=5)
+        top_ms = time_call(Donor.search, term, 50, repeat=5)
+        print(f'{term:14} {matches:9,} {like_ms:10.2f} {fts_ms:10.2f} {top_ms:14.2f}')
+
+
+if __name__ == '__main__':
+    main()
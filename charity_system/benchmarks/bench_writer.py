@@ -0,0 +1,93 @@
+"""Donation inserts per second from concurrent writers: one commit each vs the write queue.
+
+Run from the charity_system directory:
+    python -m benchmarks.bench_writer --seconds 5 --writers 1 8 32
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from database import db_connection
+from database_init import create_database
+from database.writer import writer
+from benchmarks.seed import populate
+from models.donation import Donation
+
+INSERT = '''
+    INSERT INTO donations (amount, donation_date, gift_aid, notes, donor_id, event_id, collected_by)
+    VALUES (?, date('now'), 0, 'bench_writer', 1, NULL, 1)
+'''
+
+
+def commit_each(amount):
+    """What every model write did before the write queue: its own transaction"""
+    with db_connection.get_db() as conn:
+        cursor = conn.execute(INSERT, (amount,))
+        conn.commit()
+        return cursor.lastrowid
+
+
+def queued(amount):
+    return Donation.create(amount, None, False, 'bench_writer', 1, None, 1)
+
+
+def run(write, threads, seconds):
+    counts = [0] * threads
+    errors = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(index):
+        while time.perf_counter() < deadline:
+            try:
+                write(1.0)
+                counts[index] += 1
+            except sqlite3.OperationalError:
+                errors[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return sum(counts) / (time.perf_counter() - started), sum(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--writers', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--donations', type=int, default=100_000)
+    parser.add_argument('--db', help='existing database file (default: seed a temporary one)')
+    args = parser.parse_args()
+
+    db_path = args.db
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        create_database(db_path)
+        print(f'Seeding {args.donations:,} donations into {db_path} ...')
+        populate(db_path, donations=args.donations)
+
+    print(f"{'writers':>8} {'mode':>12} {'inserts/s':>10} {'errors':>7} {'mean group':>11}")
+    for threads in args.writers:
+        for mode, write in (('commit each', commit_each), ('write queue', queued)):
+            # A connection per writer, as each thread would hold its own
+            db_connection.configure(db_path, max_size=threads + 1)
+            before = writer.stats()
+            rate, errors = run(write, threads, args.seconds)
+            after = writer.stats()
+            commits = after['commits'] - before['commits']
+            group = (after['operations'] - before['operations']) / commits if commits else 1.0
+            print(f'{threads:8} {mode:>12} {rate:10,.0f} {errors:7} {group:11.1f}')
+
+    with db_connection.get_db() as conn:
+        conn.execute("DELETE FROM donations WHERE notes = 'bench_writer'")
+        conn.commit()
+    writer.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""Load generator for the JSON API: many keep-alive clients, latency percentiles.
+
+Starts `cli.py serve` on the given database in a child process (or targets
+--port of a server that is already running) and drives it with concurrent
+clients issuing a mix of listings, lookups and writes.
+
+Run from the charity_system directory:
+    python -m benchmarks.load_api --clients 200 --seconds 10 --db charity.db
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from database import db_connection
+from database_init import create_database
+from benchmarks.seed import populate
+
+# Share of requests of each kind; writes create a donation and delete it again
+MIX = (
+    ('list', 0.3),
+    ('get_donation', 0.3),
+    ('get_donor', 0.2),
+    ('search', 0.1),
+    ('write', 0.1),
+)
+
+
+async def request(reader, writer, method, path, body=None):
+    payload = json.dumps(body).encode() if body is not None else b''
+    writer.write((f'{method} {path} HTTP/1.1\r\nHost: load\r\n'
+                  f'Content-Length: {len(payload)}\r\n\r\n').encode() + payload)
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.lower() == b'content-length':
+            length = int(value)
+    data = await reader.readexactly(length) if length else b''
+    return status, data
+
+
+async def client(port, deadline, ids, latencies, statuses):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    kinds, weights = zip(*MIX)
+    donor_ids, donation_ids = ids
+    try:
+        while time.perf_counter() < deadline:
+            kind = random.choices(kinds, weights)[0]
+            started = time.perf_counter()
+            if kind == 'list':
+                status, _ = await request(reader, writer, 'GET', '/donations?limit=50')
+            elif kind == 'get_donation':
+                status, _ = await request(reader, writer, 'GET', f'/donations/{random.choice(donation_ids)}')
+            elif kind == 'get_donor':
+                status, _ = await request(reader, writer, 'GET', f'/donors/{random.choice(donor_ids)}')
+            elif kind == 'search':
+                status, _ = await request(reader, writer, 'GET', '/donors?q=smi&limit=20')
+            else:
+                status, data = await request(reader, writer, 'POST', '/donations', {
+                    'amount': 5.0, 'gift_aid': False, 'notes': 'load test',
+                    'donor_id': random.choice(donor_ids), 'collected_by': 1,
+                })
+                if status == 201:
+                    latencies[kind].append(time.perf_counter() - started)
+                    statuses[status] += 1
+                    started = time.perf_counter()
+                    donation_id = json.loads(data)['donation_id']
+                    status, _ = await request(reader, writer, 'DELETE', f'/donations/{donation_id}')
+            latencies[kind].append(time.perf_counter() - started)
+            statuses[status] += 1
+    finally:
+        writer.close()
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+async def run(port, clients, seconds, ids):
+    latencies = {kind: [] for kind, _ in MIX}
+    statuses = Counter()
+    started = time.perf_counter()
+    await asyncio.gather(*(client(port, started + seconds, ids, latencies, statuses)
+                           for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(values) for values in latencies.values())
+    print(f'{clients} clients, {total:,} requests in {elapsed:.1f}s: {total / elapsed:,.0f} req/s')
+    print(f"{'kind':14} {'count':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    everything = []
+    for kind, values in latencies.items():
+        values.sort()
+        everything.extend(values)
+        if values:
+            print(f'{kind:14} {len(values):8,} {percentile(values, 0.5):8.2f} '
+                  f'{percentile(values, 0.95):8.2f} {percentile(values, 0.99):8.2f}')
+    everything.sort()
+    print(f"{'all':14} {total:8,} {percentile(everything, 0.5):8.2f} "
+          f'{percentile(everything, 0.95):8.2f} {percentile(everything, 0.99):8.2f}')
+    print('statuses', dict(sorted(statuses.items())))
+
+
+def sample_ids(limit=1000):
+    with db_connection.get_db() as conn:
+        donors = [row[0] for row in conn.execute('SELECT donor_id FROM donors LIMIT ?', (limit,))]
+        donations = [row[0] for row in conn.execute(
+            'SELECT donation_id FROM donations ORDER BY random() LIMIT ?', (limit,))]
+    return donors, donations
+
+
+def wait_for_port(port, timeout=10.0):
+    async def probe():
+        _, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.close()
+    deadline = time.time() + timeout
+    while True:
+        try:
+            asyncio.run(probe())
+            return
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--external', action='store_true',
+                        help='use a server already listening on --port instead of starting one')
+    parser.add_argument('--donations', type=int, default=100_000)
+    parser.add_argument('--db', help='existing database file (default: seed a temporary one)')
+    args = parser.parse_args()
+
+    db_path = args.db
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        create_database(db_path)
+        print(f'Seeding {args.donations:,} donations into {db_path} ...')
+        populate(db_path, donations=args.donations)
+    db_connection.configure(db_path)
+    ids = sample_ids()
+
+    server = None
+    if not args.external:
+        server = subprocess.Popen(
+            [sys.executable, 'cli.py', '--db', db_path, 'serve', '--port', str(args.port),
+             '--readers', str(args.readers)], stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(args.port)
+        asyncio.run(run(args.port, args.clients, args.seconds, ids))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
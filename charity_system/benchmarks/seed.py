@@ -0,0 +1,210 @@
+"""Deterministic synthetic data for benchmarks.
+
+Fills the five tables created by database_init.create_database. The same
+seed and counts always produce the same rows. Activity is skewed the way
+real donation data is: a few donors, collectors and events account for
+most donations, amounts are log-normal with a long tail, December and
+weekends are busier, and donations at an event fall on its date.
+
+Run from the charity_system directory:
+    python -m benchmarks.seed charity_10m.db --donations 10000000
+"""
+import argparse
+import itertools
+import random
+import sqlite3
+from datetime import date, timedelta
+
+from database import aggregates
+
+FIRST_NAMES = ['Alice', 'Ben', 'Chloe', 'David', 'Emma', 'Farah', 'George', 'Hannah',
+               'Isaac', 'Jasmine', 'Kieran', 'Lucy', 'Mohammed', 'Nina', 'Oliver', 'Priya']
+SURNAMES = ['Smith', 'Jones', 'Taylor', 'Brown', 'Williams', 'Wilson', 'Johnson', 'Davies',
+            'Patel', 'Robinson', 'Wright', 'Thompson', 'Evans', 'Walker', 'Khan', 'Hughes']
+# Made-up surnames so name searches have realistic selectivity at scale
+SYLLABLES = ['ash', 'bur', 'cal', 'dun', 'el', 'far', 'gar', 'hol', 'ing', 'kel',
+             'lin', 'mor', 'nor', 'ock', 'pen', 'rad', 'sel', 'tor', 'ver', 'wick']
+RARE_SURNAMES = [(a + b + c).capitalize() for a in SYLLABLES for b in SYLLABLES
+                 for c in ('ton', 'ley', 'ford', 'by', 'well')]
+BUSINESS_SUFFIXES = ['Ltd', '& Sons', 'Trading', 'Partners', 'Group']
+EVENT_KINDS = ['Quiz Night', 'Fun Run', 'Bake Sale', 'Gala Dinner', 'Auction', 'Coffee Morning']
+ROLES = ['Steward', 'Collector', 'Setup', 'First Aid', 'Host']
+NOTES = ['In memory', 'Monthly gift', 'Cash in bucket', 'Matched by employer', 'Anonymous']
+
+# Donations are spread over this many days from START
+START = date(2015, 1, 1)
+DAYS = 3650
+
+# Pareto shape for donor, collector and event popularity (lower is more
+# skewed), and the cap on how many times busier than the quietest one any
+# of them can be
+SKEW = 1.5
+MAX_WEIGHT = 200
+# Share of donors that are businesses; they give more and never Gift Aid
+BUSINESS_SHARE = 0.08
+# Share of donations made at an event, and of individual gifts with Gift Aid
+EVENT_SHARE = 0.4
+GIFT_AID_SHARE = 0.45
+
+
+def default_counts(donations):
+    """Donor, volunteer and event counts in proportion to the donations"""
+    return {
+        'donors': max(1_000, donations // 20),
+        'volunteers': min(5_000, max(50, donations // 2_000)),
+        'events': min(50_000, max(100, donations // 500)),
+    }
+
+
+def cumulative_weights(rng, count):
+    return list(itertools.accumulate(
+        min(rng.paretovariate(SKEW), MAX_WEIGHT) for _ in range(count)))
+
+
+def day_weights():
+    """Busier in December and at weekends, and growing year on year"""
+    weights = []
+    for offset in range(DAYS + 1):
+        day = START + timedelta(days=offset)
+        weight = 1.0 + offset / DAYS
+        if day.month == 12:
+            weight *= 2.5
+        if day.weekday() >= 5:
+            weight *= 1.6
+        weights.append(weight)
+    return list(itertools.accumulate(weights))
+
+
+def populate(db_path, donations=1_000_000, donors=None, volunteers=None, events=None,
+             seed=42, batch_size=50_000):
+    """Fill an empty charity database with deterministic synthetic rows"""
+    counts = default_counts(donations)
+    donors = counts['donors'] if donors is None else donors
+    volunteers = counts['volunteers'] if volunteers is None else volunteers
+    events = counts['events'] if events is None else events
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+
+    conn.executemany(
+        'INSERT INTO volunteers (first_name, surname, phone_number, email, join_date) '
+        'VALUES (?, ?, ?, ?, ?)',
+        ((rng.choice(FIRST_NAMES), rng.choice(SURNAMES), f'07{i:09d}',
+          f'volunteer{i}@example.org', (START + timedelta(days=rng.randint(0, DAYS))).isoformat())
+         for i in range(volunteers)))
+
+    business = bytearray(donors + 1)
+
+    def donor_rows():
+        for i in range(1, donors + 1):
+            surname = rng.choice(SURNAMES) if rng.random() < 0.3 else rng.choice(RARE_SURNAMES)
+            business_name = None
+            if rng.random() < BUSINESS_SHARE:
+                business[i] = 1
+                business_name = f'{surname} {rng.choice(BUSINESS_SUFFIXES)}'
+            yield (rng.choice(FIRST_NAMES), surname, business_name,
+                   f'AB{rng.randint(1, 99)} {rng.randint(1, 9)}CD', str(rng.randint(1, 200)),
+                   f'01{i:09d}', 'business' if business_name else 'individual')
+
+    conn.executemany(
+        'INSERT INTO donors (first_name, surname, business_name, postcode, house_number, '
+        'phone_number, donor_type) VALUES (?, ?, ?, ?, ?, ?, ?)', donor_rows())
+
+    event_days = [rng.randint(0, DAYS) for _ in range(events)]
+    conn.executemany(
+        'INSERT INTO events (event_name, room_name, booking_date, booking_time, cost, organizer_id) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        ((f'{rng.choice(EVENT_KINDS)} {i}', f'Room {rng.randint(1, 20)}',
+          (START + timedelta(days=event_days[i - 1])).isoformat(),
+          f'{rng.randint(9, 20):02d}:00', round(rng.uniform(50, 2000), 2),
+          rng.randint(1, volunteers)) for i in range(1, events + 1)))
+
+    conn.executemany(
+        'INSERT INTO event_volunteers (event_id, volunteer_id, role) VALUES (?, ?, ?)',
+        ((event_id, volunteer_id, rng.choice(ROLES))
+         for event_id in range(1, events + 1)
+         for volunteer_id in rng.sample(range(1, volunteers + 1), min(volunteers, rng.randint(0, 6)))))
+
+    donor_weights = cumulative_weights(rng, donors)
+    collector_weights = cumulative_weights(rng, volunteers)
+    event_weights = cumulative_weights(rng, events)
+    days = day_weights()
+    dates = [(START + timedelta(days=offset)).isoformat() for offset in range(DAYS + 1)]
+    donor_ids = range(1, donors + 1)
+    volunteer_ids = range(1, volunteers + 1)
+    event_ids = range(1, events + 1)
+    offsets = range(DAYS + 1)
+
+    # The per-row triggers on donations (totals, table versions, change log)
+    # dominate load time; drop them for the bulk insert and restore them
+    # afterwards, rebuilding the totals they would have kept
+    triggers = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'donations'"
+    ).fetchall()
+    for name, _ in triggers:
+        conn.execute(f'DROP TRIGGER {name}')
+
+    remaining = donations
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        remaining -= size
+        batch_donors = rng.choices(donor_ids, cum_weights=donor_weights, k=size)
+        batch_collectors = rng.choices(volunteer_ids, cum_weights=collector_weights, k=size)
+        batch_events = rng.choices(event_ids, cum_weights=event_weights, k=size) if events else [None] * size
+        batch_days = rng.choices(offsets, cum_weights=days, k=size)
+        rows = []
+        for donor_id, collector, event_id, offset in zip(
+                batch_donors, batch_collectors, batch_events, batch_days):
+            if event_id is not None and rng.random() < EVENT_SHARE:
+                offset = event_days[event_id - 1]
+            else:
+                event_id = None
+            amount = min(rng.lognormvariate(3.0, 1.1), 25_000)
+            if business[donor_id]:
+                amount *= 5
+                gift_aid = False
+            else:
+                gift_aid = rng.random() < GIFT_AID_SHARE
+            rows.append((max(1.0, round(amount, 2)), dates[offset], gift_aid,
+                         rng.choice(NOTES) if rng.random() < 0.05 else None,
+                         donor_id, event_id, collector))
+        conn.executemany(
+            'INSERT INTO donations (amount, donation_date, gift_aid, notes, donor_id, '
+            'event_id, collected_by) VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    for _, sql in triggers:
+        conn.execute(sql)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'donation_totals'").fetchone():
+        aggregates.rebuild(conn)
+    # Seeded rows are not edits anyone needs to hear about
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'change_log'").fetchone():
+        conn.execute('DELETE FROM change_log')
+    conn.commit()
+    conn.close()
+
+
+def main():
+    from database_init import create_database
+
+    parser = argparse.ArgumentParser(description='Create a database filled with synthetic data')
+    parser.add_argument('db', help='database file to create')
+    parser.add_argument('--donations', type=int, default=1_000_000)
+    parser.add_argument('--donors', type=int, help='default: one per 20 donations')
+    parser.add_argument('--volunteers', type=int, help='default: one per 2,000 donations')
+    parser.add_argument('--events', type=int, help='default: one per 500 donations')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    create_database(args.db)
+    populate(args.db, donations=args.donations, donors=args.donors,
+             volunteers=args.volunteers, events=args.events, seed=args.seed)
+    with sqlite3.connect(args.db) as conn:
+        for table in ('donors', 'volunteers', 'events', 'event_volunteers', 'donations'):
+            count = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            print(f'{table:17} {count:>12,}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""Time every model read path and the data side of each view, as JSON.
+
+Seeds a database at the requested scale (or uses --db), runs each case
+--repeat times and writes median/min milliseconds per case. Given
+--compare with an earlier results file, prints the ratio per case and
+exits non-zero when any case got slower than --threshold times.
+
+Run from the charity_system directory:
+    python -m benchmarks.suite --donations 1000000 --out before.json
+    python -m benchmarks.suite --db <same file> --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from database import db_connection
+from database.db_connection import get_db
+from database_init import create_database
+from benchmarks.seed import populate
+from models.cache import records
+from models.donation import Donation
+from models.donor import Donor
+from models.event import Event
+from models.records import PAGE_SIZE
+from models.scheduling import find_all_conflicts
+from models.volunteer import Volunteer
+from services import analytics
+
+# get_all on donations materializes every row; past this many it is skipped
+GET_ALL_LIMIT = 2_000_000
+
+# Views whose refresh runs fetch() and turns each row into a tree item:
+# name -> (module, class, fetch, item method)
+VIEWS = {
+    'DonorView': ('gui.donor_view', 'DonorView', Donor.get_all, 'donor_item'),
+    'VolunteerView': ('gui.volunteer_view', 'VolunteerView', Volunteer.get_all, 'volunteer_item'),
+    'EventView': ('gui.event_view', 'EventView', Event.get_all, 'event_item'),
+    'DonationView': ('gui.donation_view', 'DonationView',
+                     lambda: Donation.get_page(None, PAGE_SIZE), 'donation_item'),
+}
+
+
+def sample(conn):
+    """Ids for the cases: the busiest and a typical donor, event and collector"""
+    def busiest(column):
+        return conn.execute(f'''
+            SELECT {column} FROM donations WHERE {column} IS NOT NULL
+            GROUP BY {column} ORDER BY COUNT(*) DESC LIMIT 1
+        ''').fetchone()[0]
+
+    def typical(table, column):
+        return conn.execute(f'SELECT MAX({column}) / 2 FROM {table}').fetchone()[0] or 1
+
+    return {
+        'busy_donor': busiest('donor_id'),
+        'busy_event': busiest('event_id'),
+        'busy_collector': busiest('collected_by'),
+        'donor': typical('donors', 'donor_id'),
+        'event': typical('events', 'event_id'),
+        'donation': typical('donations', 'donation_id'),
+        'volunteer': typical('volunteers', 'volunteer_id'),
+    }
+
+
+def uncached(get_by_id):
+    """get_by_id without the record cache, so every call hits the database"""
+    return get_by_id.__wrapped__
+
+
+def model_cases(ids, donations):
+    cases = {
+        'Donor.get_all': (Donor.get_all,),
+        'Donor.get_page': (Donor.get_page,),
+        'Donor.get_by_id': (uncached(Donor.get_by_id), ids['donor']),
+        'Donor.search(smith)': (Donor.search, 'smith'),
+        'Donor.search(smi, 50)': (Donor.search, 'smi', 50),
+        'Donor.delete(check)': (Donor.delete, ids['busy_donor']),
+        'Volunteer.get_all': (Volunteer.get_all,),
+        'Volunteer.get_by_id': (uncached(Volunteer.get_by_id), ids['volunteer']),
+        'Volunteer.search(taylor)': (Volunteer.search, 'taylor'),
+        'Volunteer.delete(check)': (Volunteer.delete, ids['busy_collector']),
+        'Event.get_all': (Event.get_all,),
+        'Event.get_by_id': (uncached(Event.get_by_id), ids['event']),
+        'Event.search(quiz)': (Event.search, 'quiz'),
+        'Event.get_event_volunteers': (Event.get_event_volunteers, ids['event']),
+        'Event.delete(check)': (Event.delete, ids['busy_event']),
+        'scheduling.find_all_conflicts': (find_all_conflicts,),
+        'Donation.get_page': (Donation.get_page,),
+        'Donation.get_by_id': (uncached(Donation.get_by_id), ids['donation']),
+        'Donation.search(donor)': (Donation.search, None, ids['busy_donor']),
+        'Donation.search(event)': (Donation.search, None, None, None, ids['busy_event']),
+        'Donation.search(collector)': (Donation.search, None, None, ids['busy_collector']),
+        'Donation.get_page(smith)': (Donation.get_page, None, PAGE_SIZE, 'smith'),
+        'Donation.get_total_by_donor': (Donation.get_total_by_donor, ids['busy_donor']),
+        'Donation.get_total_by_event': (Donation.get_total_by_event, ids['busy_event']),
+        'analytics.rollup(month)': (analytics.rollup, 'month'),
+        'analytics.rollup(week)': (analytics.rollup, 'week'),
+        'analytics.event_roi': (analytics.event_roi,),
+        'analytics.collector_stats': (analytics.collector_stats,),
+        'analytics.summary': (analytics.summary,),
+    }
+    if donations <= GET_ALL_LIMIT:
+        cases['Donation.get_all'] = (Donation.get_all,)
+    return cases
+
+
+def view_cases():
+    """Fetch plus row formatting for each view, without a display.
+
+    Views whose module cannot be imported here (tkcalendar missing, no
+    tkinter) are reported with the reason instead of a timing.
+    """
+    import importlib
+
+    cases, skipped = {}, {}
+    for name, (module_name, class_name, fetch, item) in VIEWS.items():
+        try:
+            view = getattr(importlib.import_module(module_name), class_name)
+        except ImportError as e:
+            skipped[f'view:{name}'] = str(e)
+            continue
+        make_item = getattr(view, item)
+
+        def populate_view(fetch=fetch, make_item=make_item):
+            return [make_item(None, row) for row in fetch()]
+        cases[f'view:{name}'] = (populate_view,)
+    try:
+        from gui.dashboard_view import TILES
+    except ImportError as e:
+        skipped['view:DashboardView'] = str(e)
+    else:
+        cases['view:DashboardView'] = (lambda: [fetch() for _, fetch in TILES.values()],)
+    return cases, skipped
+
+
+def time_case(func, args, repeat):
+    """Median and min wall time in ms, and the size of the result"""
+    samples = []
+    for _ in range(repeat):
+        # Report and record caches would turn every repeat into a hit
+        analytics.cache.clear()
+        records.clear()
+        started = time.perf_counter()
+        result = func(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    try:
+        rows = len(result)
+    except TypeError:
+        rows = None
+    return {'median_ms': round(samples[len(samples) // 2], 3),
+            'min_ms': round(samples[0], 3), 'rows': rows}
+
+
+def environment(db_path):
+    with get_db() as conn:
+        counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                  for table in ('donors', 'volunteers', 'events', 'event_volunteers', 'donations')}
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'db': db_path,
+        'counts': counts,
+        'commit': commit,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'machine': platform.machine(),
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print each case against the baseline; returns the regressed case names"""
+    regressed = []
+    print(f"{'case':34} {'before ms':>10} {'after ms':>10} {'ratio':>7}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            print(f'{name:34} {"-":>10} {result["median_ms"]:10.2f}')
+            continue
+        ratio = result['median_ms'] / before['median_ms'] if before['median_ms'] else 1.0
+        flag = ''
+        if ratio > threshold:
+            regressed.append(name)
+            flag = '  SLOWER'
+        print(f'{name:34} {before["median_ms"]:10.2f} {result["median_ms"]:10.2f} {ratio:7.2f}{flag}')
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donations', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='existing database file (default: seed a temporary one)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', help='run only cases whose name contains this')
+    parser.add_argument('--out', help='write JSON results here (default: stdout)')
+    parser.add_argument('--compare', help='earlier JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio counted as a regression')
+    args = parser.parse_args()
+
+    db_path = args.db
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        create_database(db_path)
+        print(f'Seeding {args.donations:,} donations into {db_path} ...', file=sys.stderr)
+        populate(db_path, donations=args.donations, seed=args.seed)
+    db_connection.configure(db_path)
+
+    with get_db() as conn:
+        ids = sample(conn)
+        donations = conn.execute('SELECT MAX(donation_id) FROM donations').fetchone()[0] or 0
+    cases = model_cases(ids, donations)
+    views, skipped = view_cases()
+    cases.update(views)
+    if args.only:
+        cases = {name: case for name, case in cases.items() if args.only in name}
+
+    results = {}
+    for name, (func, *case_args) in cases.items():
+        results[name] = time_case(func, case_args, args.repeat)
+        print(f'{name:34} {results[name]["median_ms"]:10.2f} ms', file=sys.stderr)
+
+    report = {'environment': environment(db_path), 'ids': ids,
+              'results': results, 'skipped': skipped}
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressed = compare(results, baseline, args.threshold)
+        if regressed:
+            print(f'{len(regressed)} case(s) slower than {args.threshold}x: {", ".join(regressed)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
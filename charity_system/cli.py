@@ -0,0 +1,331 @@
+import argparse
+import sys
+
+from database import db_connection
+
+
+def cmd_import(args):
+    from services.bulk_import import import_file
+
+    def progress(report):
+        print(f'  {report.rows_read:,} rows, {report.rows_per_second:,.0f} rows/s', file=sys.stderr)
+
+    report = import_file(
+        args.file, kind=args.kind, reject_path=args.rejects, chunk_size=args.chunk_size,
+        default_collector=args.collector, fmt=args.format, progress=progress)
+    print(report.summary())
+    if report.rejected and args.rejects:
+        print(f'Rejected rows written to {args.rejects}')
+    return 1 if report.rejected and not report.donations_inserted and not report.donors_created else 0
+
+
+def cmd_export(args):
+    from services.export import export_donations
+
+    fmt = args.format or ('jsonl' if args.file.endswith('.jsonl')
+                          else 'columnar' if args.file.endswith('.col') else 'csv')
+
+    def progress(report):
+        if report.rows_written % (args.chunk_size * 50) == 0:
+            print(f'  {report.rows_written:,} rows, {report.rows_per_second:,.0f} rows/s', file=sys.stderr)
+
+    report = export_donations(
+        args.file, fmt=fmt, date_from=args.date_from, date_to=args.date_to,
+        event_id=args.event, chunk_size=args.chunk_size, progress=progress)
+    print(report.summary())
+    return 0
+
+
+def cmd_giftaid(args):
+    from services import gift_aid
+
+    if args.action == 'list':
+        for claim in gift_aid.get_claims():
+            print(f"{claim['claim_id']:5} {claim['period_start']} to {claim['period_end']} "
+                  f"{claim['donation_count']:>10,} donations  £{claim['reclaim_amount']:,.2f} "
+                  f"reclaimed  (made {claim['created_at']})")
+        return 0
+
+    if args.quarter:
+        period_start, period_end = gift_aid.quarter_bounds(args.quarter)
+    elif args.date_from and args.date_to:
+        period_start, period_end = args.date_from, args.date_to
+    else:
+        print('claim needs --quarter or both --from and --to', file=sys.stderr)
+        return 2
+    try:
+        report = gift_aid.create_claim(period_start, period_end, args.out, dry_run=args.dry_run,
+                                       rows_per_file=args.rows_per_file)
+    except gift_aid.AlreadyClaimed as e:
+        print(f'Claim not recorded: {e}', file=sys.stderr)
+        return 1
+    print(report.summary())
+    return 0
+
+
+def cmd_report(args):
+    from services import analytics
+
+    if args.report == 'rollup':
+        rows = analytics.rollup(args.bucket, args.date_from, args.date_to)
+    elif args.report == 'events':
+        rows = analytics.event_roi()
+    else:
+        rows = analytics.collector_stats()
+    if args.limit:
+        rows = rows[:args.limit]
+    if not rows:
+        print('No data')
+        return 0
+    widths = [max(len(str(value)) for value in [name] + [row[i] for row in rows])
+              for i, name in enumerate(rows[0].keys())]
+    print('  '.join(name.ljust(width) for name, width in zip(rows[0].keys(), widths)))
+    for row in rows:
+        print('  '.join(('' if value is None else str(value)).ljust(width)
+                        for value, width in zip(row, widths)))
+    return 0
+
+
+def cmd_aggregates(args):
+    from database import aggregates
+    from database.db_connection import get_db
+
+    with get_db() as conn:
+        if args.action == 'rebuild':
+            with conn:
+                aggregates.rebuild(conn)
+            print('Donation totals rebuilt')
+            return 0
+        mismatches = aggregates.check(conn)
+    for scope, key, stored, expected in mismatches[:50]:
+        print(f'{scope} {key}: stored {stored}, expected {expected}')
+    print(f'{len(mismatches)} inconsistent totals')
+    return 1 if mismatches else 0
+
+
+def cmd_changes(args):
+    from database import changes
+    from database.db_connection import get_db
+
+    with get_db() as conn:
+        with conn:
+            before = conn.execute('SELECT COUNT(*) FROM change_log').fetchone()[0]
+            changes.prune(conn, args.retain)
+            after = conn.execute('SELECT COUNT(*) FROM change_log').fetchone()[0]
+    print(f'Removed {before - after:,} change log rows, kept {after:,}')
+    return 0
+
+
+def cmd_dedup(args):
+    from services import dedup
+
+    if args.action == 'merge' and args.ids:
+        keep_id, *duplicate_ids = args.ids
+        removed, moved = dedup.merge(keep_id, duplicate_ids)
+        print(f'Merged {removed} donors into {keep_id}, moving {moved:,} donations')
+        return 0
+
+    report = dedup.find_duplicates(args.threshold or dedup.REVIEW_THRESHOLD)
+    print(report.summary())
+    if args.action == 'find':
+        pairs = report.pairs[:args.limit] if args.limit else report.pairs
+        for pair in pairs:
+            print(f'{pair.score:.3f}  keep {pair.keep_id}  duplicate {pair.duplicate_id}')
+        return 0
+    removed, moved = dedup.merge_all(report.pairs, args.threshold or dedup.MATCH_THRESHOLD)
+    print(f'Merged {removed:,} duplicate donors, moving {moved:,} donations')
+    return 0
+
+
+def cmd_archive(args):
+    from database import archive
+    from services import retention
+
+    if args.action == 'list':
+        for batch in archive.get_batches():
+            print(f"{batch['batch_id']:5} {batch['table_name']:10} {batch['record_count']:>10,} "
+                  f"records  (archived {batch['archived_at']})")
+        return 0
+    if args.action == 'restore':
+        if args.batch is None:
+            print('restore needs a batch id (see archive list)', file=sys.stderr)
+            return 2
+        print(f'Restored {archive.restore(args.batch):,} rows from batch {args.batch}')
+        return 0
+
+    if not args.before:
+        print(f'archiving {args.action} needs --before', file=sys.stderr)
+        return 2
+    if args.dry_run:
+        print(f'{len(retention.stale_ids(args.action, args.before)):,} {args.action} would be archived')
+        return 0
+
+    def progress(done, total):
+        print(f'  {done:,} of {total:,} {args.action}', file=sys.stderr)
+
+    archived, batches = retention.archive_stale(args.action, args.before, progress)
+    print(f"Archived {archived:,} {args.action} in batches {', '.join(map(str, batches)) or '-'}")
+    count, total = archive.archived_donations(batches)
+    if count:
+        print(f'{count:,} donations ({total:,.2f}) went with them; they are left out of '
+              f'totals and reports until restored')
+    return 0
+
+
+def cmd_year(args):
+    from database import partitions
+
+    if args.action == 'list':
+        for year in partitions.get_closed_years():
+            print(f"{year['year']}  {year['date_from']} to {year['date_to']}  "
+                  f"{year['donation_count']:>10,} donations  {year['total_amount']:>14,.2f}  "
+                  f"(closed {year['closed_at']})")
+        return 0
+    if args.year is None:
+        print('close needs a financial year, e.g. 2022 for 2022-04-01 to 2023-03-31',
+              file=sys.stderr)
+        return 2
+    try:
+        moved, total = partitions.close_year(args.year, force=args.force)
+    except ValueError as e:
+        print(f'Cannot close {args.year}: {e}', file=sys.stderr)
+        return 1
+    print(f'Closed financial year {args.year}: {moved:,} donations, {total:,.2f}')
+    if args.vacuum:
+        partitions.compact()
+        print('Compacted the database file')
+    return 0
+
+
+def cmd_conflicts(args):
+    from models.scheduling import describe, find_all_conflicts
+
+    conflicts = find_all_conflicts()
+    for conflict in conflicts[:args.limit] if args.limit else conflicts:
+        print(f'event {conflict.event_id:>6}: {describe(conflict)}')
+    print(f'{len(conflicts):,} double bookings')
+    return 1 if conflicts else 0
+
+
+def cmd_serve(args):
+    import asyncio
+    from services.api import ApiServer
+
+    # One pooled connection per reader thread, one for the write queue and
+    # one for change feed polls after writes
+    db_connection.configure(args.db, max_size=args.readers + 2)
+    server = ApiServer(read_workers=args.readers, write_workers=args.writers)
+    ready = lambda s: print(f'Serving on http://{args.host}:{args.port}', flush=True)
+    try:
+        asyncio.run(server.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Charity Donation Tracker command line tools')
+    parser.add_argument('--db', help='database file (default: CHARITY_DB or charity.db)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('import', help='bulk import donations or donors from CSV/JSONL')
+    p.add_argument('file')
+    p.add_argument('--kind', choices=('donations', 'donors'), default='donations')
+    p.add_argument('--format', choices=('csv', 'jsonl'), help='default: from file extension')
+    p.add_argument('--rejects', help='write rejected rows to this JSONL file')
+    p.add_argument('--collector', type=int, help='volunteer id for rows without collected_by')
+    p.add_argument('--chunk-size', type=int, default=5000)
+    p.set_defaults(func=cmd_import)
+
+    p = commands.add_parser('export', help='export donations to CSV, JSONL or columnar files')
+    p.add_argument('file')
+    p.add_argument('--format', choices=('csv', 'jsonl', 'columnar'),
+                   help='default: from file extension (.jsonl, .col, otherwise csv)')
+    p.add_argument('--from', dest='date_from', help='first donation date (YYYY-MM-DD)')
+    p.add_argument('--to', dest='date_to', help='last donation date (YYYY-MM-DD)')
+    p.add_argument('--event', type=int, help='only donations for this event id')
+    p.add_argument('--chunk-size', type=int, default=10000)
+    p.set_defaults(func=cmd_export)
+
+    p = commands.add_parser('giftaid', help='generate Gift Aid claim files or list past claims')
+    p.add_argument('action', choices=('claim', 'list'))
+    p.add_argument('--quarter', help='claim period as a calendar quarter, e.g. 2024Q1')
+    p.add_argument('--from', dest='date_from', help='first donation date (YYYY-MM-DD)')
+    p.add_argument('--to', dest='date_to', help='last donation date (YYYY-MM-DD)')
+    p.add_argument('--out', default='.', help='directory for the claim files')
+    p.add_argument('--rows-per-file', type=int, default=100_000)
+    p.add_argument('--dry-run', action='store_true',
+                   help='write the files without recording the donations as claimed')
+    p.set_defaults(func=cmd_giftaid)
+
+    p = commands.add_parser('report', help='donation rollups, event ROI and collector statistics')
+    p.add_argument('report', choices=('rollup', 'events', 'collectors'))
+    p.add_argument('--bucket', choices=('day', 'week', 'month'), default='month')
+    p.add_argument('--from', dest='date_from', help='first donation date (YYYY-MM-DD)')
+    p.add_argument('--to', dest='date_to', help='last donation date (YYYY-MM-DD)')
+    p.add_argument('--limit', type=int, help='show only the first LIMIT rows')
+    p.set_defaults(func=cmd_report)
+
+    p = commands.add_parser('aggregates', help='rebuild or verify the donation totals table')
+    p.add_argument('action', choices=('rebuild', 'check'))
+    p.set_defaults(func=cmd_aggregates)
+
+    p = commands.add_parser('changes', help='trim the change log read by the change feed')
+    p.add_argument('action', choices=('prune',))
+    p.add_argument('--retain', type=int, default=100_000, help='newest rows to keep')
+    p.set_defaults(func=cmd_changes)
+
+    p = commands.add_parser('dedup', help='find and merge duplicate donors')
+    p.add_argument('action', choices=('find', 'merge'))
+    p.add_argument('ids', nargs='*', type=int,
+                   help='merge: donor to keep, then the donors merged into it '
+                        '(default: every likely duplicate found)')
+    p.add_argument('--threshold', type=float,
+                   help='minimum score (default: 0.8 to list, 0.9 to merge)')
+    p.add_argument('--limit', type=int, help='show only the first LIMIT pairs')
+    p.set_defaults(func=cmd_dedup)
+
+    p = commands.add_parser('archive', help='move old donors or events to the archive tables')
+    p.add_argument('action', choices=('donors', 'events', 'list', 'restore'))
+    p.add_argument('batch', nargs='?', type=int, help='restore: the archive batch to restore')
+    p.add_argument('--before', help='donors: last donation before this date; '
+                                     'events: booked before this date (YYYY-MM-DD)')
+    p.add_argument('--dry-run', action='store_true', help='only count what would be archived')
+    p.set_defaults(func=cmd_archive)
+
+    p = commands.add_parser('year', help='close financial years into read-only partitions')
+    p.add_argument('action', choices=('close', 'list'))
+    p.add_argument('year', nargs='?', type=int,
+                   help='close: the financial year, named after the year it starts in')
+    p.add_argument('--force', action='store_true',
+                   help='close even with Gift Aid donations not yet claimed')
+    p.add_argument('--vacuum', action='store_true',
+                   help='compact the database file afterwards')
+    p.set_defaults(func=cmd_year)
+
+    p = commands.add_parser('conflicts', help='list room and volunteer double bookings')
+    p.add_argument('--limit', type=int, help='show only the first LIMIT conflicts')
+    p.set_defaults(func=cmd_conflicts)
+
+    p = commands.add_parser('serve', help='serve the records as a JSON HTTP API')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8080)
+    p.add_argument('--readers', type=int, default=4, help='threads running read queries')
+    p.add_argument('--writers', type=int, default=32,
+                   help='requests whose writes may be grouped into one commit')
+    p.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.db:
+        db_connection.configure(args.db)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
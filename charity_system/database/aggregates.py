@@ -0,0 +1,139 @@
+from database import partitions
+
+# Running donation totals per donor, event, collector and month, kept in
+# the donation_totals table by triggers so reads are a primary-key lookup.
+# Key expressions are written against a row alias ({row}.column).
+SCOPES = {
+    'donor': '{row}.donor_id',
+    'event': '{row}.event_id',
+    'collector': '{row}.collected_by',
+    'month': "substr({row}.donation_date, 1, 7)",
+}
+
+# Totals within this much of the recomputed value count as consistent
+TOLERANCE = 0.005
+
+CREATE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS donation_totals (
+        scope TEXT NOT NULL,
+        key NOT NULL,
+        donation_count INTEGER NOT NULL,
+        total_amount REAL NOT NULL,
+        gift_aid_amount REAL NOT NULL,
+        PRIMARY KEY (scope, key)
+    ) WITHOUT ROWID
+'''
+
+
+def _add(row, sign):
+    """Statements adding (sign=+1) or removing (sign=-1) one donation row"""
+    statements = []
+    for scope, key in SCOPES.items():
+        key = key.format(row=row)
+        gift = f'CASE WHEN {row}.gift_aid THEN {row}.amount ELSE 0 END'
+        if sign > 0:
+            statements.append(f'''
+                INSERT INTO donation_totals (scope, key, donation_count, total_amount, gift_aid_amount)
+                SELECT '{scope}', {key}, 1, {row}.amount, {gift} WHERE {key} IS NOT NULL
+                ON CONFLICT (scope, key) DO UPDATE SET
+                    donation_count = donation_count + 1,
+                    total_amount = total_amount + excluded.total_amount,
+                    gift_aid_amount = gift_aid_amount + excluded.gift_aid_amount;''')
+        else:
+            statements.append(f'''
+                UPDATE donation_totals SET
+                    donation_count = donation_count - 1,
+                    total_amount = total_amount - {row}.amount,
+                    gift_aid_amount = gift_aid_amount - {gift}
+                WHERE scope = '{scope}' AND key = {key};
+                DELETE FROM donation_totals
+                WHERE scope = '{scope}' AND key = {key} AND donation_count <= 0;''')
+    return '\n'.join(statements)
+
+
+def create_steps():
+    """SQL creating the totals table and the triggers that maintain it"""
+    return [
+        CREATE_TABLE,
+        f'''CREATE TRIGGER IF NOT EXISTS donation_totals_ai AFTER INSERT ON donations BEGIN
+                {_add('new', 1)}
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS donation_totals_ad AFTER DELETE ON donations BEGIN
+                {_add('old', -1)}
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS donation_totals_au AFTER UPDATE ON donations BEGIN
+                {_add('old', -1)}
+                {_add('new', 1)}
+            END''',
+        rebuild,
+    ]
+
+
+def _recompute_query(scope, source='donations'):
+    key = SCOPES[scope].format(row='d')
+    return f'''
+        SELECT '{scope}' AS scope, {key} AS key, COUNT(*) AS donation_count,
+               SUM(d.amount) AS total_amount,
+               SUM(CASE WHEN d.gift_aid THEN d.amount ELSE 0 END) AS gift_aid_amount
+        FROM {source} d
+        WHERE {key} IS NOT NULL
+        GROUP BY {key}
+    '''
+
+
+def add(cursor, source, params=()):
+    """Add the donations selected by source (a FROM-clause source) to the totals.
+
+    For rows that arrive without passing through the donations triggers,
+    such as archived donations restored into a closed year.
+    """
+    for scope in SCOPES:
+        cursor.execute(f'''
+            INSERT INTO donation_totals (scope, key, donation_count, total_amount, gift_aid_amount)
+            {_recompute_query(scope, source)}
+            ON CONFLICT (scope, key) DO UPDATE SET
+                donation_count = donation_count + excluded.donation_count,
+                total_amount = total_amount + excluded.total_amount,
+                gift_aid_amount = gift_aid_amount + excluded.gift_aid_amount
+        ''', params)
+
+
+def rebuild(conn):
+    """Recompute every total from the donations table and closed years.
+
+    Runs inside the caller's transaction when there is one.
+    """
+    source = partitions.union_source(conn)
+    conn.execute('DELETE FROM donation_totals')
+    for scope in SCOPES:
+        conn.execute(f'''
+            INSERT INTO donation_totals (scope, key, donation_count, total_amount, gift_aid_amount)
+            {_recompute_query(scope, source)}
+        ''')
+
+
+def check(conn):
+    """Compare stored totals with a fresh recomputation.
+
+    Returns a list of (scope, key, stored, expected) tuples, where stored
+    and expected are (count, total, gift_aid) or None when the row is missing.
+    """
+    def same(a, b):
+        return (a is not None and b is not None and a[0] == b[0]
+                and abs(a[1] - b[1]) < TOLERANCE and abs(a[2] - b[2]) < TOLERANCE)
+
+    source = partitions.union_source(conn)
+    mismatches = []
+    for scope in SCOPES:
+        expected = {row[1]: tuple(row[2:])
+                    for row in conn.execute(_recompute_query(scope, source))}
+        stored = {
+            row[0]: tuple(row[1:])
+            for row in conn.execute(
+                '''SELECT key, donation_count, total_amount, gift_aid_amount
+                   FROM donation_totals WHERE scope = ?''', (scope,))
+        }
+        for key in expected.keys() | stored.keys():
+            if not same(stored.get(key), expected.get(key)):
+                mismatches.append((scope, key, stored.get(key), expected.get(key)))
+    return mismatches
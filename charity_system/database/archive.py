@@ -0,0 +1,180 @@
+from datetime import datetime
+
+from database import aggregates
+from database.changes import emits_changes
+from database.db_connection import get_db
+from database.partitions import get_partitions
+from database.writer import writer
+
+# Tables whose rows can be moved to a <table>_archive copy, parents first so
+# restoring them in this order satisfies the foreign keys. Archived
+# donations leave donation_totals and every report until they are restored;
+# unlike a closed financial year, an archive is data taken out of use.
+ARCHIVED_TABLES = ('donors', 'volunteers', 'events', 'event_volunteers', 'donations')
+
+# Columns of archived rows that point at live records. Restoring needs those
+# records, so deletes check these too and they are indexed for it
+ARCHIVED_REFERENCES = {
+    'donations': ('donor_id', 'event_id', 'collected_by'),
+    'events': ('organizer_id',),
+    'event_volunteers': ('event_id', 'volunteer_id'),
+}
+
+CREATE_BATCHES = '''
+    CREATE TABLE IF NOT EXISTS archive_batches (
+        batch_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        record_count INTEGER NOT NULL,
+        archived_at TEXT NOT NULL
+    )
+'''
+
+
+def _columns(conn, table):
+    return [(row[1], row[2]) for row in conn.execute(f'PRAGMA table_info({table})')]
+
+
+def _create_tables(conn):
+    """An archive copy of each table: same columns, no constraints, plus the batch.
+
+    Columns added to a table since its archive was created are added to
+    the archive too, so this is re-run by migrations that add columns.
+    """
+    for table in ARCHIVED_TABLES:
+        columns = _columns(conn, table)
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table}_archive (
+                {', '.join(f'{name} {kind}' for name, kind in columns)},
+                archive_batch INTEGER NOT NULL
+            )''')
+        existing = {name for name, _ in _columns(conn, f'{table}_archive')}
+        for name, kind in columns:
+            if name not in existing:
+                conn.execute(f'ALTER TABLE {table}_archive ADD COLUMN {name} {kind}')
+        conn.execute(f'''CREATE INDEX IF NOT EXISTS idx_{table}_archive_batch
+                         ON {table}_archive (archive_batch)''')
+
+
+def create_steps():
+    """SQL creating the archive tables and the batch log"""
+    return [CREATE_BATCHES, _create_tables]
+
+
+def reference_index_steps():
+    """SQL indexing the archived columns that reference live records"""
+    return [f'CREATE INDEX IF NOT EXISTS idx_{table}_archive_{column} ON {table}_archive ({column})'
+            for table, columns in ARCHIVED_REFERENCES.items() for column in columns]
+
+
+def start_batch(cursor, table):
+    cursor.execute('''
+        INSERT INTO archive_batches (table_name, record_count, archived_at) VALUES (?, 0, ?)
+    ''', (table, datetime.now().isoformat(timespec='seconds')))
+    return cursor.lastrowid
+
+
+def finish_batch(cursor, batch_id, record_count):
+    """Record how many records a batch archived, dropping it if none were"""
+    if record_count:
+        cursor.execute('UPDATE archive_batches SET record_count = ? WHERE batch_id = ?',
+                       (record_count, batch_id))
+        return batch_id
+    cursor.execute('DELETE FROM archive_batches WHERE batch_id = ?', (batch_id,))
+    return None
+
+
+def move(cursor, table, where, params, batch_id):
+    """Copy the rows of table matching where into its archive, then delete them"""
+    columns = ', '.join(name for name, _ in _columns(cursor, table))
+    cursor.execute(f'''
+        INSERT INTO {table}_archive ({columns}, archive_batch)
+        SELECT {columns}, ? FROM {table} WHERE {where}
+    ''', (batch_id, *params))
+    cursor.execute(f'DELETE FROM {table} WHERE {where}', params)
+    return cursor.rowcount
+
+
+def _restore_closed(cursor, batch_id):
+    """Put the batch's donations dated in a closed year back into its partition.
+
+    The closed-year guard refuses them in donations, and partition rows
+    bypass the donations triggers, so the totals, the partition's registry
+    entry and the change feed are brought up to date here.
+    """
+    columns = ', '.join(name for name, _ in _columns(cursor, 'donations'))
+    restored = 0
+    for partition in get_partitions(cursor):
+        where = 'archive_batch = ? AND donation_date BETWEEN ? AND ?'
+        params = (batch_id, partition.date_from, partition.date_to)
+        selected = f'SELECT {columns} FROM donations_archive WHERE {where}'
+        trigger = f'{partition.table_name}_read_only_insert'
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                       (trigger,))
+        trigger_sql = cursor.fetchone()[0]
+        cursor.execute(f'DROP TRIGGER {trigger}')
+        cursor.execute(f'INSERT INTO {partition.table_name} ({columns}) {selected}', params)
+        count = cursor.rowcount
+        cursor.execute(trigger_sql)
+        if not count:
+            continue
+        aggregates.add(cursor, f'({selected})', params)
+        cursor.execute(f'''
+            UPDATE donation_partitions SET
+                donation_count = (SELECT COUNT(*) FROM {partition.table_name}),
+                total_amount = (SELECT COALESCE(SUM(amount), 0) FROM {partition.table_name}),
+                min_id = (SELECT MIN(donation_id) FROM {partition.table_name}),
+                max_id = (SELECT MAX(donation_id) FROM {partition.table_name})
+            WHERE table_name = ?
+        ''', (partition.table_name,))
+        cursor.execute(f'DELETE FROM donations_archive WHERE {where}', params)
+        restored += count
+    if restored:
+        cursor.execute(
+            "UPDATE table_versions SET version = version + 1 WHERE table_name = 'donations'")
+        cursor.execute("INSERT INTO change_log (table_name, op) VALUES ('donations', 'bulk')")
+    return restored
+
+
+def _restore(cursor, batch_id):
+    cursor.execute('SELECT 1 FROM archive_batches WHERE batch_id = ?', (batch_id,))
+    if cursor.fetchone() is None:
+        return 0
+    restored = 0
+    for table in ARCHIVED_TABLES:
+        columns = ', '.join(name for name, _ in _columns(cursor, table))
+        cursor.execute(f'''
+            INSERT INTO {table} ({columns})
+            SELECT {columns} FROM {table}_archive WHERE archive_batch = ?
+        ''', (batch_id,))
+        restored += cursor.rowcount
+        cursor.execute(f'DELETE FROM {table}_archive WHERE archive_batch = ?', (batch_id,))
+        if table == 'events':
+            # Donations reference donors and events, so closed-year ones go
+            # back once both are in place
+            restored += _restore_closed(cursor, batch_id)
+    cursor.execute('DELETE FROM archive_batches WHERE batch_id = ?', (batch_id,))
+    return restored
+
+
+@emits_changes
+def restore(batch_id):
+    """Move every row archived in batch_id back; returns the number of rows restored.
+
+    Donations dated in a financial year closed since they were archived go
+    into that year's partition.
+    """
+    return writer.submit(_restore, batch_id).result()
+
+
+def archived_donations(batch_ids):
+    """(count, total) of the donations held in the given batches"""
+    with get_db() as conn:
+        return tuple(conn.execute(f'''
+            SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM donations_archive
+            WHERE archive_batch IN ({', '.join('?' * len(batch_ids)) or 'NULL'})
+        ''', list(batch_ids)).fetchone())
+
+
+def get_batches():
+    with get_db() as conn:
+        return conn.execute('SELECT * FROM archive_batches ORDER BY batch_id').fetchall()
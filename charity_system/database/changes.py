@@ -0,0 +1,172 @@
+import functools
+import threading
+from collections import namedtuple
+
+from database.db_connection import get_db
+from database.versions import VERSIONED_TABLES
+
+# Row identity recorded for each table: (row_id column, related_id column)
+KEY_COLUMNS = {
+    'donors': ('donor_id', None),
+    'volunteers': ('volunteer_id', None),
+    'events': ('event_id', None),
+    'donations': ('donation_id', None),
+    'event_volunteers': ('event_id', 'volunteer_id'),
+}
+
+# Changes delivered per poll; past this, subscribers get one whole-table
+# change per affected table instead of every row
+MAX_BATCH = 1000
+
+# Log rows kept behind the newest one when the log is pruned
+RETAIN = 100_000
+
+# One write seen by the feed. key is the row's primary key, a tuple for
+# event_volunteers, or None when the whole table should be treated as
+# changed. columns lists the columns an UPDATE changed, otherwise ().
+Change = namedtuple('Change', 'change_id table op key columns')
+
+CREATE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS change_log (
+        change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        op TEXT NOT NULL,
+        row_id INTEGER,
+        related_id INTEGER,
+        columns TEXT
+    )
+'''
+
+
+def _create_triggers(conn):
+    """Log triggers for every versioned table, built from its current columns"""
+    for table in VERSIONED_TABLES:
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+        row_id, related_id = KEY_COLUMNS[table]
+        changed = ' || '.join(
+            f"CASE WHEN old.{column} IS NOT new.{column} THEN '{column},' ELSE '' END"
+            for column in columns)
+        for op, row, column_list in (('insert', 'new', 'NULL'),
+                                     ('update', 'new', f"rtrim({changed}, ',')"),
+                                     ('delete', 'old', 'NULL')):
+            related = f'{row}.{related_id}' if related_id else 'NULL'
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_change_{op}
+                AFTER {op.upper()} ON {table} BEGIN
+                    INSERT INTO change_log (table_name, op, row_id, related_id, columns)
+                    VALUES ('{table}', '{op}', {row}.{row_id}, {related}, {column_list});
+                END''')
+
+
+def create_steps():
+    """SQL creating the change log and the triggers that fill it"""
+    return [CREATE_TABLE, _create_triggers]
+
+
+def rebuild_triggers(conn, table):
+    """Recreate a table's log triggers, e.g. after a migration added columns"""
+    for op in ('insert', 'update', 'delete'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {table}_change_{op}')
+    _create_triggers(conn)
+
+
+def latest_change_id(conn):
+    return conn.execute('SELECT COALESCE(MAX(change_id), 0) FROM change_log').fetchone()[0]
+
+
+def prune(conn, retain=RETAIN):
+    """Drop all but the newest retain log rows"""
+    conn.execute('DELETE FROM change_log WHERE change_id <= ?', (latest_change_id(conn) - retain,))
+
+
+class ChangeFeed:
+    """In-process bus delivering database writes to subscribers.
+
+    Triggers record every insert, update and delete on the versioned
+    tables in change_log; poll() reads the rows added since the last poll
+    and passes them, in order, to the subscribers interested in their
+    tables. Writes from other processes are picked up the same way.
+    Callbacks run on the thread that calls poll().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = []    # (callback, tables or None)
+        self.last_id = None
+        # Polls asked for and polls answered. A poll that starts reading
+        # after a caller asked covers that caller's writes, so callers
+        # queued behind it need not read again
+        self._requests_lock = threading.Lock()
+        self._requested = 0
+        self._answered = 0
+
+    def subscribe(self, callback, tables=None):
+        """Call callback(changes) for writes to tables (default: all)"""
+        with self._lock:
+            if self.last_id is None:
+                with get_db() as conn:
+                    self.last_id = latest_change_id(conn)
+            self._subscribers.append((callback, frozenset(tables) if tables else None))
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[0] != callback]
+
+    def _read(self, conn):
+        rows = conn.execute('''
+            SELECT change_id, table_name, op, row_id, related_id, columns FROM change_log
+            WHERE change_id > ? ORDER BY change_id LIMIT ?
+        ''', (self.last_id, MAX_BATCH + 1)).fetchall()
+        first = conn.execute('SELECT MIN(change_id) FROM change_log').fetchone()[0]
+        if len(rows) > MAX_BATCH or (rows and first > self.last_id + 1):
+            # Too many to replay, or pruned past our position: report each
+            # touched table as changed wholesale
+            latest = latest_change_id(conn)
+            tables = [row[0] for row in conn.execute(
+                'SELECT DISTINCT table_name FROM change_log WHERE change_id > ?', (self.last_id,))]
+            return latest, [Change(latest, table, 'bulk', None, ()) for table in tables]
+        changes = []
+        for change_id, table, op, row_id, related_id, columns in rows:
+            key = (row_id, related_id) if related_id is not None else row_id
+            changes.append(Change(change_id, table, op, key,
+                                  tuple(columns.split(',')) if columns else ()))
+        return (changes[-1].change_id if changes else self.last_id), changes
+
+    def poll(self):
+        """Deliver writes made since the last poll; returns them.
+
+        Concurrent callers share one read: a caller whose request a poll
+        started after has already been answered returns [] at once.
+        """
+        with self._requests_lock:
+            self._requested += 1
+            ticket = self._requested
+        with self._lock:
+            if not self._subscribers or self._answered >= ticket:
+                return []
+            with self._requests_lock:
+                covered = self._requested
+            with get_db() as conn:
+                self.last_id, changes = self._read(conn)
+            self._answered = covered
+            subscribers = list(self._subscribers)
+        if changes:
+            for callback, tables in subscribers:
+                wanted = [c for c in changes if tables is None or c.table in tables]
+                if wanted:
+                    callback(wanted)
+        return changes
+
+
+feed = ChangeFeed()
+
+
+def emits_changes(func):
+    """Model write methods: publish the write to the feed once it has committed"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            feed.poll()
+    return wrapper
@@ -0,0 +1,228 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Default database lives next to database_init.py, which creates it
+DEFAULT_DB_PATH = Path(__file__).resolve().parent.parent / 'charity.db'
+
+# Pragmas applied once when a connection is opened, not on every checkout
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA foreign_keys=ON',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA mmap_size=134217728',
+    'PRAGMA busy_timeout=5000',
+)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the checkout timeout"""
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections with per-thread affinity.
+
+    A thread that already holds a connection gets the same one back for
+    nested get_db() calls, and on a fresh checkout it is handed the idle
+    connection it used last, so its page cache stays warm.
+    """
+
+    def __init__(self, db_path, max_size=5, timeout=10.0,
+                 cached_statements=256, health_check_interval=30.0):
+        self.db_path = str(db_path)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.health_check_interval = health_check_interval
+
+        self._lock = threading.Condition()
+        self._idle = []            # connections ready for checkout
+        self._all = set()          # every open connection
+        self._owner = {}           # id(conn) -> ident of the last thread to use it
+        self._last_used = {}       # id(conn) -> monotonic time of last release
+        self._local = threading.local()
+        self._closed = False
+
+        self._stats = {
+            'created': 0,
+            'checkouts': 0,
+            'affinity_hits': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'health_checks': 0,
+            'replaced': 0,
+        }
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=5.0,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        self._stats['created'] += 1
+        return conn
+
+    def _is_healthy(self, conn):
+        self._stats['health_checks'] += 1
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        self._all.discard(conn)
+        self._owner.pop(id(conn), None)
+        self._last_used.pop(id(conn), None)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _take_idle(self, ident):
+        """Pop an idle connection, preferring the one this thread used last"""
+        for i in range(len(self._idle) - 1, -1, -1):
+            if self._owner.get(id(self._idle[i])) == ident:
+                self._stats['affinity_hits'] += 1
+                return self._idle.pop(i)
+        return self._idle.pop()
+
+    def acquire(self):
+        """Check out a connection, blocking up to the pool timeout"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            return held
+
+        ident = threading.get_ident()
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError('Connection pool is closed')
+            while True:
+                if self._idle:
+                    conn = self._take_idle(ident)
+                    idle_for = time.monotonic() - self._last_used.get(id(conn), 0.0)
+                    if idle_for > self.health_check_interval and not self._is_healthy(conn):
+                        self._discard(conn)
+                        self._stats['replaced'] += 1
+                        continue
+                    break
+                if len(self._all) < self.max_size:
+                    conn = self._connect()
+                    self._all.add(conn)
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'No database connection available after {self.timeout}s')
+                if not waited:
+                    self._stats['waits'] += 1
+                    waited = True
+                started = time.monotonic()
+                self._lock.wait(remaining)
+                self._stats['wait_time'] += time.monotonic() - started
+
+            self._owner[id(conn)] = ident
+            self._stats['checkouts'] += 1
+
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn):
+        """Return a connection to the pool once the outermost user is done"""
+        if getattr(self._local, 'conn', None) is not conn:
+            raise sqlite3.ProgrammingError('Connection was not checked out by this thread')
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+        self._local.conn = None
+
+        # Never hand out a connection with a half-finished transaction
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+
+        with self._lock:
+            if self._closed:
+                self._discard(conn)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+                self._idle.append(conn)
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """Snapshot of pool size and usage counters"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                'size': len(self._all),
+                'idle': len(self._idle),
+                'in_use': len(self._all) - len(self._idle),
+                'max_size': self.max_size,
+            })
+        return snapshot
+
+    def close(self):
+        """Close idle connections; busy ones are closed when released"""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+            self._lock.notify_all()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configure(db_path=None, **pool_options):
+    """Point the application at a database file, replacing the current pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        path = db_path or os.environ.get('CHARITY_DB') or DEFAULT_DB_PATH
+        _pool = ConnectionPool(path, **pool_options)
+    return _pool
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(os.environ.get('CHARITY_DB') or DEFAULT_DB_PATH)
+    return _pool
+
+
+def get_db():
+    """Context manager yielding a pooled connection with sqlite3.Row rows"""
+    return get_pool().connection()
+
+
+def pool_stats():
+    return get_pool().stats()
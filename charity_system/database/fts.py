@@ -0,0 +1,54 @@
+import re
+
+# Full-text indexes over the searchable columns of each table. The FTS5
+# tables use the base table as external content, so only the index is
+# stored, and the triggers below keep it in step with every write.
+FTS_TABLES = {
+    'donors': ('donor_id', ('first_name', 'surname', 'business_name', 'postcode')),
+    'volunteers': ('volunteer_id', ('first_name', 'surname', 'email')),
+    'events': ('event_id', ('event_name', 'room_name')),
+}
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_table(table):
+    return f'{table}_fts'
+
+
+def create_steps(table):
+    """SQL statements creating, populating and syncing the index for table"""
+    key, columns = FTS_TABLES[table]
+    fts = fts_table(table)
+    cols = ', '.join(columns)
+    new_values = ', '.join(f'new.{c}' for c in columns)
+    old_values = ', '.join(f'old.{c}' for c in columns)
+    return [
+        f'''CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {cols}, content='{table}', content_rowid='{key}',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3')''',
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+        f'''CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts}(rowid, {cols}) VALUES (new.{key}, {new_values});
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.{key}, {old_values});
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.{key}, {old_values});
+                INSERT INTO {fts}(rowid, {cols}) VALUES (new.{key}, {new_values});
+            END''',
+    ]
+
+
+def match_query(term):
+    """Turn free text typed by a user into an FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix query and all of them must match,
+    so "jo smi" finds "John Smith" whichever columns the words land in.
+    Returns None when the term contains nothing searchable.
+    """
+    tokens = _TOKEN.findall(term or '')
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
@@ -0,0 +1,139 @@
+import sqlite3
+from datetime import datetime
+from database import aggregates, archive, changes, fts, partitions, versions
+
+
+def _add_event_duration(conn):
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(events)')]
+    if 'duration_minutes' not in columns:
+        conn.execute('''ALTER TABLE events ADD COLUMN duration_minutes INTEGER NOT NULL
+                        DEFAULT 120 CHECK (duration_minutes BETWEEN 1 AND 1440)''')
+    # The update trigger lists the columns it compares
+    changes.rebuild_triggers(conn, 'events')
+
+
+# Ordered schema changes applied on top of the base tables in database_init.
+# Each entry is (version, description, steps); a step is either an SQL string
+# or a callable taking the connection. Steps must be safe to re-run.
+MIGRATIONS = [
+    (1, 'Secondary indexes for foreign-key lookups', [
+        # Donation.search(donor_id=...) ordered by date, and SUM(amount) for
+        # get_total_by_donor answered from the index alone
+        '''CREATE INDEX IF NOT EXISTS idx_donations_donor_date
+           ON donations (donor_id, donation_date, amount)''',
+        '''CREATE INDEX IF NOT EXISTS idx_donations_event
+           ON donations (event_id, amount)''',
+        '''CREATE INDEX IF NOT EXISTS idx_donations_collector
+           ON donations (collected_by)''',
+        '''CREATE INDEX IF NOT EXISTS idx_events_organizer
+           ON events (organizer_id)''',
+        '''CREATE INDEX IF NOT EXISTS idx_event_volunteers_volunteer
+           ON event_volunteers (volunteer_id)''',
+    ]),
+    (2, 'Date index for keyset-paginated donation listings', [
+        # The implicit rowid makes this usable for ORDER BY date, id
+        '''CREATE INDEX IF NOT EXISTS idx_donations_date
+           ON donations (donation_date)''',
+    ]),
+    (3, 'FTS5 search indexes for donors, volunteers and events',
+        fts.create_steps('donors') + fts.create_steps('volunteers') + fts.create_steps('events')),
+    (4, 'Postcode index for matching donors on import', [
+        '''CREATE INDEX IF NOT EXISTS idx_donors_postcode
+           ON donors (postcode COLLATE NOCASE)''',
+    ]),
+    (5, 'Trigger-maintained donation totals per donor, event, collector and month',
+        aggregates.create_steps()),
+    (6, 'Per-table change counters for cache invalidation',
+        versions.create_steps()),
+    (7, 'Gift Aid claims and the donations each one covers', [
+        '''CREATE TABLE IF NOT EXISTS gift_aid_claims (
+               claim_id INTEGER PRIMARY KEY AUTOINCREMENT,
+               period_start DATE NOT NULL,
+               period_end DATE NOT NULL,
+               created_at TEXT NOT NULL,
+               donation_count INTEGER NOT NULL DEFAULT 0,
+               gross_amount DECIMAL(10,2) NOT NULL DEFAULT 0,
+               reclaim_amount DECIMAL(10,2) NOT NULL DEFAULT 0
+           )''',
+        # Keyed by donation so the eligibility check is a primary-key probe
+        '''CREATE TABLE IF NOT EXISTS gift_aid_claimed (
+               donation_id INTEGER PRIMARY KEY,
+               claim_id INTEGER NOT NULL,
+               FOREIGN KEY (claim_id) REFERENCES gift_aid_claims(claim_id)
+           )''',
+        # Covers the claim query, so a period is one range scan in date order
+        '''CREATE INDEX IF NOT EXISTS idx_donations_gift_aid
+           ON donations (gift_aid, donation_date, donor_id, amount)''',
+    ]),
+    (8, 'Change log feeding the in-process change feed',
+        changes.create_steps()),
+    (9, 'Event durations and indexes for booking conflict checks', [
+        _add_event_duration,
+        # Room conflicts are a range scan over the days an overlapping
+        # booking could start on
+        '''CREATE INDEX IF NOT EXISTS idx_events_room_date
+           ON events (room_name COLLATE NOCASE, booking_date)''',
+        '''CREATE INDEX IF NOT EXISTS idx_events_organizer_date
+           ON events (organizer_id, booking_date)''',
+        'DROP INDEX IF EXISTS idx_events_organizer',
+    ]),
+    (10, 'Archive tables for records moved out of the hot tables',
+        archive.create_steps()),
+    (11, 'Registry of closed financial years and the guard keeping them closed',
+        partitions.create_steps()),
+    (12, 'Indexes on archived rows that reference live records',
+        archive.reference_index_steps()),
+    (13, 'Index ranking donation totals within a scope', [
+        # Top-N tiles and reports walk the largest totals off the index
+        # instead of sorting every donor on each refresh
+        '''CREATE INDEX IF NOT EXISTS idx_donation_totals_rank
+           ON donation_totals (scope, total_amount)''',
+    ]),
+]
+
+
+def ensure_version_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+
+
+def current_version(conn):
+    """Highest migration version applied to this database (0 if none)"""
+    ensure_version_table(conn)
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def migrate(conn, target=None):
+    """Apply pending migrations up to target (default: latest).
+
+    Every migration runs in its own transaction together with its
+    schema_version row, so an interrupted run can simply be restarted.
+    Returns the list of versions applied.
+    """
+    applied = []
+    version = current_version(conn)
+    for number, description, steps in MIGRATIONS:
+        if number <= version or (target is not None and number > target):
+            continue
+        try:
+            conn.execute('BEGIN')
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(
+                'INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                (number, description, datetime.now().isoformat(timespec='seconds')))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append(number)
+    return applied
@@ -0,0 +1,199 @@
+# Closed financial years of donations, each in its own read-only table.
+# Open years live in donations as always. Closing a year moves its rows into
+# donations_fy<year>, a WITHOUT ROWID table clustered on (donation_date,
+# donation_id) that triggers keep read-only, and records it in
+# donation_partitions. Years are closed oldest first, so every closed
+# donation is older than every open one, and a newest-first listing is the
+# open table followed by the partitions, newest first, with no merge.
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from database.changes import emits_changes
+from database.db_connection import get_db
+from database.writer import writer
+
+# First month of the financial year; the year is named after the calendar
+# year it starts in, so 2023 runs from 2023-04-01 to 2024-03-31
+YEAR_START_MONTH = 4
+
+# Columns of a closed year that other tables' rows are looked up by
+INDEXED_COLUMNS = ('donation_id', 'donor_id', 'event_id', 'collected_by')
+
+# One closed year. min_id and max_id bound its donation ids, so lookups by
+# id only visit partitions that can hold it
+Partition = namedtuple('Partition', 'table_name year date_from date_to min_id max_id')
+
+CREATE_REGISTRY = '''
+    CREATE TABLE IF NOT EXISTS donation_partitions (
+        table_name TEXT PRIMARY KEY,
+        year INTEGER NOT NULL UNIQUE,
+        date_from DATE NOT NULL,
+        date_to DATE NOT NULL,
+        min_id INTEGER,
+        max_id INTEGER,
+        donation_count INTEGER NOT NULL,
+        total_amount REAL NOT NULL,
+        closed_at TEXT NOT NULL
+    )
+'''
+
+# New or moved donations may not land in a closed year
+CLOSED_GUARD = '''
+    CREATE TRIGGER IF NOT EXISTS donations_closed_year_{op}
+    BEFORE {event} ON donations
+    WHEN new.donation_date <= (SELECT MAX(date_to) FROM donation_partitions)
+    BEGIN
+        SELECT RAISE(ABORT, 'donation date falls in a closed financial year');
+    END
+'''
+
+
+def create_steps():
+    """SQL creating the partition registry and the closed-year guards"""
+    return [CREATE_REGISTRY,
+            CLOSED_GUARD.format(op='insert', event='INSERT'),
+            CLOSED_GUARD.format(op='update', event='UPDATE OF donation_date')]
+
+
+def year_bounds(year):
+    """First and last day of financial year as ISO dates"""
+    end = date(year + 1, YEAR_START_MONTH, 1) - timedelta(days=1)
+    return date(year, YEAR_START_MONTH, 1).isoformat(), end.isoformat()
+
+
+def get_partitions(conn):
+    """Closed years, newest first (none before the registry migration)"""
+    if not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'donation_partitions'").fetchone():
+        return []
+    return [Partition(*row) for row in conn.execute('''
+        SELECT table_name, year, date_from, date_to, min_id, max_id
+        FROM donation_partitions ORDER BY date_from DESC
+    ''')]
+
+
+def closed_until(conn):
+    """Last day of the newest closed year, or None; donations may not be dated on or before it"""
+    partitions = get_partitions(conn)
+    return partitions[0].date_to if partitions else None
+
+
+def sources(conn, date_from=None, date_to=None):
+    """Tables holding donations dated within the range, newest first"""
+    partitions = get_partitions(conn)
+    tables = []
+    if not partitions or date_to is None or date_to > partitions[0].date_to:
+        tables.append('donations')
+    tables.extend(p.table_name for p in partitions
+                  if (date_from is None or date_from <= p.date_to)
+                  and (date_to is None or date_to >= p.date_from))
+    return tables
+
+
+def union_source(conn, date_from=None, date_to=None):
+    """FROM-clause source over the tables sources() picks for the range"""
+    tables = sources(conn, date_from, date_to)
+    if tables == ['donations']:
+        return 'donations'
+    return '(' + ' UNION ALL '.join(f'SELECT * FROM {table}' for table in tables) + ')'
+
+
+def _columns(cursor, table):
+    return [(row[1], row[2]) for row in cursor.execute(f'PRAGMA table_info({table})')]
+
+
+def _close(cursor, year, table, date_from, date_to):
+    columns = _columns(cursor, 'donations')
+    names = ', '.join(name for name, _ in columns)
+    cursor.execute(f'''
+        CREATE TABLE {table} (
+            {', '.join(f'{name} {kind}' for name, kind in columns)},
+            PRIMARY KEY (donation_date, donation_id)
+        ) WITHOUT ROWID''')
+    # Inserted in key order, so the table is written out densely
+    cursor.execute(f'''
+        INSERT INTO {table} ({names})
+        SELECT {names} FROM donations WHERE donation_date BETWEEN ? AND ?
+        ORDER BY donation_date, donation_id
+    ''', (date_from, date_to))
+    for column in INDEXED_COLUMNS:
+        cursor.execute(f'CREATE INDEX idx_{table}_{column} ON {table} ({column})')
+    for op in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER {table}_read_only_{op.lower()} BEFORE {op} ON {table}
+            BEGIN SELECT RAISE(ABORT, 'financial year {year} is closed'); END''')
+    cursor.execute(f'''
+        SELECT COUNT(*), COALESCE(SUM(amount), 0), MIN(donation_id), MAX(donation_id)
+        FROM {table}
+    ''')
+    count, total, min_id, max_id = cursor.fetchone()
+
+    # The moved rows still count towards lifetime totals, so the delete
+    # triggers are lifted while they leave the open table; readers are
+    # told about it through the version counter and one whole-table change
+    triggers = cursor.execute('''
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'trigger' AND tbl_name = 'donations' AND sql LIKE '%AFTER DELETE%'
+    ''').fetchall()
+    for name, _ in triggers:
+        cursor.execute(f'DROP TRIGGER {name}')
+    cursor.execute('DELETE FROM donations WHERE donation_date BETWEEN ? AND ?',
+                   (date_from, date_to))
+    for _, sql in triggers:
+        cursor.execute(sql)
+    cursor.execute(
+        "UPDATE table_versions SET version = version + 1 WHERE table_name = 'donations'")
+    cursor.execute("INSERT INTO change_log (table_name, op) VALUES ('donations', 'bulk')")
+
+    cursor.execute('''
+        INSERT INTO donation_partitions (table_name, year, date_from, date_to, min_id, max_id,
+                                         donation_count, total_amount, closed_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (table, year, date_from, date_to, min_id, max_id, count, total,
+          datetime.now().isoformat(timespec='seconds')))
+    return count, total
+
+
+def unclaimed_gift_aid(conn, date_from, date_to):
+    """Gift Aid donations from individuals in the range not yet included in a claim"""
+    return conn.execute('''
+        SELECT COUNT(*) FROM donations d
+        JOIN donors dn ON d.donor_id = dn.donor_id
+        WHERE d.gift_aid = 1 AND d.donation_date BETWEEN ? AND ?
+          AND dn.donor_type = 'individual'
+          AND NOT EXISTS (SELECT 1 FROM gift_aid_claimed c WHERE c.donation_id = d.donation_id)
+    ''', (date_from, date_to)).fetchone()[0]
+
+
+@emits_changes
+def close_year(year, force=False):
+    """Move financial year's donations into a read-only partition.
+
+    Refuses a year that has not ended, one with older open donations, or
+    (unless force) one with Gift Aid still to claim. Returns (donations
+    moved, their total).
+    """
+    date_from, date_to = year_bounds(year)
+    if date_to >= date.today().isoformat():
+        raise ValueError(f'financial year {year} runs until {date_to}')
+    with get_db() as conn:
+        if any(p.year == year for p in get_partitions(conn)):
+            raise ValueError(f'financial year {year} is already closed')
+        older = conn.execute('SELECT MIN(donation_date) FROM donations').fetchone()[0]
+        if older is not None and older < date_from:
+            raise ValueError(f'close the years before {year} first (open donations from {older})')
+        unclaimed = unclaimed_gift_aid(conn, date_from, date_to)
+    if unclaimed and not force:
+        raise ValueError(f'{unclaimed:,} Gift Aid donations in {year} are not yet claimed')
+    return writer.submit(_close, year, f'donations_fy{year}', date_from, date_to).result()
+
+
+def compact():
+    """Rewrite the database file to release the pages closed years freed"""
+    with get_db() as conn:
+        conn.execute('VACUUM')
+
+
+def get_closed_years():
+    with get_db() as conn:
+        return conn.execute('SELECT * FROM donation_partitions ORDER BY year').fetchall()
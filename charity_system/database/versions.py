@@ -0,0 +1,36 @@
+from database.db_connection import get_db
+
+# Tables whose writes bump a counter in table_versions. Readers remember the
+# versions they loaded and only re-query when a counter has moved.
+VERSIONED_TABLES = ('donors', 'volunteers', 'events', 'donations', 'event_volunteers')
+
+
+def create_steps():
+    """SQL creating table_versions and the triggers that bump it"""
+    steps = ['''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''']
+    for table in VERSIONED_TABLES:
+        steps.append(
+            f"INSERT OR IGNORE INTO table_versions (table_name, version) VALUES ('{table}', 0)")
+        for op in ('INSERT', 'UPDATE', 'DELETE'):
+            steps.append(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_version_{op.lower()}
+                AFTER {op} ON {table} BEGIN
+                    UPDATE table_versions SET version = version + 1
+                    WHERE table_name = '{table}';
+                END''')
+    return steps
+
+
+def table_versions(tables=VERSIONED_TABLES):
+    """Current change counters for the given tables, as a dict"""
+    tables = tuple(tables)
+    with get_db() as conn:
+        rows = conn.execute(
+            f"SELECT table_name, version FROM table_versions "
+            f"WHERE table_name IN ({', '.join('?' * len(tables))})", tables)
+        return {row['table_name']: row['version'] for row in rows}
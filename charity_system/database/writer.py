@@ -0,0 +1,158 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+from database.db_connection import get_db
+
+# Longest the writer holds a transaction open waiting for more operations
+# to share it, in seconds. It only waits while the group is smaller than
+# the previous one, i.e. while writers that took part last time have yet
+# to come back, so a lone writer never waits.
+GROUP_WINDOW = 0.002
+
+# Most operations committed in one transaction
+MAX_GROUP = 500
+
+# Result of a statement queued with WriteQueue.execute
+WriteResult = namedtuple('WriteResult', 'lastrowid rowcount')
+
+
+def _execute(cursor, sql, params):
+    cursor.execute(sql, params)
+    return WriteResult(cursor.lastrowid, cursor.rowcount)
+
+
+class WriteQueue:
+    """One thread that performs every model write, committing them in groups.
+
+    Callers on any thread queue an operation and get a Future back. The
+    writer takes whatever has queued up (waiting up to GROUP_WINDOW for
+    the previous group's writers to return), runs it all in one BEGIN IMMEDIATE
+    transaction with a savepoint per operation, commits once, and only
+    then resolves the futures. An operation that raises is rolled back to
+    its savepoint and its future gets the exception; the rest of the
+    group still commits.
+    """
+
+    def __init__(self, window=GROUP_WINDOW, max_group=MAX_GROUP):
+        self.window = window
+        self.max_group = max_group
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats = {'operations': 0, 'commits': 0, 'failed_operations': 0,
+                       'failed_commits': 0, 'largest_group': 0}
+
+    def submit(self, operation, *args):
+        """Queue operation(cursor, *args); the Future resolves to its result after commit"""
+        future = Future()
+        if threading.current_thread() is self._thread:
+            # Already inside the writer's transaction: run in place
+            with get_db() as conn:
+                try:
+                    future.set_result(operation(conn.cursor(), *args))
+                except Exception as e:
+                    future.set_exception(e)
+            return future
+        if self._thread is None:
+            self._start()
+        self._queue.put((operation, args, future))
+        return future
+
+    def execute(self, sql, params=()):
+        """Queue one statement; the Future resolves to a WriteResult"""
+        return self.submit(_execute, sql, params)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread = thread
+                thread.start()
+
+    def _take_group(self, first, expected):
+        group = [first]
+        deadline = time.monotonic() + self.window
+        while len(group) < self.max_group:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0 and len(group) < expected:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            group.append(item)
+        return group
+
+    def _run(self):
+        expected = 1
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            group = self._take_group(first, expected)
+            expected = len(group)
+            self._commit(group)
+
+    def _commit(self, group):
+        outcomes = []
+        try:
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute('BEGIN IMMEDIATE')
+                try:
+                    for operation, args, future in group:
+                        if not future.set_running_or_notify_cancel():
+                            continue
+                        cursor.execute('SAVEPOINT queued_write')
+                        try:
+                            outcomes.append((future, operation(cursor, *args), None))
+                        except Exception as e:
+                            cursor.execute('ROLLBACK TO queued_write')
+                            outcomes.append((future, None, e))
+                        cursor.execute('RELEASE queued_write')
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+        except Exception as e:
+            self._stats['failed_commits'] += 1
+            for _, _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self._stats['commits'] += 1
+        self._stats['operations'] += len(outcomes)
+        self._stats['largest_group'] = max(self._stats['largest_group'], len(outcomes))
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                self._stats['failed_operations'] += 1
+                future.set_exception(error)
+
+    def stats(self):
+        snapshot = dict(self._stats)
+        snapshot['queued'] = self._queue.qsize()
+        commits = snapshot['commits']
+        snapshot['mean_group'] = snapshot['operations'] / commits if commits else 0.0
+        return snapshot
+
+    def close(self):
+        """Let queued writes finish, then stop the writer thread"""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+            self._queue = queue.Queue()
+
+
+writer = WriteQueue()
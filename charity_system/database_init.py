@@ -1,9 +1,12 @@
+import os
 import sqlite3
 from pathlib import Path
+from database.migrations import migrate
 
-def create_database():
+def create_database(db_path=None):
     # Create the database file in the same directory as this script
-    db_path = Path(__file__).parent / 'charity.db'
+    if db_path is None:
+        db_path = os.environ.get('CHARITY_DB') or Path(__file__).parent / 'charity.db'
     
     # Connect to database (creates it if it doesn't exist)
     conn = sqlite3.connect(db_path)
@@ -78,8 +81,9 @@ def create_database():
     )
     ''')
     
-    # Commit the changes and close the connection
+    # Commit the base tables, then bring indexes etc. up to date
     conn.commit()
+    migrate(conn)
     conn.close()
 
 if __name__ == "__main__":
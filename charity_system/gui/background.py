@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+
+# How often the Tk thread checks whether a background query has finished
+POLL_MS = 25
+
+_executor = None
+
+
+def get_executor():
+    """Shared worker pool for database queries started from the GUI"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="gui-query")
+    return _executor
+
+
+class TaskChannel:
+    """Runs one kind of query for a widget, newest request wins.
+
+    Submitting a new task supersedes the previous one on the same channel:
+    a pending task is cancelled outright, and a running one has its result
+    dropped when it arrives. Callbacks always run on the Tk thread, which
+    polls the future with after() instead of being called from the worker.
+    """
+
+    def __init__(self, widget, on_busy=None):
+        self.widget = widget
+        self.on_busy = on_busy
+        self.generation = 0
+        self.future = None
+
+    @property
+    def busy(self):
+        return self.future is not None
+
+    def submit(self, func, on_done, on_error=None):
+        was_busy = self.busy
+        self._drop()
+        generation = self.generation
+        self.future = get_executor().submit(func)
+        if self.on_busy and not was_busy:
+            self.on_busy(True)
+        self.widget.after(POLL_MS, self._poll, self.future, generation, on_done, on_error)
+
+    def cancel(self):
+        """Forget the current task; its result will be ignored"""
+        was_busy = self.busy
+        self._drop()
+        if self.on_busy and was_busy:
+            self.on_busy(False)
+
+    def _drop(self):
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+        self.generation += 1
+
+    def _poll(self, future, generation, on_done, on_error):
+        if generation != self.generation:
+            return
+        if not future.done():
+            self.widget.after(POLL_MS, self._poll, future, generation, on_done, on_error)
+            return
+        self.future = None
+        if self.on_busy:
+            self.on_busy(False)
+        error = future.exception()
+        if error is not None:
+            if on_error:
+                on_error(error)
+            else:
+                raise error
+        else:
+            on_done(future.result())
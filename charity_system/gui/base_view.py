@@ -1,11 +1,69 @@
 import tkinter as tk
+from bisect import bisect_left
+from collections import deque
 from tkinter import ttk, messagebox
+from database.versions import table_versions
+from .background import TaskChannel
+
+# Rows fetched per page, and how many should stay loaded below the
+# visible window before the next page is requested
+PAGE_SIZE = 200
+PREFETCH_ROWS = 100
+
+# Rows inserted per idle callback when rendering large result sets
+INSERT_CHUNK = 500
+
+def _longest_increasing(sequence):
+    """Indexes of one longest strictly increasing subsequence of sequence"""
+    tails = []        # tails[k]: sequence index ending the best run of length k+1
+    tail_values = []
+    previous = [None] * len(sequence)
+    for index, value in enumerate(sequence):
+        k = bisect_left(tail_values, value)
+        if k:
+            previous[index] = tails[k - 1]
+        if k == len(tails):
+            tails.append(index)
+            tail_values.append(value)
+        else:
+            tails[k] = index
+            tail_values[k] = value
+    result = set()
+    index = tails[-1] if tails else None
+    while index is not None:
+        result.add(index)
+        index = previous[index]
+    return result
 
 class BaseView(ttk.Frame):
+    # Tables whose contents this view displays, see refresh_if_stale()
+    tables = ()
+    
     def __init__(self, parent):
         super().__init__(parent)
         self.grid(row=0, column=0, sticky="nsew")
         
+        # Table versions as of the last refresh_if_stale() reload
+        self._seen_versions = None
+        
+        # Paged loading state, see load_paged()
+        self._fetch_page = None
+        self._page_cursor = None
+        self._pages_exhausted = True
+        self._page_loading = False
+        self._loaded_rows = 0
+        self._replace_on_next_page = False
+        
+        # Rendering state, see render_rows(): iid -> values currently in the
+        # tree, and rows still waiting to be inserted
+        self._displayed = {}
+        self._pending_inserts = deque()
+        self._insert_job = None
+        
+        # Background query channels, see run_async()
+        self._channels = {}
+        self._busy_channels = set()
+        
         # Configure grid
         self.grid_rowconfigure(1, weight=1)
         self.grid_columnconfigure(0, weight=1)
@@ -32,6 +90,9 @@ class BaseView(ttk.Frame):
         ttk.Button(toolbar, text="Add New", command=self.add_new).pack(side=tk.RIGHT, padx=5)
         ttk.Button(toolbar, text="Refresh", command=self.refresh).pack(side=tk.RIGHT)
         
+        # Loading indicator, packed only while a query is running
+        self.loading_indicator = ttk.Progressbar(toolbar, mode="indeterminate", length=80)
+        
     def create_content(self):
         # Create Treeview
         self.tree_frame = ttk.Frame(self)
@@ -41,9 +102,9 @@ class BaseView(ttk.Frame):
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
         # Add scrollbar
-        scrollbar = ttk.Scrollbar(self.tree_frame, orient="vertical", command=self.tree.yview)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.scrollbar = ttk.Scrollbar(self.tree_frame, orient="vertical", command=self.tree.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.configure(yscrollcommand=self.on_tree_scroll)
         
         # Bind double-click event
         self.tree.bind("<Double-1>", self.on_double_click)
@@ -57,6 +118,216 @@ class BaseView(ttk.Frame):
             self.tree.heading(col, text=heading)
             self.tree.column(col, anchor="center")
     
+    def clear_tree(self):
+        """Remove every row from the treeview in a single Tk call"""
+        self._cancel_inserts()
+        self.tree.delete(*self.tree.get_children())
+        self._displayed = {}
+    
+    def render_rows(self, items):
+        """Make the tree show exactly items, (iid, values) pairs in display order.
+        
+        The new rows are diffed against what is on screen by iid: removed rows
+        go in one delete call, changed rows are updated in place and only new
+        rows are inserted, in INSERT_CHUNK batches across idle callbacks.
+        """
+        self._cancel_inserts()
+        new = {}
+        for iid, values in items:
+            new[str(iid)] = tuple(values)
+        shown = self._displayed
+        
+        removed = [iid for iid in shown if iid not in new]
+        if removed:
+            self.tree.delete(*removed)
+            for iid in removed:
+                del shown[iid]
+        
+        for iid, values in new.items():
+            if iid in shown and shown[iid] != values:
+                self.tree.item(iid, values=values)
+                shown[iid] = values
+        
+        # Rows that ended up out of order are deleted here and re-inserted
+        # with the new rows; the longest run already in order stays put
+        current = self.tree.get_children()
+        position = {iid: index for index, iid in enumerate(current)}
+        survivors = [iid for iid in new if iid in shown]
+        in_order = _longest_increasing([position[iid] for iid in survivors])
+        moved = [iid for index, iid in enumerate(survivors) if index not in in_order]
+        if moved:
+            self.tree.delete(*moved)
+            for iid in moved:
+                del shown[iid]
+        
+        self._queue_inserts([
+            (index, iid, values)
+            for index, (iid, values) in enumerate(new.items())
+            if iid not in shown
+        ])
+    
+    def append_rows(self, items):
+        """Add (iid, values) pairs after the rows already shown"""
+        self._queue_inserts([
+            ("end", str(iid), tuple(values))
+            for iid, values in items
+            if str(iid) not in self._displayed
+        ])
+    
+    def update_rows(self, items):
+        """Change the values of rows already shown, leaving the rest alone"""
+        for iid, values in items:
+            iid, values = str(iid), tuple(values)
+            if iid in self._displayed and self._displayed[iid] != values:
+                self.tree.item(iid, values=values)
+                self._displayed[iid] = values
+    
+    def remove_rows(self, iids):
+        """Delete rows from the tree without reloading the rest"""
+        iids = [str(iid) for iid in iids if str(iid) in self._displayed]
+        if iids:
+            self.tree.delete(*iids)
+            for iid in iids:
+                del self._displayed[iid]
+            self._loaded_rows -= len(iids)
+    
+    def _queue_inserts(self, inserts):
+        self._pending_inserts.extend(inserts)
+        if self._insert_job is None and self._pending_inserts:
+            # First chunk right away so something is on screen immediately
+            self._insert_pending()
+    
+    def _insert_pending(self):
+        self._insert_job = None
+        for _ in range(min(INSERT_CHUNK, len(self._pending_inserts))):
+            index, iid, values = self._pending_inserts.popleft()
+            self.tree.insert("", index, iid, values=values)
+            self._displayed[iid] = values
+        if self._pending_inserts:
+            self._insert_job = self.after_idle(self._insert_pending)
+    
+    def _cancel_inserts(self):
+        if self._insert_job is not None:
+            self.after_cancel(self._insert_job)
+            self._insert_job = None
+        self._pending_inserts.clear()
+    
+    def run_async(self, func, on_done, channel="load", on_error=None):
+        """Run func() on a worker thread and pass its result to on_done.
+        
+        on_done runs on the Tk thread. A newer request on the same channel
+        supersedes an older one, whose result is then discarded.
+        """
+        if channel not in self._channels:
+            self._channels[channel] = TaskChannel(
+                self, on_busy=lambda busy, name=channel: self.set_busy(name, busy))
+        self._channels[channel].submit(func, on_done, on_error or self.show_error)
+    
+    def set_busy(self, channel, busy):
+        """Show the loading indicator while any channel has a query running"""
+        was_busy = bool(self._busy_channels)
+        if busy:
+            self._busy_channels.add(channel)
+        else:
+            self._busy_channels.discard(channel)
+        if self._busy_channels and not was_busy:
+            self.loading_indicator.pack(side=tk.RIGHT, padx=5)
+            self.loading_indicator.start(10)
+        elif was_busy and not self._busy_channels:
+            self.loading_indicator.stop()
+            self.loading_indicator.pack_forget()
+    
+    def show_error(self, error):
+        """Report a failed background query"""
+        messagebox.showerror("Error", str(error))
+    
+    def load_paged(self, fetch_page, row_item, page_key, keep_loaded=False):
+        """Show a large result set one page at a time.
+        
+        fetch_page(after, limit) returns the rows following the keyset cursor
+        `after` (None for the first page), row_item(row) gives the row's
+        (iid, values) and page_key(row) its cursor. Only the rows the user
+        has scrolled past plus PREFETCH_ROWS are ever materialized.
+        
+        With keep_loaded, as many rows as are already loaded are re-fetched
+        in one go and diffed against the tree, so a refresh after an edit
+        keeps the scroll position and touches only the changed rows.
+        """
+        first_limit = max(PAGE_SIZE, self._loaded_rows) if keep_loaded else PAGE_SIZE
+        self._fetch_page = fetch_page
+        self._row_item = row_item
+        self._page_key = page_key
+        self._page_cursor = None
+        self._pages_exhausted = False
+        self._page_loading = False
+        self._loaded_rows = 0
+        # Keep the old rows on screen until the first new page arrives
+        self._replace_on_next_page = True
+        self.load_next_page(first_limit)
+    
+    def load_next_page(self, limit=PAGE_SIZE):
+        """Fetch the next page in the background if one is due"""
+        if self._pages_exhausted or self._page_loading:
+            return
+        self._page_loading = True
+        fetch_page, cursor = self._fetch_page, self._page_cursor
+        self.run_async(lambda: fetch_page(cursor, limit),
+                       lambda rows: self.show_page(rows, limit),
+                       on_error=self.page_failed)
+    
+    def show_page(self, rows, limit=PAGE_SIZE):
+        """Add a fetched page to the tree"""
+        self._page_loading = False
+        items = (self._row_item(row) for row in rows)
+        if self._replace_on_next_page:
+            self.render_rows(items)
+            self._replace_on_next_page = False
+        else:
+            self.append_rows(items)
+        if rows:
+            self._page_cursor = self._page_key(rows[-1])
+        self._loaded_rows += len(rows)
+        self._pages_exhausted = len(rows) < limit
+        self.data_loaded()
+    
+    def refresh_if_stale(self):
+        """Refresh only if one of self.tables changed since the last check"""
+        versions = table_versions(self.tables)
+        if versions != self._seen_versions:
+            self._seen_versions = versions
+            self.refresh()
+    
+    def apply_changes(self, changes):
+        """Catch up with writes reported by the change feed.
+        
+        changes are database.changes.Change tuples for this view's tables.
+        By default the view reloads; views that can patch their rows in
+        place override this and call mark_current() afterwards.
+        """
+        self.refresh_if_stale()
+    
+    def mark_current(self):
+        """Record the data on screen as up to date with the database"""
+        self._seen_versions = table_versions(self.tables)
+    
+    def data_loaded(self):
+        """Tell listeners (e.g. startup timing) that rows are on screen"""
+        self.event_generate("<<DataLoaded>>")
+    
+    def page_failed(self, error):
+        self._page_loading = False
+        self._pages_exhausted = True
+        self.show_error(error)
+    
+    def on_tree_scroll(self, first, last):
+        """Keep the scrollbar in sync and prefetch when nearing the end"""
+        self.scrollbar.set(first, last)
+        if self._pages_exhausted:
+            return
+        remaining = (1.0 - float(last)) * self._loaded_rows
+        if remaining < PREFETCH_ROWS:
+            self.after_idle(self.load_next_page)
+    
     def add_new(self):
         """Override in child class"""
         pass
@@ -0,0 +1,157 @@
+import time
+import tkinter as tk
+from tkinter import ttk, messagebox
+from database.versions import table_versions
+from services import analytics
+from .background import TaskChannel
+
+# Each tile reloads only when one of its tables has changed since it was
+# last shown: name -> (tables, fetch)
+TILES = {
+    'summary': (('donations',), analytics.summary),
+    'top_donors': (('donations', 'donors'), analytics.top_donors),
+    'upcoming_events': (('events', 'volunteers', 'event_volunteers'), analytics.upcoming_events),
+}
+
+# Headline figures: (summary key, caption, format)
+KPIS = (
+    ('total_amount', "Total Raised", "£{:,.2f}"),
+    ('donation_count', "Donations", "{:,}"),
+    ('gift_aid_share', "Gift Aid Share", "{:.1f}%"),
+    ('active_donors', "Active Donors", "{:,}"),
+    ('month_amount', "This Month", "£{:,.2f}"),
+)
+
+class DashboardView(ttk.Frame):
+    tables = tuple(sorted({table for tables, _ in TILES.values() for table in tables}))
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.grid(row=0, column=0, sticky="nsew")
+
+        # Table versions each tile was last loaded at, and its query channel
+        self._seen_versions = {}
+        self._channels = {name: TaskChannel(self) for name in TILES}
+        self._pending = set()
+        self._started = None
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_columnconfigure(1, weight=1)
+        self.grid_rowconfigure(2, weight=1)
+
+        self.create_toolbar()
+        self.create_kpis()
+        self.create_lists()
+
+    def create_toolbar(self):
+        toolbar = ttk.Frame(self)
+        toolbar.grid(row=0, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
+
+        ttk.Label(toolbar, text="Dashboard", font=('Helvetica', 14, 'bold')).pack(side=tk.LEFT)
+        ttk.Button(toolbar, text="Refresh", command=self.refresh).pack(side=tk.RIGHT)
+        self.status_label = ttk.Label(toolbar, foreground="grey")
+        self.status_label.pack(side=tk.RIGHT, padx=10)
+
+    def create_kpis(self):
+        kpi_frame = ttk.Frame(self)
+        kpi_frame.grid(row=1, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
+
+        self.kpi_labels = {}
+        for column, (key, caption, _) in enumerate(KPIS):
+            kpi_frame.grid_columnconfigure(column, weight=1)
+            tile = ttk.LabelFrame(kpi_frame, text=caption, padding=10)
+            tile.grid(row=0, column=column, sticky="nsew", padx=5)
+            label = ttk.Label(tile, text="-", font=('Helvetica', 18, 'bold'))
+            label.pack()
+            self.kpi_labels[key] = label
+
+    def create_lists(self):
+        donors_frame = ttk.LabelFrame(self, text="Top Donors", padding=5)
+        donors_frame.grid(row=2, column=0, sticky="nsew", padx=5, pady=5)
+        self.donors_tree = self.create_tree(
+            donors_frame, ("name", "donations", "total"), ("Donor", "Donations", "Total"))
+
+        events_frame = ttk.LabelFrame(self, text="Upcoming Events", padding=5)
+        events_frame.grid(row=2, column=1, sticky="nsew", padx=5, pady=5)
+        self.events_tree = self.create_tree(
+            events_frame, ("date", "time", "name", "room", "organizer", "volunteers"),
+            ("Date", "Time", "Event", "Room", "Organizer", "Volunteers"))
+
+    def create_tree(self, parent, columns, headings):
+        tree = ttk.Treeview(parent, columns=columns, show="headings", height=10)
+        for col, heading in zip(columns, headings):
+            tree.heading(col, text=heading)
+            tree.column(col, anchor="center", width=90)
+        tree.pack(fill=tk.BOTH, expand=True)
+        return tree
+
+    def refresh_if_stale(self):
+        """Reload the tiles whose tables changed since they were last shown"""
+        versions = table_versions(self.tables)
+        stale = [
+            name for name, (tables, _) in TILES.items()
+            if self._seen_versions.get(name) != {table: versions.get(table) for table in tables}
+        ]
+        for name in stale:
+            tables = TILES[name][0]
+            self._seen_versions[name] = {table: versions.get(table) for table in tables}
+        self.load_tiles(stale)
+
+    def apply_changes(self, changes):
+        """Writes reported by the change feed reload just the affected tiles.
+
+        Tiles are re-queried rather than patched from the changes: a Change
+        carries no amounts, so a deleted or edited donation's old value is
+        gone. The queries read donation_totals, the top donors off its
+        ranking index, so a reload costs a few index lookups.
+        """
+        self.refresh_if_stale()
+
+    def refresh(self):
+        """Reload every tile"""
+        self._seen_versions = {}
+        self.refresh_if_stale()
+
+    def load_tiles(self, names):
+        if not names:
+            return
+        self._started = time.perf_counter()
+        self._pending.update(names)
+        for name in names:
+            fetch = TILES[name][1]
+            self._channels[name].submit(
+                fetch, lambda result, name=name: self.show_tile(name, result), self.show_error)
+
+    def show_tile(self, name, result):
+        getattr(self, "show_" + name)(result)
+        self._pending.discard(name)
+        if not self._pending:
+            elapsed = (time.perf_counter() - self._started) * 1000
+            self.status_label.config(text=f"Updated {time.strftime('%H:%M:%S')} ({elapsed:.0f} ms)")
+            self.event_generate("<<DataLoaded>>")
+
+    def show_summary(self, summary):
+        for key, _, fmt in KPIS:
+            self.kpi_labels[key].config(text=fmt.format(summary[key]))
+
+    def show_top_donors(self, donors):
+        self.fill_tree(self.donors_tree, [
+            (donor['donor_id'], (donor['donor_name'], donor['donation_count'], f"£{donor['total_amount']:,.2f}"))
+            for donor in donors
+        ])
+
+    def show_upcoming_events(self, events):
+        self.fill_tree(self.events_tree, [
+            (event['event_id'], (event['booking_date'], event['booking_time'], event['event_name'],
+                                 event['room_name'], event['organizer_name'] or "", event['volunteer_count']))
+            for event in events
+        ])
+
+    def fill_tree(self, tree, items):
+        """Replace a short list; tiles hold a handful of rows"""
+        tree.delete(*tree.get_children())
+        for iid, values in items:
+            tree.insert("", "end", iid=str(iid), values=values)
+
+    def show_error(self, error):
+        messagebox.showerror("Error", str(error))
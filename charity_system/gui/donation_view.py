@@ -1,14 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from models.donation import Donation
-from models.donor import Donor
-from models.event import Event
-from models.volunteer import Volunteer
 from datetime import datetime
 from tkcalendar import DateEntry
 from .base_view import BaseView
+from .lookup_combobox import LookupCombobox
+
+# Edits touching only these columns leave a donation where it is in every
+# listing, so the row can be patched instead of reloading the page
+PATCHABLE_COLUMNS = {'amount', 'gift_aid', 'notes'}
+PATCH_LIMIT = 100
 
 class DonationView(BaseView):
+    tables = ('donations', 'donors', 'events', 'volunteers')
+    
     def __init__(self, parent):
         super().__init__(parent)
         
@@ -20,9 +25,6 @@ class DonationView(BaseView):
         # Add filter options to toolbar
         self.add_filters()
         
-        # Initial data load
-        self.refresh()
-        
     def add_filters(self):
         """Add filter options to the toolbar"""
         filter_frame = ttk.Frame(self)
@@ -30,64 +32,71 @@ class DonationView(BaseView):
         
         # Donor filter
         ttk.Label(filter_frame, text="Filter by Donor:").pack(side=tk.LEFT, padx=5)
-        self.donor_var = tk.StringVar()
-        donors = Donor.get_all()
-        donor_cb = ttk.Combobox(filter_frame, textvariable=self.donor_var, width=20)
-        donor_cb['values'] = ["All"] + [
-            f"{d['donor_id']}: {d['business_name'] or f'{d['first_name']} {d['surname']}'}"
-            for d in donors
-        ]
-        donor_cb.current(0)
-        donor_cb.pack(side=tk.LEFT, padx=5)
+        self.donor_var = tk.StringVar(value="All")
+        self.donor_filter = LookupCombobox(filter_frame, "donors", blank="All",
+                                           textvariable=self.donor_var, width=20)
+        self.donor_filter.pack(side=tk.LEFT, padx=5)
         
         # Event filter
         ttk.Label(filter_frame, text="Filter by Event:").pack(side=tk.LEFT, padx=5)
-        self.event_var = tk.StringVar()
-        events = Event.get_all()
-        event_cb = ttk.Combobox(filter_frame, textvariable=self.event_var, width=20)
-        event_cb['values'] = ["All"] + [
-            f"{e['event_id']}: {e['event_name']}"
-            for e in events
-        ]
-        event_cb.current(0)
-        event_cb.pack(side=tk.LEFT, padx=5)
+        self.event_var = tk.StringVar(value="All")
+        self.event_filter = LookupCombobox(filter_frame, "events", blank="All",
+                                           textvariable=self.event_var, width=20)
+        self.event_filter.pack(side=tk.LEFT, padx=5)
         
         # Volunteer filter
         ttk.Label(filter_frame, text="Filter by Volunteer:").pack(side=tk.LEFT, padx=5)
-        self.volunteer_var = tk.StringVar()
-        volunteers = Volunteer.get_all()
-        volunteer_cb = ttk.Combobox(filter_frame, textvariable=self.volunteer_var, width=20)
-        volunteer_cb['values'] = ["All"] + [
-            f"{v['volunteer_id']}: {v['first_name']} {v['surname']}"
-            for v in volunteers
-        ]
-        volunteer_cb.current(0)
-        volunteer_cb.pack(side=tk.LEFT, padx=5)
+        self.volunteer_var = tk.StringVar(value="All")
+        self.volunteer_filter = LookupCombobox(filter_frame, "volunteers", blank="All",
+                                               textvariable=self.volunteer_var, width=20)
+        self.volunteer_filter.pack(side=tk.LEFT, padx=5)
         
         # Apply filters button
         ttk.Button(filter_frame, text="Apply Filters", 
                   command=self.apply_filters).pack(side=tk.LEFT, padx=5)
         
     def refresh(self):
-        """Load all donations into the treeview"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        """Reload donations, updating only rows that changed"""
+        self.load_donations(keep_loaded=True)
+        
+    def load_donations(self, keep_loaded=False, **filters):
+        """Page through donations matching filters, newest first"""
+        self.load_paged(
+            lambda after, limit: Donation.get_page(after, limit, **filters),
+            self.donation_item,
+            Donation.page_key,
+            keep_loaded=keep_loaded
+        )
             
-        donations = Donation.get_all()
-        self.populate_tree(donations)
+    def apply_changes(self, changes):
+        """Patch edited and deleted donations in place, reload otherwise"""
+        patchable = all(
+            change.table == 'donations' and change.op in ('update', 'delete')
+            and set(change.columns) <= PATCHABLE_COLUMNS
+            for change in changes
+        )
+        if not patchable or len(changes) > PATCH_LIMIT:
+            self.refresh_if_stale()
+            return
+        self.remove_rows(change.key for change in changes if change.op == 'delete')
+        updated = {change.key for change in changes if change.op == 'update'}
+        self.mark_current()
+        if updated:
+            self.run_async(lambda: Donation.get_by_ids(updated),
+                           lambda rows: self.update_rows(self.donation_item(row) for row in rows),
+                           channel="patch")
             
-    def populate_tree(self, donations):
-        """Populate treeview with donation data"""
-        for donation in donations:
-            self.tree.insert("", "end", donation['donation_id'], values=(
-                donation['donation_id'],
-                f"£{donation['amount']:.2f}",
-                donation['donation_date'],
-                donation['donor_name'],
-                donation['event_name'] or "No Event",
-                donation['collector_name'],
-                "Yes" if donation['gift_aid'] else "No"
-            ))
+    def donation_item(self, donation):
+        """Treeview iid and values for a donation row"""
+        return donation['donation_id'], (
+            donation['donation_id'],
+            f"£{donation['amount']:.2f}",
+            donation['donation_date'],
+            donation['donor_name'],
+            donation['event_name'] or "No Event",
+            donation['collector_name'],
+            "Yes" if donation['gift_aid'] else "No"
+        )
             
     def add_new(self):
         """Open dialog to add new donation"""
@@ -102,7 +111,6 @@ class DonationView(BaseView):
     def delete_item(self, item_id):
         """Delete donation"""
         if Donation.delete(item_id):
-            self.refresh()
             messagebox.showinfo("Success", "Donation deleted successfully")
         else:
             messagebox.showerror("Error", "Failed to delete donation")
@@ -110,36 +118,15 @@ class DonationView(BaseView):
     def search(self):
         """Search donations"""
         term = self.search_var.get()
-        
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
-        donations = Donation.search(term=term)
-        self.populate_tree(donations)
+        self.load_donations(term=term)
             
     def apply_filters(self):
         """Apply selected filters"""
-        donor_id = None
-        if self.donor_var.get() != "All":
-            donor_id = int(self.donor_var.get().split(':')[0])
-            
-        event_id = None
-        if self.event_var.get() != "All":
-            event_id = int(self.event_var.get().split(':')[0])
-            
-        volunteer_id = None
-        if self.volunteer_var.get() != "All":
-            volunteer_id = int(self.volunteer_var.get().split(':')[0])
-            
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
-        donations = Donation.search(
-            donor_id=donor_id,
-            event_id=event_id,
-            volunteer_id=volunteer_id
+        self.load_donations(
+            donor_id=self.donor_filter.get_id(),
+            event_id=self.event_filter.get_id(),
+            volunteer_id=self.volunteer_filter.get_id()
         )
-        self.populate_tree(donations)
             
     def open_donation_dialog(self, donation=None):
         """Open dialog to add/edit donation"""
@@ -164,49 +151,22 @@ class DonationView(BaseView):
             date_entry.set_date(datetime.strptime(donation['donation_date'], '%Y-%m-%d'))
             
         ttk.Label(dialog, text="Donor:*").pack(pady=5)
-        donors = Donor.get_all()
-        donor_id = tk.StringVar()
-        donor = ttk.Combobox(dialog, textvariable=donor_id)
-        donor['values'] = [
-            f"{d['donor_id']}: {d['business_name'] or f'{d['first_name']} {d['surname']}'}"
-            for d in donors
-        ]
+        donor = LookupCombobox(dialog, "donors")
         donor.pack(pady=5)
         if donation:
-            for i, d in enumerate(donors):
-                if d['donor_id'] == donation['donor_id']:
-                    donor.current(i)
-                    break
+            donor.set_id(donation['donor_id'], donation['donor_name'])
                     
         ttk.Label(dialog, text="Event:").pack(pady=5)
-        events = Event.get_all()
-        event_id = tk.StringVar()
-        event = ttk.Combobox(dialog, textvariable=event_id)
-        event['values'] = [""] + [
-            f"{e['event_id']}: {e['event_name']}"
-            for e in events
-        ]
+        event = LookupCombobox(dialog, "events", blank="")
         event.pack(pady=5)
         if donation and donation['event_id']:
-            for i, e in enumerate(events):
-                if e['event_id'] == donation['event_id']:
-                    event.current(i + 1)
-                    break
+            event.set_id(donation['event_id'], donation['event_name'])
                     
         ttk.Label(dialog, text="Collected By:*").pack(pady=5)
-        volunteers = Volunteer.get_all()
-        collector_id = tk.StringVar()
-        collector = ttk.Combobox(dialog, textvariable=collector_id)
-        collector['values'] = [
-            f"{v['volunteer_id']}: {v['first_name']} {v['surname']}"
-            for v in volunteers
-        ]
+        collector = LookupCombobox(dialog, "volunteers")
         collector.pack(pady=5)
         if donation:
-            for i, v in enumerate(volunteers):
-                if v['volunteer_id'] == donation['collected_by']:
-                    collector.current(i)
-                    break
+            collector.set_id(donation['collected_by'], donation['collector_name'])
                     
         gift_aid = tk.BooleanVar(value=donation['gift_aid'] if donation else False)
         ttk.Checkbutton(dialog, text="Gift Aid", variable=gift_aid).pack(pady=5)
@@ -225,11 +185,12 @@ class DonationView(BaseView):
                 
             try:
                 # Get IDs from combobox selections
-                donor_id = int(donor.get().split(':')[0])
-                collector_id = int(collector.get().split(':')[0])
-                evt_id = None
-                if event.get():
-                    evt_id = int(event.get().split(':')[0])
+                donor_id = donor.get_id()
+                collector_id = collector.get_id()
+                evt_id = event.get_id()
+                if donor_id is None or collector_id is None:
+                    messagebox.showerror("Error", "Choose the donor and collector from the list")
+                    return
                 
                 if donation:
                     success = Donation.update(
@@ -248,7 +209,6 @@ class DonationView(BaseView):
                 
                 if success:
                     dialog.destroy()
-                    self.refresh()
                     messagebox.showinfo("Success", 
                         "Donation updated successfully" if donation 
                         else "Donation added successfully")
@@ -1,9 +1,12 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from models.donor import Donor
+from services import dedup
 from .base_view import BaseView
 
 class DonorView(BaseView):
+    tables = ('donors',)
+    
     def __init__(self, parent):
         super().__init__(parent)
         
@@ -12,26 +15,25 @@ class DonorView(BaseView):
         headings = ("ID", "Name", "Type", "Phone", "Postcode")
         self.configure_tree_columns(columns, headings)
         
-        # Initial data load
-        self.refresh()
-        
     def refresh(self):
         """Load all donors into the treeview"""
-        # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.run_async(Donor.get_all, self.show_donors)
+            
+    def show_donors(self, donors):
+        """Show donors, updating only the rows that changed"""
+        self.render_rows(self.donor_item(donor) for donor in donors)
+        self.data_loaded()
             
-        # Load donors
-        donors = Donor.get_all()
-        for donor in donors:
-            name = donor['business_name'] if donor['business_name'] else f"{donor['first_name']} {donor['surname']}"
-            self.tree.insert("", "end", donor['donor_id'], values=(
-                donor['donor_id'],
-                name,
-                donor['donor_type'],
-                donor['phone_number'],
-                donor['postcode']
-            ))
+    def donor_item(self, donor):
+        """Treeview iid and values for a donor row"""
+        name = donor['business_name'] if donor['business_name'] else f"{donor['first_name']} {donor['surname']}"
+        return donor['donor_id'], (
+            donor['donor_id'],
+            name,
+            donor['donor_type'],
+            donor['phone_number'],
+            donor['postcode']
+        )
             
     def add_new(self):
         """Open dialog to add new donor"""
@@ -46,30 +48,17 @@ class DonorView(BaseView):
     def delete_item(self, item_id):
         """Delete donor"""
         if Donor.delete(item_id):
-            self.refresh()
             messagebox.showinfo("Success", "Donor deleted successfully")
-        else:
-            messagebox.showerror("Error", "Cannot delete donor with existing donations")
+        elif messagebox.askyesno("Archive", 
+                "This donor has donations, so it cannot be deleted.\n\n"
+                "Archive the donor and their donations instead?"):
+            if Donor.delete(item_id, archive=True):
+                messagebox.showinfo("Success", "Donor archived successfully")
             
     def search(self):
         """Search donors"""
         term = self.search_var.get()
-        
-        # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
-        # Load matching donors
-        donors = Donor.search(term)
-        for donor in donors:
-            name = donor['business_name'] if donor['business_name'] else f"{donor['first_name']} {donor['surname']}"
-            self.tree.insert("", "end", donor['donor_id'], values=(
-                donor['donor_id'],
-                name,
-                donor['donor_type'],
-                donor['phone_number'],
-                donor['postcode']
-            ))
+        self.run_async(lambda: Donor.search(term), self.show_donors)
             
     def open_donor_dialog(self, donor=None):
         """Open dialog to add/edit donor"""
@@ -139,6 +128,12 @@ class DonorView(BaseView):
                         phone_number.get(), donor_type.get()
                     )
                 else:
+                    if not self.confirm_not_duplicate({
+                        'first_name': first_name.get(), 'surname': surname.get(),
+                        'business_name': business_name.get(), 'postcode': postcode.get(),
+                        'house_number': house_number.get(), 'phone_number': phone_number.get(),
+                    }):
+                        return
                     success = Donor.create(
                         first_name.get(), surname.get(), business_name.get(),
                         postcode.get(), house_number.get(), phone_number.get(),
@@ -147,7 +142,6 @@ class DonorView(BaseView):
                 
                 if success:
                     dialog.destroy()
-                    self.refresh()
                     messagebox.showinfo("Success", 
                                       "Donor updated successfully" if donor 
                                       else "Donor added successfully")
@@ -156,3 +150,17 @@ class DonorView(BaseView):
                 
         ttk.Button(dialog, text="Save", command=save).pack(pady=20)
         ttk.Button(dialog, text="Cancel", command=dialog.destroy).pack(pady=5)
+        
+    def confirm_not_duplicate(self, fields):
+        """Warn when a new donor looks like one already on file; True to go ahead"""
+        matches = dedup.likely_duplicates(fields)
+        if not matches:
+            return True
+        lines = []
+        for score, row in matches:
+            name = row['business_name'] if row['business_name'] else f"{row['first_name']} {row['surname']}"
+            lines.append(f"#{row['donor_id']} {name}, {row['postcode']} ({score:.0%} match)")
+        listing = "\n".join(lines)
+        return messagebox.askyesno(
+            "Possible Duplicate",
+            f"This donor looks like an existing record:\n\n{listing}\n\nAdd anyway?")
@@ -1,12 +1,17 @@
+import bisect
 import tkinter as tk
 from tkinter import ttk, messagebox
 from models.event import Event
+from models.scheduling import DEFAULT_DURATION, MAX_DURATION, InvalidBooking, SchedulingConflict
 from models.volunteer import Volunteer
 from datetime import datetime
 from tkcalendar import DateEntry
 from .base_view import BaseView
+from .lookup_combobox import LookupCombobox
 
 class EventView(BaseView):
+    tables = ('events', 'volunteers')
+    
     def __init__(self, parent):
         super().__init__(parent)
         
@@ -19,25 +24,26 @@ class EventView(BaseView):
         ttk.Button(self.tree_frame, text="Manage Volunteers", 
                   command=self.manage_volunteers).pack(side=tk.BOTTOM, pady=5)
         
-        # Initial data load
-        self.refresh()
-        
     def refresh(self):
         """Load all events into the treeview"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.run_async(Event.get_all, self.show_events)
+            
+    def show_events(self, events):
+        """Show events, updating only the rows that changed"""
+        self.render_rows(self.event_item(event) for event in events)
+        self.data_loaded()
             
-        events = Event.get_all()
-        for event in events:
-            self.tree.insert("", "end", event['event_id'], values=(
-                event['event_id'],
-                event['event_name'],
-                event['room_name'],
-                event['booking_date'],
-                event['booking_time'],
-                f"£{event['cost']:.2f}",
-                event['organizer_name'] or "No Organizer"
-            ))
+    def event_item(self, event):
+        """Treeview iid and values for an event row"""
+        return event['event_id'], (
+            event['event_id'],
+            event['event_name'],
+            event['room_name'],
+            event['booking_date'],
+            event['booking_time'],
+            f"£{event['cost']:.2f}",
+            event['organizer_name'] or "No Organizer"
+        )
             
     def add_new(self):
         """Open dialog to add new event"""
@@ -52,29 +58,17 @@ class EventView(BaseView):
     def delete_item(self, item_id):
         """Delete event"""
         if Event.delete(item_id):
-            self.refresh()
             messagebox.showinfo("Success", "Event deleted successfully")
-        else:
-            messagebox.showerror("Error", "Cannot delete event with existing donations")
+        elif messagebox.askyesno("Archive", 
+                "This event has donations, so it cannot be deleted.\n\n"
+                "Archive the event and its donations instead?"):
+            if Event.delete(item_id, archive=True):
+                messagebox.showinfo("Success", "Event archived successfully")
             
     def search(self):
         """Search events"""
         term = self.search_var.get()
-        
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
-        events = Event.search(term)
-        for event in events:
-            self.tree.insert("", "end", event['event_id'], values=(
-                event['event_id'],
-                event['event_name'],
-                event['room_name'],
-                event['booking_date'],
-                event['booking_time'],
-                f"£{event['cost']:.2f}",
-                event['organizer_name'] or "No Organizer"
-            ))
+        self.run_async(lambda: Event.search(term), self.show_events)
             
     def open_event_dialog(self, event=None):
         """Open dialog to add/edit event"""
@@ -117,6 +111,11 @@ class EventView(BaseView):
             hour.set(time.hour)
             minute.set(time.minute)
             
+        ttk.Label(dialog, text="Duration (minutes):*").pack(pady=5)
+        duration = ttk.Spinbox(dialog, from_=15, to=MAX_DURATION, increment=15, width=6)
+        duration.pack(pady=5)
+        duration.set(event['duration_minutes'] if event else DEFAULT_DURATION)
+            
         ttk.Label(dialog, text="Cost (£):*").pack(pady=5)
         cost = ttk.Entry(dialog)
         cost.pack(pady=5)
@@ -124,19 +123,10 @@ class EventView(BaseView):
             cost.insert(0, f"{event['cost']:.2f}")
             
         ttk.Label(dialog, text="Organizer:").pack(pady=5)
-        volunteers = Volunteer.get_all()
-        organizer_id = tk.StringVar()
-        organizer = ttk.Combobox(dialog, textvariable=organizer_id)
-        organizer['values'] = [""] + [
-            f"{v['volunteer_id']}: {v['first_name']} {v['surname']}" 
-            for v in volunteers
-        ]
+        organizer = LookupCombobox(dialog, "volunteers", blank="")
         organizer.pack(pady=5)
         if event and event['organizer_id']:
-            for i, v in enumerate(volunteers):
-                if v['volunteer_id'] == event['organizer_id']:
-                    organizer.current(i + 1)
-                    break
+            organizer.set_id(event['organizer_id'], event['organizer_name'])
             
         def save():
             # Validate required fields
@@ -148,30 +138,32 @@ class EventView(BaseView):
             try:
                 # Format time
                 time_str = f"{int(hour.get()):02d}:{int(minute.get()):02d}"
+                date_str = booking_date.get_date().strftime('%Y-%m-%d')
                 # Get organizer ID
-                org_id = None
-                if organizer.get():
-                    org_id = int(organizer.get().split(':')[0])
+                org_id = organizer.get_id()
                 
                 if event:
                     success = Event.update(
                         event['event_id'], event_name.get(), room_name.get(),
-                        booking_date.get(), time_str, float(cost.get()), org_id
+                        date_str, time_str, float(cost.get()), org_id, int(duration.get())
                     )
                 else:
                     success = Event.create(
-                        event_name.get(), room_name.get(), booking_date.get(),
-                        time_str, float(cost.get()), org_id
+                        event_name.get(), room_name.get(), date_str,
+                        time_str, float(cost.get()), org_id, int(duration.get())
                     )
                 
                 if success:
                     dialog.destroy()
-                    self.refresh()
                     messagebox.showinfo("Success", 
                         "Event updated successfully" if event 
                         else "Event added successfully")
+            except SchedulingConflict as e:
+                messagebox.showerror("Booking Conflict", str(e))
+            except InvalidBooking as e:
+                messagebox.showerror("Error", str(e))
             except ValueError as e:
-                messagebox.showerror("Error", "Invalid cost value")
+                messagebox.showerror("Error", "Invalid cost or duration value")
             except Exception as e:
                 messagebox.showerror("Error", str(e))
                 
@@ -205,7 +197,8 @@ class EventView(BaseView):
         
         # Available volunteers
         ttk.Label(left_frame, text="Available Volunteers").pack()
-        available_tree = ttk.Treeview(left_frame, columns=("id", "name"), show="headings")
+        available_tree = ttk.Treeview(left_frame, columns=("id", "name"), show="headings",
+                                      selectmode="extended")
         available_tree.heading("id", text="ID")
         available_tree.heading("name", text="Name")
         available_tree.pack(fill=tk.BOTH, expand=True)
@@ -213,7 +206,7 @@ class EventView(BaseView):
         # Assigned volunteers
         ttk.Label(right_frame, text="Assigned Volunteers").pack()
         assigned_tree = ttk.Treeview(right_frame, columns=("id", "name", "role"), 
-                                   show="headings")
+                                   show="headings", selectmode="extended")
         assigned_tree.heading("id", text="ID")
         assigned_tree.heading("name", text="Name")
         assigned_tree.heading("role", text="Role")
@@ -249,17 +242,32 @@ class EventView(BaseView):
                         f"{v['first_name']} {v['surname']}"
                     ))
         
+        def move_rows(source, target, volunteer_ids, role=None):
+            """Move rows between the trees without re-reading volunteers"""
+            positions = [int(item) for item in target.get_children()]
+            for volunteer_id in sorted(volunteer_ids):
+                values = source.item(volunteer_id, "values")[:2]
+                source.delete(volunteer_id)
+                if role is not None:
+                    values = (*values, role)
+                # Keep the target in id order
+                index = bisect.bisect(positions, volunteer_id)
+                positions.insert(index, volunteer_id)
+                target.insert("", index, volunteer_id, values=values)
+            target.selection_set([str(v_id) for v_id in volunteer_ids])
+        
         def assign_volunteer():
             selection = available_tree.selection()
             if not selection:
-                messagebox.showwarning("Warning", "Please select a volunteer to assign")
+                messagebox.showwarning("Warning", "Please select volunteers to assign")
                 return
                 
-            volunteer_id = selection[0]
+            volunteer_ids = [int(item) for item in selection]
             
-            # Ask for role
+            # Ask for role, shared by everyone selected
             role_dialog = tk.Toplevel(dialog)
-            role_dialog.title("Assign Role")
+            role_dialog.title("Assign Role" if len(volunteer_ids) == 1
+                              else f"Assign Role - {len(volunteer_ids)} volunteers")
             role_dialog.transient(dialog)
             role_dialog.grab_set()
             
@@ -268,15 +276,22 @@ class EventView(BaseView):
             role.pack(pady=5)
             
             def save_role():
-                if not role.get():
+                role_name = role.get()
+                if not role_name:
                     messagebox.showerror("Error", "Role is required")
                     return
                     
-                if Event.assign_volunteer(event_id, volunteer_id, role.get()):
-                    role_dialog.destroy()
-                    refresh_volunteers()
-                else:
-                    messagebox.showerror("Error", "Failed to assign volunteer")
+                try:
+                    Event.assign_volunteers(event_id, volunteer_ids, role_name)
+                except SchedulingConflict as e:
+                    messagebox.showerror("Booking Conflict", str(e))
+                    return
+                except Exception as e:
+                    messagebox.showerror("Error", f"Failed to assign volunteers: {e}")
+                    return
+                    
+                role_dialog.destroy()
+                move_rows(available_tree, assigned_tree, volunteer_ids, role_name)
                     
             ttk.Button(role_dialog, text="Save", command=save_role).pack(pady=5)
             ttk.Button(role_dialog, text="Cancel", 
@@ -286,14 +301,16 @@ class EventView(BaseView):
             selection = assigned_tree.selection()
             if not selection:
                 messagebox.showwarning("Warning", 
-                    "Please select a volunteer to remove")
+                    "Please select volunteers to remove")
                 return
                 
-            volunteer_id = selection[0]
-            if Event.remove_volunteer(event_id, volunteer_id):
-                refresh_volunteers()
-            else:
-                messagebox.showerror("Error", "Failed to remove volunteer")
+            volunteer_ids = [int(item) for item in selection]
+            try:
+                Event.remove_volunteers(event_id, volunteer_ids)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to remove volunteers: {e}")
+                return
+            move_rows(assigned_tree, available_tree, volunteer_ids)
         
         # Buttons
         button_frame = ttk.Frame(dialog)
@@ -0,0 +1,64 @@
+import tkinter as tk
+from tkinter import ttk
+from services.lookup import lookups
+from .background import TaskChannel
+
+# Wait this long after the last keystroke before querying
+DEBOUNCE_MS = 150
+
+class LookupCombobox(ttk.Combobox):
+    """Combobox that offers the top matches for what has been typed.
+    
+    Choices come from the shared prefix index in services.lookup, queried
+    on a worker thread as the user types, instead of listing every row.
+    Values use the "id: name" format; get_id() returns the chosen id.
+    """
+    
+    def __init__(self, parent, table, blank=None, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.table = table
+        # Optional first entry meaning "no selection", e.g. "All" or ""
+        self.blank = blank
+        self._channel = TaskChannel(self)
+        self._debounce_job = None
+        
+        self.bind("<KeyRelease>", self.on_key)
+        self.bind("<Down>", lambda event: self.update_choices(), add="+")
+        self.update_choices()
+        
+    def on_key(self, event):
+        if event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+            return
+        if self._debounce_job is not None:
+            self.after_cancel(self._debounce_job)
+        self._debounce_job = self.after(DEBOUNCE_MS, self.update_choices)
+        
+    def update_choices(self):
+        """Fetch matches for the current text in the background"""
+        self._debounce_job = None
+        text = self.get()
+        if text == self.blank:
+            text = ""
+        self._channel.submit(lambda: lookups.search(self.table, text), self.show_choices)
+        
+    def show_choices(self, choices):
+        self["values"] = ([self.blank] if self.blank is not None else []) + choices
+        
+    def get_id(self):
+        """Id of the chosen row, or None for blank/unrecognised text"""
+        value = self.get().strip()
+        if not value or value == self.blank:
+            return None
+        try:
+            return int(value.split(':')[0])
+        except ValueError:
+            return None
+        
+    def set_id(self, row_id, label=None):
+        """Select a row by id; pass its label when known to skip the index"""
+        if row_id is None:
+            self.set(self.blank or "")
+        elif label is not None:
+            self.set(f"{row_id}: {label}")
+        else:
+            self.set(lookups.label(self.table, row_id))
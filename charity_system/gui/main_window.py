@@ -4,6 +4,20 @@ from gui.donor_view import DonorView
 from gui.volunteer_view import VolunteerView
 from gui.event_view import EventView
 from gui.donation_view import DonationView
+from gui.dashboard_view import DashboardView
+from database.changes import feed
+
+# Views are built the first time their tab is shown
+VIEW_CLASSES = {
+    'dashboard': DashboardView,
+    'donations': DonationView,
+    'donors': DonorView,
+    'events': EventView,
+    'volunteers': VolunteerView,
+}
+
+# How often to look for writes made outside this window, e.g. by cli.py
+CHANGE_POLL_MS = 1000
 
 class MainWindow:
     def __init__(self, root):
@@ -19,14 +33,17 @@ class MainWindow:
         self.create_sidebar()
         self.create_main_content()
         
-        # Dictionary to hold all views
+        # Dictionary to hold views built so far
         self.views = {}
-        
-        # Initialize views
-        self.initialize_views()
+        self.current_view = None
         
         # Show default view
         self.show_view('donations')
+        
+        # Writes made through the models are delivered straight away; the
+        # timer catches the rest
+        feed.subscribe(self.on_changes)
+        self.root.after(CHANGE_POLL_MS, self.poll_changes)
 
     def create_sidebar(self):
         sidebar = ttk.Frame(self.root, padding="10")
@@ -37,6 +54,8 @@ class MainWindow:
         style.configure('Sidebar.TButton', padding=10, width=20)
         
         # Navigation buttons
+        ttk.Button(sidebar, text="Dashboard", style='Sidebar.TButton',
+                  command=lambda: self.show_view('dashboard')).pack(pady=5)
         ttk.Button(sidebar, text="Donations", style='Sidebar.TButton',
                   command=lambda: self.show_view('donations')).pack(pady=5)
         ttk.Button(sidebar, text="Donors", style='Sidebar.TButton',
@@ -54,22 +73,36 @@ class MainWindow:
         self.main_content.grid_rowconfigure(0, weight=1)
         self.main_content.grid_columnconfigure(0, weight=1)
 
-    def initialize_views(self):
-        # Create all views
-        self.views['donations'] = DonationView(self.main_content)
-        self.views['donors'] = DonorView(self.main_content)
-        self.views['events'] = EventView(self.main_content)
-        self.views['volunteers'] = VolunteerView(self.main_content)
+    def get_view(self, view_name):
+        """Return the named view, constructing it on first use"""
+        if view_name not in self.views:
+            self.views[view_name] = VIEW_CLASSES[view_name](self.main_content)
+        return self.views[view_name]
 
     def show_view(self, view_name):
-        # Hide all views
-        for view in self.views.values():
-            view.grid_remove()
+        # Hide the current view
+        if self.current_view is not None:
+            self.current_view.grid_remove()
         
         # Show selected view
-        self.views[view_name].grid(row=0, column=0, sticky="nsew")
-        # Refresh the view's content
-        self.views[view_name].refresh()
+        view = self.get_view(view_name)
+        view.grid(row=0, column=0, sticky="nsew")
+        self.current_view = view
+        # Reload only if its tables changed since it was last shown
+        view.refresh_if_stale()
+
+    def on_changes(self, changes):
+        """Pass database writes to the visible view; hidden views catch up when shown"""
+        view = self.current_view
+        if view is None:
+            return
+        relevant = [change for change in changes if change.table in view.tables]
+        if relevant:
+            view.apply_changes(relevant)
+
+    def poll_changes(self):
+        feed.poll()
+        self.root.after(CHANGE_POLL_MS, self.poll_changes)
 
 def main():
     root = tk.Tk()
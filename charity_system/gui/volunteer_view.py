@@ -5,6 +5,8 @@ from datetime import datetime
 from .base_view import BaseView
 
 class VolunteerView(BaseView):
+    tables = ('volunteers',)
+    
     def __init__(self, parent):
         super().__init__(parent)
         
@@ -13,24 +15,25 @@ class VolunteerView(BaseView):
         headings = ("ID", "Name", "Phone", "Email", "Join Date")
         self.configure_tree_columns(columns, headings)
         
-        # Initial data load
-        self.refresh()
-        
     def refresh(self):
         """Load all volunteers into the treeview"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.run_async(Volunteer.get_all, self.show_volunteers)
+            
+    def show_volunteers(self, volunteers):
+        """Show volunteers, updating only the rows that changed"""
+        self.render_rows(self.volunteer_item(volunteer) for volunteer in volunteers)
+        self.data_loaded()
             
-        volunteers = Volunteer.get_all()
-        for volunteer in volunteers:
-            name = f"{volunteer['first_name']} {volunteer['surname']}"
-            self.tree.insert("", "end", volunteer['volunteer_id'], values=(
-                volunteer['volunteer_id'],
-                name,
-                volunteer['phone_number'],
-                volunteer['email'],
-                volunteer['join_date']
-            ))
+    def volunteer_item(self, volunteer):
+        """Treeview iid and values for a volunteer row"""
+        name = f"{volunteer['first_name']} {volunteer['surname']}"
+        return volunteer['volunteer_id'], (
+            volunteer['volunteer_id'],
+            name,
+            volunteer['phone_number'],
+            volunteer['email'],
+            volunteer['join_date']
+        )
             
     def add_new(self):
         """Open dialog to add new volunteer"""
@@ -45,7 +48,6 @@ class VolunteerView(BaseView):
     def delete_item(self, item_id):
         """Delete volunteer"""
         if Volunteer.delete(item_id):
-            self.refresh()
             messagebox.showinfo("Success", "Volunteer deleted successfully")
         else:
             messagebox.showerror("Error", 
@@ -54,20 +56,7 @@ class VolunteerView(BaseView):
     def search(self):
         """Search volunteers"""
         term = self.search_var.get()
-        
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
-        volunteers = Volunteer.search(term)
-        for volunteer in volunteers:
-            name = f"{volunteer['first_name']} {volunteer['surname']}"
-            self.tree.insert("", "end", volunteer['volunteer_id'], values=(
-                volunteer['volunteer_id'],
-                name,
-                volunteer['phone_number'],
-                volunteer['email'],
-                volunteer['join_date']
-            ))
+        self.run_async(lambda: Volunteer.search(term), self.show_volunteers)
             
     def open_volunteer_dialog(self, volunteer=None):
         """Open dialog to add/edit volunteer"""
@@ -123,7 +112,6 @@ class VolunteerView(BaseView):
                 
                 if success:
                     dialog.destroy()
-                    self.refresh()
                     messagebox.showinfo("Success", 
                         "Volunteer updated successfully" if volunteer 
                         else "Volunteer added successfully")
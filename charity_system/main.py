@@ -1,7 +1,19 @@
+import time
+started = time.perf_counter()
+
+import sys
 import tkinter as tk
 from tkinter import ttk
 from gui.main_window import MainWindow
 
+def report_startup(root):
+    """Print how long it took until the first rows were on screen"""
+    def on_loaded(event):
+        print(f"Startup: first data shown after {(time.perf_counter() - started) * 1000:.0f} ms",
+              file=sys.stderr)
+        root.unbind("<<DataLoaded>>")
+    root.bind("<<DataLoaded>>", on_loaded)
+
 def main():
     root = tk.Tk()
     root.title("Charity Donation Tracker")
@@ -16,7 +28,10 @@ def main():
     style.configure("Treeview.Heading", font=('Helvetica', 10, 'bold'))
     
     # Create main application window
+    report_startup(root)
     app = MainWindow(root)
+    print(f"Startup: window built after {(time.perf_counter() - started) * 1000:.0f} ms",
+          file=sys.stderr)
     
     # Start the application
     root.mainloop()
@@ -0,0 +1,118 @@
+import functools
+import threading
+from collections import OrderedDict
+
+from database.changes import feed
+
+# Records held across all tables before the least recently used is evicted
+MAX_SIZE = 2048
+
+# Cached records also embed names from these tables (donor_name,
+# organizer_name, ...), so writes there invalidate them too
+DEPENDS_ON = {
+    'donations': ('donors', 'events', 'volunteers'),
+    'events': ('volunteers',),
+}
+
+_MISSING = object()
+
+
+def _normalize(key):
+    """Ids arrive as ints from the change feed and as strings from Treeview
+    iids and URLs; both must name the same entry"""
+    try:
+        return int(key)
+    except (TypeError, ValueError):
+        return key
+
+
+class RecordCache:
+    """Bounded LRU cache of single records, keyed by (table, id).
+
+    Entries are dropped when the change feed reports a write to their row,
+    or to any row of a table their joined columns come from. Each table
+    has a generation counter so a load that raced with a write is not
+    stored.
+    """
+
+    def __init__(self, max_size=MAX_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._subscribed = False
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, table, key, load):
+        """Cached record for (table, key), calling load(key) on a miss"""
+        key = _normalize(key)
+        with self._lock:
+            record = self._entries.get((table, key), _MISSING)
+            if record is not _MISSING:
+                self._entries.move_to_end((table, key))
+                self._stats['hits'] += 1
+                return record
+            self._stats['misses'] += 1
+            generation = self._generations.get(table, 0)
+        if not self._subscribed:
+            self._subscribe()
+        record = load(key)
+        with self._lock:
+            if self._generations.get(table, 0) == generation:
+                self._entries[(table, key)] = record
+                if len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self._stats['evictions'] += 1
+        return record
+
+    def _subscribe(self):
+        feed.subscribe(self.apply_changes)
+        self._subscribed = True
+
+    def invalidate(self, table, key=None):
+        """Drop one record, or every record of table when key is None"""
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            if key is not None:
+                key = _normalize(key)
+                dropped = self._entries.pop((table, key), _MISSING) is not _MISSING
+                self._stats['invalidations'] += dropped
+                return
+            for entry in [entry for entry in self._entries if entry[0] == table]:
+                del self._entries[entry]
+                self._stats['invalidations'] += 1
+
+    def apply_changes(self, changes):
+        for change in changes:
+            self.invalidate(change.table, change.key)
+            for table, sources in DEPENDS_ON.items():
+                if change.table in sources:
+                    self.invalidate(table)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for table in self._generations:
+                self._generations[table] += 1
+
+    def stats(self):
+        """Snapshot of hit/miss/eviction counters and current size"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update({'size': len(self._entries), 'max_size': self.max_size})
+        lookups = snapshot['hits'] + snapshot['misses']
+        snapshot['hit_rate'] = snapshot['hits'] / lookups if lookups else 0.0
+        return snapshot
+
+
+records = RecordCache()
+
+
+def cached_by_id(table):
+    """Serve a model's get_by_id(key) through the shared record cache"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(key):
+            return records.get(table, key, func)
+        return wrapper
+    return decorate
@@ -0,0 +1,98 @@
+import json
+from collections import namedtuple
+
+from database import archive
+from database.partitions import get_partitions
+
+# What happens to a referencing row when the record it points at goes
+BLOCK = 'block'
+CASCADE = 'cascade'
+
+# Primary key of each table records can be deleted from
+KEYS = {
+    'donors': 'donor_id',
+    'volunteers': 'volunteer_id',
+    'events': 'event_id',
+}
+
+# Rows referencing each table: (table, column, on delete, on archive).
+# Every column here is the leading column of an index, so each check is
+# one index probe.
+REFERENCES = {
+    'donors': [
+        ('donations', 'donor_id', BLOCK, CASCADE),
+    ],
+    'volunteers': [
+        ('donations', 'collected_by', BLOCK, BLOCK),
+        ('events', 'organizer_id', BLOCK, BLOCK),
+        ('event_volunteers', 'volunteer_id', BLOCK, CASCADE),
+    ],
+    'events': [
+        ('donations', 'event_id', BLOCK, CASCADE),
+        ('event_volunteers', 'event_id', CASCADE, CASCADE),
+    ],
+}
+
+# Outcome of a delete: how many records went, the ids kept because
+# something still references them, and the archive batch (or None)
+DeleteResult = namedtuple('DeleteResult', 'removed blocked batch_id')
+
+
+def _actions(table, archived):
+    return [(child, column, on_archive if archived else on_delete)
+            for child, column, on_delete, on_archive in REFERENCES[table]]
+
+
+def blocked_ids(cursor, table, ids, archived=False):
+    """The ids that rows elsewhere still reference, in a single query.
+
+    Donations in closed financial years are read-only, and archived rows
+    need their parents back when restored, so a record either references
+    is always blocked.
+    """
+    checks = [f'EXISTS (SELECT 1 FROM {child} WHERE {column} = ids.value)'
+              for child, column, action in _actions(table, archived) if action == BLOCK]
+    checks.extend(f'EXISTS (SELECT 1 FROM {child}_archive WHERE {column} = ids.value)'
+                  for child, column, _, _ in REFERENCES[table]
+                  if column in archive.ARCHIVED_REFERENCES.get(child, ()))
+    closed = [partition.table_name for partition in get_partitions(cursor)]
+    checks.extend(f'EXISTS (SELECT 1 FROM {partition} WHERE {column} = ids.value)'
+                  for child, column, _, _ in REFERENCES[table] if child == 'donations'
+                  for partition in closed)
+    if not checks or not ids:
+        return set()
+    cursor.execute(f'''
+        SELECT ids.value FROM json_each(?) AS ids WHERE {' OR '.join(checks)}
+    ''', (json.dumps(ids),))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _remove_rows(cursor, table, column, ids, batch_id):
+    where = f'{column} IN (SELECT value FROM json_each(?))'
+    params = (json.dumps(ids),)
+    if batch_id is not None:
+        return archive.move(cursor, table, where, params, batch_id)
+    cursor.execute(f'DELETE FROM {table} WHERE {where}', params)
+    return cursor.rowcount
+
+
+def remove(cursor, table, ids, archived=False):
+    """Delete, or archive, the records in ids that nothing blocks.
+
+    Rows that cascade go with them; with archived they are moved to the
+    archive tables under one batch instead of being deleted. Runs as a
+    writer operation, so the check and the delete share a transaction.
+    """
+    ids = list(dict.fromkeys(int(record_id) for record_id in ids))
+    blocked = blocked_ids(cursor, table, ids, archived)
+    targets = [record_id for record_id in ids if record_id not in blocked]
+    if not targets:
+        return DeleteResult(0, sorted(blocked), None)
+    batch_id = archive.start_batch(cursor, table) if archived else None
+    for child, column, action in _actions(table, archived):
+        if action == CASCADE:
+            _remove_rows(cursor, child, column, targets, batch_id)
+    removed = _remove_rows(cursor, table, KEYS[table], targets, batch_id)
+    if batch_id is not None:
+        batch_id = archive.finish_batch(cursor, batch_id, removed)
+    return DeleteResult(removed, sorted(blocked), batch_id)
@@ -1,6 +1,75 @@
+from database.changes import emits_changes
 from database.db_connection import get_db
+from database.writer import writer
+from database.fts import match_query
+from database.partitions import get_partitions, sources
+from models.cache import cached_by_id
+from models.records import CHUNK_SIZE, fetch_record, fetch_records, iter_records, record_cursor
 from datetime import datetime
 
+# Rows shown per page in paginated listings
+PAGE_SIZE = 200
+
+# Joined name columns repeated across many donation rows; records share
+# one string per distinct value
+SHARED_COLUMNS = ('donor_name', 'event_name', 'collector_name')
+
+DONATION_SELECT_FROM = '''
+    SELECT d.*,
+           CASE
+               WHEN dn.business_name IS NOT NULL THEN dn.business_name
+               ELSE dn.first_name || ' ' || dn.surname
+           END as donor_name,
+           e.event_name,
+           v.first_name || ' ' || v.surname as collector_name
+    FROM {source} d
+    JOIN donors dn ON d.donor_id = dn.donor_id
+    LEFT JOIN events e ON d.event_id = e.event_id
+    JOIN volunteers v ON d.collected_by = v.volunteer_id
+'''
+
+# The join over open donations; closed financial years are read through
+# DONATION_SELECT_FROM with their partition as the source
+DONATION_SELECT = DONATION_SELECT_FROM.format(source='donations')
+
+
+def _search_filters(term, donor_id, volunteer_id, event_id, date_from=None, date_to=None):
+    """Build the WHERE conditions shared by search and get_page"""
+    where = ['1=1']
+    params = []
+
+    if date_from:
+        where.append('d.donation_date >= ?')
+        params.append(date_from)
+
+    if date_to:
+        where.append('d.donation_date <= ?')
+        params.append(date_to)
+
+    query = match_query(term)
+    if query:
+        # Resolve the term against the donor, event and volunteer indexes,
+        # then pick donations through the foreign-key indexes
+        where.append('''(d.donor_id IN (SELECT rowid FROM donors_fts WHERE donors_fts MATCH ?)
+            OR d.event_id IN (SELECT rowid FROM events_fts WHERE events_fts MATCH ?)
+            OR d.collected_by IN (SELECT rowid FROM volunteers_fts WHERE volunteers_fts MATCH ?))''')
+        params.extend([query] * 3)
+
+    if donor_id:
+        where.append('d.donor_id = ?')
+        params.append(donor_id)
+
+    if volunteer_id:
+        where.append('d.collected_by = ?')
+        params.append(volunteer_id)
+
+    if event_id:
+        where.append('d.event_id = ?')
+        params.append(event_id)
+
+    return where, params
+
+
 class Donation:
     def __init__(self, donation_id=None, amount=None, donation_date=None,
                  gift_aid=None, notes=None, donor_id=None, event_id=None, collected_by=None):
@@ -14,151 +83,176 @@ class Donation:
         self.collected_by = collected_by
 
     @staticmethod
+    @emits_changes
     def create(amount, donation_date, gift_aid, notes, donor_id, event_id, collected_by):
         if donation_date is None:
             donation_date = datetime.now().strftime('%Y-%m-%d')
             
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO donations (amount, donation_date, gift_aid, notes,
-                                     donor_id, event_id, collected_by)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (amount, donation_date, gift_aid, notes, donor_id, event_id, collected_by))
-            conn.commit()
-            return cursor.lastrowid
+        return writer.execute('''
+            INSERT INTO donations (amount, donation_date, gift_aid, notes,
+                                 donor_id, event_id, collected_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (amount, donation_date, gift_aid, notes, donor_id, event_id, collected_by)).result().lastrowid
 
     @staticmethod
     def get_all():
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT d.*,
-                       CASE 
-                           WHEN dn.business_name IS NOT NULL THEN dn.business_name
-                           ELSE dn.first_name || ' ' || dn.surname 
-                       END as donor_name,
-                       e.event_name,
-                       v.first_name || ' ' || v.surname as collector_name
-                FROM donations d
-                JOIN donors dn ON d.donor_id = dn.donor_id
-                LEFT JOIN events e ON d.event_id = e.event_id
-                JOIN volunteers v ON d.collected_by = v.volunteer_id
-                ORDER BY d.donation_date DESC
-            ''')
-            return cursor.fetchall()
+        return list(Donation.iter_search())
+
+    @staticmethod
+    def iter_all(chunk_size=CHUNK_SIZE):
+        """Stream every donation, newest first, without building the full list"""
+        return Donation.iter_search(chunk_size=chunk_size)
 
     @staticmethod
+    @cached_by_id('donations')
     def get_by_id(donation_id):
         with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT d.*,
-                       CASE 
-                           WHEN dn.business_name IS NOT NULL THEN dn.business_name
-                           ELSE dn.first_name || ' ' || dn.surname 
-                       END as donor_name,
-                       e.event_name,
-                       v.first_name || ' ' || v.surname as collector_name
-                FROM donations d
-                JOIN donors dn ON d.donor_id = dn.donor_id
-                LEFT JOIN events e ON d.event_id = e.event_id
-                JOIN volunteers v ON d.collected_by = v.volunteer_id
-                WHERE d.donation_id = ?
-            ''', (donation_id,))
-            return cursor.fetchone()
+            cursor = record_cursor(conn)
+            cursor.execute(DONATION_SELECT + ' WHERE d.donation_id = ?', (donation_id,))
+            record = fetch_record(cursor, 'DonationRecord')
+            if record is not None:
+                return record
+            # Not open: only closed years whose id range covers it can hold it
+            for partition in get_partitions(conn):
+                if partition.min_id is not None and partition.min_id <= int(donation_id) <= partition.max_id:
+                    cursor.execute(DONATION_SELECT_FROM.format(source=partition.table_name)
+                                   + ' WHERE d.donation_id = ?', (donation_id,))
+                    record = fetch_record(cursor, 'DonationRecord')
+                    if record is not None:
+                        return record
+            return None
 
     @staticmethod
-    def update(donation_id, amount, donation_date, gift_aid, notes, donor_id, event_id, collected_by):
+    def get_by_ids(donation_ids):
+        """Donations with the given ids, in no particular order"""
+        donation_ids = list(donation_ids)
+        if not donation_ids:
+            return []
+        condition = f" WHERE d.donation_id IN ({', '.join('?' * len(donation_ids))})"
         with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE donations 
-                SET amount=?, donation_date=?, gift_aid=?, notes=?,
-                    donor_id=?, event_id=?, collected_by=?
-                WHERE donation_id=?
-            ''', (amount, donation_date, gift_aid, notes, donor_id, 
-                 event_id, collected_by, donation_id))
-            conn.commit()
-            return cursor.rowcount > 0
+            cursor = record_cursor(conn)
+            cursor.execute(DONATION_SELECT + condition, donation_ids)
+            records = fetch_records(cursor, 'DonationRecord', SHARED_COLUMNS)
+            if len(records) < len(donation_ids):
+                lowest, highest = min(map(int, donation_ids)), max(map(int, donation_ids))
+                for partition in get_partitions(conn):
+                    if partition.min_id is not None and (partition.min_id <= highest
+                                                         and lowest <= partition.max_id):
+                        cursor.execute(DONATION_SELECT_FROM.format(source=partition.table_name)
+                                       + condition, donation_ids)
+                        records.extend(fetch_records(cursor, 'DonationRecord', SHARED_COLUMNS))
+            return records
+
+    @staticmethod
+    @emits_changes
+    def update(donation_id, amount, donation_date, gift_aid, notes, donor_id, event_id, collected_by):
+        return writer.execute('''
+            UPDATE donations 
+            SET amount=?, donation_date=?, gift_aid=?, notes=?,
+                donor_id=?, event_id=?, collected_by=?
+            WHERE donation_id=?
+        ''', (amount, donation_date, gift_aid, notes, donor_id, 
+             event_id, collected_by, donation_id)).result().rowcount > 0
 
     @staticmethod
+    @emits_changes
     def delete(donation_id):
+        return writer.execute(
+            'DELETE FROM donations WHERE donation_id = ?', (donation_id,)).result().rowcount > 0
+
+    @staticmethod
+    def search(term=None, donor_id=None, volunteer_id=None, event_id=None,
+               date_from=None, date_to=None):
+        return list(Donation.iter_search(term, donor_id, volunteer_id, event_id,
+                                         date_from=date_from, date_to=date_to))
+
+    @staticmethod
+    def iter_search(term=None, donor_id=None, volunteer_id=None, event_id=None,
+                    chunk_size=CHUNK_SIZE, date_from=None, date_to=None):
+        """Streaming variant of search.
+
+        Only the open table and the closed years the date range reaches
+        are read, one after another, newest first.
+        """
+        where, params = _search_filters(term, donor_id, volunteer_id, event_id,
+                                        date_from, date_to)
         with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM donations WHERE donation_id = ?', (donation_id,))
-            conn.commit()
-            return cursor.rowcount > 0
+            cursor = record_cursor(conn)
+            for source in sources(conn, date_from, date_to):
+                cursor.execute(
+                    DONATION_SELECT_FROM.format(source=source) + ' WHERE ' + ' AND '.join(where)
+                    + ' ORDER BY d.donation_date DESC, d.donation_id DESC', params)
+                yield from iter_records(cursor, 'DonationRecord', chunk_size, SHARED_COLUMNS)
 
     @staticmethod
-    def search(term=None, donor_id=None, volunteer_id=None, event_id=None):
+    def get_page(after=None, limit=PAGE_SIZE, term=None, donor_id=None,
+                 volunteer_id=None, event_id=None, date_from=None, date_to=None):
+        """Fetch one page of donations, newest first.
+
+        after is the (donation_date, donation_id) key of the last row of the
+        previous page; the next page starts strictly below it, so the cost of
+        a page does not grow with how far the user has scrolled. A page
+        that runs past the open table continues into the closed years.
+        """
+        where, params = _search_filters(term, donor_id, volunteer_id, event_id,
+                                        date_from, date_to)
+        if after is not None:
+            where.append('(d.donation_date, d.donation_id) < (?, ?)')
+            params.extend(after)
+            # Years starting after the cursor have nothing below it
+            date_to = min(date_to, after[0]) if date_to else after[0]
+        records = []
         with get_db() as conn:
-            cursor = conn.cursor()
-            
-            query = '''
-                SELECT d.*,
-                       CASE 
-                           WHEN dn.business_name IS NOT NULL THEN dn.business_name
-                           ELSE dn.first_name || ' ' || dn.surname 
-                       END as donor_name,
-                       e.event_name,
-                       v.first_name || ' ' || v.surname as collector_name
-                FROM donations d
-                JOIN donors dn ON d.donor_id = dn.donor_id
-                LEFT JOIN events e ON d.event_id = e.event_id
-                JOIN volunteers v ON d.collected_by = v.volunteer_id
-                WHERE 1=1
-            '''
-            params = []
-            
-            if term:
-                search_term = f'%{term}%'
-                query += '''
-                    AND (dn.first_name LIKE ? 
-                    OR dn.surname LIKE ?
-                    OR dn.business_name LIKE ?
-                    OR e.event_name LIKE ?
-                    OR v.first_name || ' ' || v.surname LIKE ?)
-                '''
-                params.extend([search_term] * 5)
-            
-            if donor_id:
-                query += ' AND d.donor_id = ?'
-                params.append(donor_id)
-            
-            if volunteer_id:
-                query += ' AND d.collected_by = ?'
-                params.append(volunteer_id)
-            
-            if event_id:
-                query += ' AND d.event_id = ?'
-                params.append(event_id)
-            
-            query += ' ORDER BY d.donation_date DESC'
-            
-            cursor.execute(query, params)
-            return cursor.fetchall()
+            cursor = record_cursor(conn)
+            for source in sources(conn, date_from, date_to):
+                cursor.execute(
+                    DONATION_SELECT_FROM.format(source=source) + ' WHERE ' + ' AND '.join(where)
+                    + ' ORDER BY d.donation_date DESC, d.donation_id DESC LIMIT ?',
+                    params + [limit - len(records)])
+                records.extend(fetch_records(cursor, 'DonationRecord', SHARED_COLUMNS))
+                if len(records) >= limit:
+                    break
+        return records
 
     @staticmethod
-    def get_total_by_donor(donor_id):
+    def page_key(row):
+        """Keyset cursor for a row returned by get_page"""
+        return (row['donation_date'], row['donation_id'])
+
+    @staticmethod
+    def get_totals(scope, key):
+        """Count, total and gift-aid total for one donor, event, collector or month.
+
+        scope is 'donor', 'event', 'collector' or 'month' (key 'YYYY-MM').
+        Read from the trigger-maintained donation_totals table.
+        """
+        if scope != 'month':
+            # key has no column affinity, so '1001' would not match the
+            # integer ids the triggers store
+            try:
+                key = int(key)
+            except (TypeError, ValueError):
+                return {'donation_count': 0, 'total_amount': 0.0, 'gift_aid_amount': 0.0}
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT SUM(amount) as total
-                FROM donations
-                WHERE donor_id = ?
-            ''', (donor_id,))
+                SELECT donation_count, total_amount, gift_aid_amount
+                FROM donation_totals
+                WHERE scope = ? AND key = ?
+            ''', (scope, key))
             result = cursor.fetchone()
-            return result['total'] if result['total'] else 0.0
+            if result is None:
+                return {'donation_count': 0, 'total_amount': 0.0, 'gift_aid_amount': 0.0}
+            return {
+                'donation_count': result['donation_count'],
+                'total_amount': round(result['total_amount'], 2),
+                'gift_aid_amount': round(result['gift_aid_amount'], 2),
+            }
+
+    @staticmethod
+    def get_total_by_donor(donor_id):
+        return Donation.get_totals('donor', donor_id)['total_amount']
 
     @staticmethod
     def get_total_by_event(event_id):
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT SUM(amount) as total
-                FROM donations
-                WHERE event_id = ?
-            ''', (event_id,))
-            result = cursor.fetchone()
-            return result['total'] if result['total'] else 0.0
+        return Donation.get_totals('event', event_id)['total_amount']
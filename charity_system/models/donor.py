@@ -1,4 +1,10 @@
+from database.changes import emits_changes
 from database.db_connection import get_db
+from database.writer import writer
+from database.fts import match_query
+from models.cache import cached_by_id
+from models.dependencies import remove
+from models.records import CHUNK_SIZE, PAGE_SIZE, fetch_record, fetch_records, iter_records, record_cursor
 
 class Donor:
     def __init__(self, donor_id=None, first_name=None, surname=None, business_name=None,
@@ -13,68 +19,94 @@ class Donor:
         self.donor_type = donor_type
 
     @staticmethod
+    @emits_changes
     def create(first_name, surname, business_name, postcode, house_number, phone_number, donor_type):
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO donors (first_name, surname, business_name, postcode, 
-                                  house_number, phone_number, donor_type)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (first_name, surname, business_name, postcode, house_number, phone_number, donor_type))
-            conn.commit()
-            return cursor.lastrowid
+        return writer.execute('''
+            INSERT INTO donors (first_name, surname, business_name, postcode, 
+                              house_number, phone_number, donor_type)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (first_name, surname, business_name, postcode, house_number, phone_number, donor_type)).result().lastrowid
 
     @staticmethod
     def get_all():
         with get_db() as conn:
-            cursor = conn.cursor()
+            cursor = record_cursor(conn)
             cursor.execute('SELECT * FROM donors')
-            return cursor.fetchall()
+            return fetch_records(cursor, 'DonorRecord')
+
+    @staticmethod
+    def iter_all(chunk_size=CHUNK_SIZE):
+        """Stream every donor without building the full list"""
+        with get_db() as conn:
+            cursor = record_cursor(conn)
+            cursor.execute('SELECT * FROM donors')
+            yield from iter_records(cursor, 'DonorRecord', chunk_size)
+
+    @staticmethod
+    def get_page(after=None, limit=PAGE_SIZE):
+        """Up to limit donors with ids above after, in id order"""
+        with get_db() as conn:
+            cursor = record_cursor(conn)
+            cursor.execute('SELECT * FROM donors WHERE donor_id > ? ORDER BY donor_id LIMIT ?',
+                           (after or 0, limit))
+            return fetch_records(cursor, 'DonorRecord')
 
     @staticmethod
+    @cached_by_id('donors')
     def get_by_id(donor_id):
         with get_db() as conn:
-            cursor = conn.cursor()
+            cursor = record_cursor(conn)
             cursor.execute('SELECT * FROM donors WHERE donor_id = ?', (donor_id,))
-            return cursor.fetchone()
+            return fetch_record(cursor, 'DonorRecord')
 
     @staticmethod
+    @emits_changes
     def update(donor_id, first_name, surname, business_name, postcode, house_number, phone_number, donor_type):
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE donors 
-                SET first_name=?, surname=?, business_name=?, postcode=?, 
-                    house_number=?, phone_number=?, donor_type=?
-                WHERE donor_id=?
-            ''', (first_name, surname, business_name, postcode, house_number, 
-                 phone_number, donor_type, donor_id))
-            conn.commit()
-            return cursor.rowcount > 0
+        return writer.execute('''
+            UPDATE donors 
+            SET first_name=?, surname=?, business_name=?, postcode=?, 
+                house_number=?, phone_number=?, donor_type=?
+            WHERE donor_id=?
+        ''', (first_name, surname, business_name, postcode, house_number, 
+             phone_number, donor_type, donor_id)).result().rowcount > 0
 
     @staticmethod
-    def delete(donor_id):
-        with get_db() as conn:
-            cursor = conn.cursor()
-            # First check if donor has any donations
-            cursor.execute('SELECT COUNT(*) FROM donations WHERE donor_id = ?', (donor_id,))
-            if cursor.fetchone()[0] > 0:
-                return False  # Can't delete donor with donations
-            
-            cursor.execute('DELETE FROM donors WHERE donor_id = ?', (donor_id,))
-            conn.commit()
-            return cursor.rowcount > 0
+    @emits_changes
+    def delete(donor_id, archive=False):
+        """Delete a donor with no donations.
+
+        With archive, move it and its donations to the archive tables instead.
+        """
+        return writer.submit(remove, 'donors', [donor_id], archive).result().removed > 0
+
+    @staticmethod
+    @emits_changes
+    def delete_many(donor_ids, archive=False):
+        """Delete or archive many donors in one transaction, skipping any still referenced.
+
+        Returns a DeleteResult.
+        """
+        return writer.submit(remove, 'donors', donor_ids, archive).result()
+
+    @staticmethod
+    def search(term, limit=None):
+        """Full-text search over name, business name and postcode, best match first"""
+        return list(Donor.iter_search(term, limit))
 
     @staticmethod
-    def search(term):
+    def iter_search(term, limit=None, chunk_size=CHUNK_SIZE):
+        """Streaming variant of search"""
+        query = match_query(term)
+        if query is None:
+            yield from Donor.iter_all(chunk_size)
+            return
         with get_db() as conn:
-            cursor = conn.cursor()
-            search_term = f'%{term}%'
+            cursor = record_cursor(conn)
             cursor.execute('''
-                SELECT * FROM donors 
-                WHERE first_name LIKE ? 
-                OR surname LIKE ? 
-                OR business_name LIKE ?
-                OR postcode LIKE ?
-            ''', (search_term, search_term, search_term, search_term))
-            return cursor.fetchall()
+                SELECT d.* FROM donors_fts
+                JOIN donors d ON d.donor_id = donors_fts.rowid
+                WHERE donors_fts MATCH ?
+                ORDER BY donors_fts.rank
+                LIMIT ?
+            ''', (query, -1 if limit is None else limit))
+            yield from iter_records(cursor, 'DonorRecord', chunk_size)
@@ -1,9 +1,92 @@
+import sqlite3
+from database.changes import emits_changes
 from database.db_connection import get_db
+from database.writer import writer
+from database.fts import match_query
+from models.cache import cached_by_id
+from models.dependencies import remove
+from models.records import CHUNK_SIZE, PAGE_SIZE, fetch_record, fetch_records, iter_records, record_cursor
+from models.scheduling import (DEFAULT_DURATION, InvalidBooking, SchedulingConflict, interval,
+                               room_conflicts, volunteer_conflicts)
 from datetime import datetime
 
+def _check_booking(cursor, event_id, values):
+    _, room_name, booking_date, booking_time, _, organizer_id, duration_minutes = values
+    # Runs in the write transaction, so two overlapping bookings queued
+    # together cannot both pass
+    start, end = interval(booking_date, booking_time, duration_minutes)
+    conflicts = room_conflicts(cursor, room_name, start, end, event_id)
+    conflicts += volunteer_conflicts(cursor, organizer_id, start, end, event_id)
+    if event_id is not None:
+        cursor.execute('SELECT volunteer_id FROM event_volunteers WHERE event_id = ?', (event_id,))
+        for (volunteer_id,) in cursor.fetchall():
+            if volunteer_id != organizer_id:
+                conflicts += volunteer_conflicts(cursor, volunteer_id, start, end, event_id)
+    if conflicts:
+        raise SchedulingConflict(conflicts)
+
+
+def _create(cursor, values, check_conflicts):
+    if check_conflicts:
+        _check_booking(cursor, None, values)
+    cursor.execute('''
+        INSERT INTO events (event_name, room_name, booking_date, 
+                          booking_time, cost, organizer_id, duration_minutes)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', values)
+    return cursor.lastrowid
+
+
+def _update(cursor, event_id, values, check_conflicts):
+    if check_conflicts:
+        _check_booking(cursor, event_id, values)
+    cursor.execute('''
+        UPDATE events 
+        SET event_name=?, room_name=?, booking_date=?, 
+            booking_time=?, cost=?, organizer_id=?, duration_minutes=?
+        WHERE event_id=?
+    ''', (*values, event_id))
+    return cursor.rowcount > 0
+
+
+def _assign(cursor, event_id, volunteer_ids, role, check_conflicts):
+    if check_conflicts:
+        cursor.execute('''
+            SELECT booking_date, booking_time, duration_minutes FROM events WHERE event_id = ?
+        ''', (event_id,))
+        booking = cursor.fetchone()
+        try:
+            start, end = interval(*booking) if booking is not None else (None, None)
+        except InvalidBooking:
+            # A legacy row with an unreadable time cannot clash with anything
+            start = None
+        if start is not None:
+            conflicts = []
+            for volunteer_id in volunteer_ids:
+                conflicts += volunteer_conflicts(cursor, volunteer_id, start, end, event_id)
+            if conflicts:
+                raise SchedulingConflict(conflicts)
+    # Volunteers already on the event are skipped; unknown ids still fail
+    # the foreign key and roll back the whole batch
+    cursor.executemany('''
+        INSERT OR IGNORE INTO event_volunteers (event_id, volunteer_id, role)
+        VALUES (?, ?, ?)
+    ''', [(event_id, volunteer_id, role) for volunteer_id in volunteer_ids])
+    return cursor.rowcount
+
+
+def _remove(cursor, event_id, volunteer_ids):
+    cursor.executemany('''
+        DELETE FROM event_volunteers 
+        WHERE event_id = ? AND volunteer_id = ?
+    ''', [(event_id, volunteer_id) for volunteer_id in volunteer_ids])
+    return cursor.rowcount
+
+
 class Event:
     def __init__(self, event_id=None, event_name=None, room_name=None,
-                 booking_date=None, booking_time=None, cost=None, organizer_id=None):
+                 booking_date=None, booking_time=None, cost=None, organizer_id=None,
+                 duration_minutes=DEFAULT_DURATION):
         self.event_id = event_id
         self.event_name = event_name
         self.room_name = room_name
@@ -11,121 +94,168 @@ class Event:
         self.booking_time = booking_time
         self.cost = cost
         self.organizer_id = organizer_id
+        self.duration_minutes = duration_minutes
 
     @staticmethod
-    def create(event_name, room_name, booking_date, booking_time, cost, organizer_id):
+    @emits_changes
+    def create(event_name, room_name, booking_date, booking_time, cost, organizer_id,
+               duration_minutes=None, check_conflicts=True):
+        """Book an event; raises SchedulingConflict if its room or organizer is taken"""
+        values = (event_name, room_name, booking_date, booking_time, cost, organizer_id,
+                  duration_minutes or DEFAULT_DURATION)
+        return writer.submit(_create, values, check_conflicts).result()
+
+    @staticmethod
+    def get_all():
         with get_db() as conn:
-            cursor = conn.cursor()
+            cursor = record_cursor(conn)
             cursor.execute('''
-                INSERT INTO events (event_name, room_name, booking_date, 
-                                  booking_time, cost, organizer_id)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (event_name, room_name, booking_date, booking_time, cost, organizer_id))
-            conn.commit()
-            return cursor.lastrowid
+                SELECT e.*, v.first_name || ' ' || v.surname as organizer_name 
+                FROM events e 
+                LEFT JOIN volunteers v ON e.organizer_id = v.volunteer_id
+            ''')
+            return fetch_records(cursor, 'EventRecord')
 
     @staticmethod
-    def get_all():
+    def iter_all(chunk_size=CHUNK_SIZE):
+        """Stream every event without building the full list"""
         with get_db() as conn:
-            cursor = conn.cursor()
+            cursor = record_cursor(conn)
             cursor.execute('''
                 SELECT e.*, v.first_name || ' ' || v.surname as organizer_name 
                 FROM events e 
                 LEFT JOIN volunteers v ON e.organizer_id = v.volunteer_id
             ''')
-            return cursor.fetchall()
+            yield from iter_records(cursor, 'EventRecord', chunk_size)
+
+    @staticmethod
+    def get_page(after=None, limit=PAGE_SIZE):
+        """Up to limit events with ids above after, in id order"""
+        with get_db() as conn:
+            cursor = record_cursor(conn)
+            cursor.execute('''
+                SELECT e.*, v.first_name || ' ' || v.surname as organizer_name 
+                FROM events e 
+                LEFT JOIN volunteers v ON e.organizer_id = v.volunteer_id
+                WHERE e.event_id > ?
+                ORDER BY e.event_id
+                LIMIT ?
+            ''', (after or 0, limit))
+            return fetch_records(cursor, 'EventRecord')
 
     @staticmethod
+    @cached_by_id('events')
     def get_by_id(event_id):
         with get_db() as conn:
-            cursor = conn.cursor()
+            cursor = record_cursor(conn)
             cursor.execute('''
                 SELECT e.*, v.first_name || ' ' || v.surname as organizer_name 
                 FROM events e 
                 LEFT JOIN volunteers v ON e.organizer_id = v.volunteer_id
                 WHERE e.event_id = ?
             ''', (event_id,))
-            return cursor.fetchone()
+            return fetch_record(cursor, 'EventRecord')
 
     @staticmethod
-    def update(event_id, event_name, room_name, booking_date, booking_time, cost, organizer_id):
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE events 
-                SET event_name=?, room_name=?, booking_date=?, 
-                    booking_time=?, cost=?, organizer_id=?
-                WHERE event_id=?
-            ''', (event_name, room_name, booking_date, booking_time, 
-                 cost, organizer_id, event_id))
-            conn.commit()
-            return cursor.rowcount > 0
+    @emits_changes
+    def update(event_id, event_name, room_name, booking_date, booking_time, cost, organizer_id,
+               duration_minutes=None, check_conflicts=True):
+        """Rebook an event; raises SchedulingConflict for its room, organizer or volunteers"""
+        values = (event_name, room_name, booking_date, booking_time, cost, organizer_id,
+                  duration_minutes or DEFAULT_DURATION)
+        return writer.submit(_update, event_id, values, check_conflicts).result()
 
     @staticmethod
-    def delete(event_id):
-        with get_db() as conn:
-            cursor = conn.cursor()
-            # Check if event has any donations
-            cursor.execute('SELECT COUNT(*) FROM donations WHERE event_id = ?', (event_id,))
-            if cursor.fetchone()[0] > 0:
-                return False  # Can't delete event with donations
-            
-            # Delete event volunteers first (due to foreign key constraint)
-            cursor.execute('DELETE FROM event_volunteers WHERE event_id = ?', (event_id,))
-            
-            # Delete the event
-            cursor.execute('DELETE FROM events WHERE event_id = ?', (event_id,))
-            conn.commit()
-            return cursor.rowcount > 0
+    @emits_changes
+    def delete(event_id, archive=False):
+        """Delete a event with no donations, and its volunteer assignments.
+
+        With archive, move it, its assignments and its donations to the archive tables instead.
+        """
+        return writer.submit(remove, 'events', [event_id], archive).result().removed > 0
+
+    @staticmethod
+    @emits_changes
+    def delete_many(event_ids, archive=False):
+        """Delete or archive many events in one transaction, skipping any still referenced.
+
+        Returns a DeleteResult.
+        """
+        return writer.submit(remove, 'events', event_ids, archive).result()
 
     @staticmethod
-    def search(term):
+    def search(term, limit=None):
+        """Full-text search over event name, room and organizer name, best match first"""
+        query = match_query(term)
+        if query is None:
+            return Event.get_all() if limit is None else Event.get_page(None, limit)
         with get_db() as conn:
-            cursor = conn.cursor()
-            search_term = f'%{term}%'
+            cursor = record_cursor(conn)
+            # An event matched both by its own text and by its organizer
+            # ranks by the better of the two
             cursor.execute('''
-                SELECT e.*, v.first_name || ' ' || v.surname as organizer_name 
-                FROM events e 
+                WITH matches (event_id, rank) AS (
+                    SELECT rowid, rank FROM events_fts WHERE events_fts MATCH ?
+                    UNION ALL
+                    SELECT e.event_id, volunteers_fts.rank FROM volunteers_fts
+                    JOIN events e ON e.organizer_id = volunteers_fts.rowid
+                    WHERE volunteers_fts MATCH ?
+                )
+                SELECT e.*, v.first_name || ' ' || v.surname as organizer_name
+                FROM (SELECT event_id, MIN(rank) AS rank FROM matches GROUP BY event_id) m
+                JOIN events e ON e.event_id = m.event_id
                 LEFT JOIN volunteers v ON e.organizer_id = v.volunteer_id
-                WHERE e.event_name LIKE ? 
-                OR e.room_name LIKE ?
-                OR v.first_name || ' ' || v.surname LIKE ?
-            ''', (search_term, search_term, search_term))
-            return cursor.fetchall()
+                ORDER BY m.rank, e.event_id
+                LIMIT ?
+            ''', (query, query, -1 if limit is None else limit))
+            return fetch_records(cursor, 'EventRecord')
 
     @staticmethod
-    def assign_volunteer(event_id, volunteer_id, role):
-        with get_db() as conn:
-            cursor = conn.cursor()
-            try:
-                cursor.execute('''
-                    INSERT INTO event_volunteers (event_id, volunteer_id, role)
-                    VALUES (?, ?, ?)
-                ''', (event_id, volunteer_id, role))
-                conn.commit()
-                return True
-            except sqlite3.IntegrityError:
-                return False  # Volunteer already assigned or invalid IDs
+    @emits_changes
+    def assign_volunteer(event_id, volunteer_id, role, check_conflicts=True):
+        """Raises SchedulingConflict if the volunteer is booked elsewhere at the time"""
+        try:
+            return writer.submit(_assign, event_id, [volunteer_id], role,
+                                 check_conflicts).result() > 0
+        except sqlite3.IntegrityError:
+            return False  # Volunteer already assigned or invalid IDs
+
+    @staticmethod
+    @emits_changes
+    def assign_volunteers(event_id, volunteer_ids, role, check_conflicts=True):
+        """Assign several volunteers in one transaction, all or none.
+
+        Returns how many were newly assigned; raises SchedulingConflict
+        listing every volunteer booked elsewhere at the time.
+        """
+        volunteer_ids = list(volunteer_ids)
+        if not volunteer_ids:
+            return 0
+        return writer.submit(_assign, event_id, volunteer_ids, role, check_conflicts).result()
 
     @staticmethod
+    @emits_changes
     def remove_volunteer(event_id, volunteer_id):
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                DELETE FROM event_volunteers 
-                WHERE event_id = ? AND volunteer_id = ?
-            ''', (event_id, volunteer_id))
-            conn.commit()
-            return cursor.rowcount > 0
+        return writer.execute('''
+            DELETE FROM event_volunteers 
+            WHERE event_id = ? AND volunteer_id = ?
+        ''', (event_id, volunteer_id)).result().rowcount > 0
+
+    @staticmethod
+    @emits_changes
+    def remove_volunteers(event_id, volunteer_ids):
+        """Remove several volunteers in one transaction; returns how many were removed"""
+        return writer.submit(_remove, event_id, list(volunteer_ids)).result()
 
     @staticmethod
     def get_event_volunteers(event_id):
         with get_db() as conn:
-            cursor = conn.cursor()
+            cursor = record_cursor(conn)
             cursor.execute('''
                 SELECT v.*, ev.role
                 FROM volunteers v
                 JOIN event_volunteers ev ON v.volunteer_id = ev.volunteer_id
                 WHERE ev.event_id = ?
+                ORDER BY v.volunteer_id
             ''', (event_id,))
-            return cursor.fetchall()
+            return fetch_records(cursor, 'EventVolunteerRecord')
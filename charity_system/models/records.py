@@ -0,0 +1,99 @@
+from collections import namedtuple
+
+# Rows fetched per round trip by the streaming iter_* methods
+CHUNK_SIZE = 1000
+
+# Rows returned per call by the get_page methods
+PAGE_SIZE = 200
+
+_record_types = {}
+
+
+class RecordMixin:
+    """Row access shared by every record type.
+
+    Records are tuples, so they take no per-instance dict, but they still
+    answer record['column'] like the sqlite3.Row objects they replace.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise IndexError(f'No column named {key}') from None
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return list(self._fields)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def as_dict(self):
+        return dict(zip(self._fields, self))
+
+
+def record_type(name, columns):
+    """Tuple-based record class for a result set, cached by name and columns"""
+    columns = tuple(columns)
+    cls = _record_types.get((name, columns))
+    if cls is None:
+        base = namedtuple(name, columns)
+        cls = type(name, (RecordMixin, base), {'__slots__': ()})
+        _record_types[(name, columns)] = cls
+    return cls
+
+
+def record_cursor(conn):
+    """Cursor returning plain tuples, for the record helpers below"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor
+
+
+def _maker(cursor, name, shared):
+    """Function building one record from a raw row of cursor's result"""
+    columns = [column[0] for column in cursor.description]
+    make = record_type(name, columns)._make
+    if not shared:
+        return make
+    # Repeated values (e.g. donor names on every donation) share one
+    # string object instead of one copy per row
+    positions = [columns.index(column) for column in shared if column in columns]
+    pool = {}
+
+    def make_shared(row):
+        row = list(row)
+        for i in positions:
+            row[i] = pool.setdefault(row[i], row[i])
+        return make(row)
+    return make_shared
+
+
+def fetch_records(cursor, name, shared=()):
+    """All rows of an executed record_cursor as a list of records"""
+    if cursor.description is None:
+        return []
+    return list(map(_maker(cursor, name, shared), cursor.fetchall()))
+
+
+def fetch_record(cursor, name):
+    """First row of an executed record_cursor as a record, or None"""
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return _maker(cursor, name, ())(row)
+
+
+def iter_records(cursor, name, chunk_size=CHUNK_SIZE, shared=()):
+    """Stream records from an executed record_cursor, chunk_size rows at a time"""
+    if cursor.description is None:
+        return
+    make = _maker(cursor, name, shared)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from map(make, rows)
@@ -0,0 +1,135 @@
+import heapq
+import itertools
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from database.db_connection import get_db
+
+# Length of an event booked without one, in minutes
+DEFAULT_DURATION = 120
+
+# Longest an event may run. A booking that overlaps one starting at T must
+# itself start within MAX_DURATION before T, so conflict lookups are an
+# index range scan over that window rather than a scan of every event.
+MAX_DURATION = 24 * 60
+
+TIME_FORMAT = '%Y-%m-%d %H:%M'
+
+# Booking date and time formats accepted; older rows carry seconds
+INPUT_FORMATS = (TIME_FORMAT, TIME_FORMAT + ':%S')
+
+START = "datetime(e.booking_date || ' ' || e.booking_time)"
+END = "datetime(e.booking_date || ' ' || e.booking_time, '+' || e.duration_minutes || ' minutes')"
+
+# Two bookings that overlap. kind is 'room' or 'volunteer' and key the room
+# name or volunteer id they share; start and end bound the overlap.
+Conflict = namedtuple('Conflict', 'kind key event_id other_event_id start end')
+
+
+class SchedulingConflict(Exception):
+    """A booking overlaps another event in the same room or for the same volunteer"""
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__('\n'.join(describe(conflict) for conflict in conflicts))
+
+
+class InvalidBooking(ValueError):
+    """A booking's date, time or duration cannot be placed on the calendar"""
+
+
+def describe(conflict):
+    who = f"Room '{conflict.key}'" if conflict.kind == 'room' else f'Volunteer {conflict.key}'
+    return (f'{who} is already booked for event {conflict.other_event_id} '
+            f'between {conflict.start} and {conflict.end}')
+
+
+def interval(booking_date, booking_time, duration_minutes):
+    """(start, end) datetimes of a booking; raises InvalidBooking for bad input"""
+    try:
+        duration_minutes = int(duration_minutes)
+    except (TypeError, ValueError):
+        raise InvalidBooking(f'Duration must be a whole number of minutes, '
+                             f'got {duration_minutes!r}') from None
+    if not 0 < duration_minutes <= MAX_DURATION:
+        raise InvalidBooking(f'Duration must be between 1 and {MAX_DURATION} minutes')
+    for time_format in INPUT_FORMATS:
+        try:
+            start = datetime.strptime(f'{booking_date} {booking_time}', time_format)
+        except (TypeError, ValueError):
+            continue
+        return start, start + timedelta(minutes=duration_minutes)
+    raise InvalidBooking(f'Booking needs a YYYY-MM-DD date and HH:MM time, '
+                         f'got {booking_date!r} {booking_time!r}')
+
+
+def _overlapping(conn, kind, key, where, params, start, end, exclude_event_id):
+    first_day = (start - timedelta(minutes=MAX_DURATION)).strftime('%Y-%m-%d')
+    rows = conn.execute(f'''
+        SELECT e.event_id, {START}, {END} FROM events e
+        WHERE {where} AND e.booking_date BETWEEN ? AND ?
+          AND {START} < ? AND {END} > ? AND e.event_id IS NOT ?
+        ORDER BY 2
+    ''', (*params, first_day, end.strftime('%Y-%m-%d'), end.strftime(TIME_FORMAT + ':%S'),
+          start.strftime(TIME_FORMAT + ':%S'), exclude_event_id)).fetchall()
+    begin, finish = start.strftime(TIME_FORMAT), end.strftime(TIME_FORMAT)
+    return [Conflict(kind, key, exclude_event_id, other_id, max(begin, other_start[:16]),
+                     min(finish, other_end[:16]))
+            for other_id, other_start, other_end in rows]
+
+
+def room_conflicts(conn, room_name, start, end, exclude_event_id=None):
+    """Events in room_name (ignoring case) overlapping start..end"""
+    if not room_name:
+        return []
+    return _overlapping(conn, 'room', room_name, 'e.room_name = ? COLLATE NOCASE',
+                        (room_name,), start, end, exclude_event_id)
+
+
+def volunteer_conflicts(conn, volunteer_id, start, end, exclude_event_id=None):
+    """Events volunteer_id organizes or is assigned to that overlap start..end"""
+    if volunteer_id is None:
+        return []
+    return _overlapping(
+        conn, 'volunteer', volunteer_id,
+        '''(e.organizer_id = ? OR e.event_id IN (
+               SELECT event_id FROM event_volunteers WHERE volunteer_id = ?))''',
+        (volunteer_id, volunteer_id), start, end, exclude_event_id)
+
+
+def _sweep(kind, rows, key):
+    """Overlapping pairs in rows of (key, event_id, start, end) sorted by key, start.
+
+    Keeps the bookings still running at each start in a heap ordered by
+    end time, so the report is O(n log n) plus one step per conflict.
+    """
+    for _, group in itertools.groupby(rows, key=key):
+        running = []
+        for name, event_id, start, end in group:
+            while running and running[0][0] <= start:
+                heapq.heappop(running)
+            for other_end, other_id in running:
+                yield Conflict(kind, name, other_id, event_id, start[:16], min(end, other_end)[:16])
+            heapq.heappush(running, (end, event_id))
+
+
+def find_all_conflicts():
+    """Every room and volunteer double booking across the whole calendar"""
+    with get_db() as conn:
+        rooms = conn.execute(f'''
+            SELECT e.room_name, e.event_id, {START}, {END} FROM events e
+            WHERE COALESCE(e.room_name, '') != '' AND {START} IS NOT NULL
+            ORDER BY e.room_name COLLATE NOCASE, 3
+        ''')
+        conflicts = list(_sweep('room', rooms, lambda row: row[0].lower()))
+        volunteers = conn.execute(f'''
+            SELECT ev.volunteer_id, e.event_id, {START}, {END}
+            FROM event_volunteers ev JOIN events e ON e.event_id = ev.event_id
+            WHERE {START} IS NOT NULL
+            UNION
+            SELECT e.organizer_id, e.event_id, {START}, {END} FROM events e
+            WHERE e.organizer_id IS NOT NULL AND {START} IS NOT NULL
+            ORDER BY 1, 3
+        ''')
+        conflicts.extend(_sweep('volunteer', volunteers, lambda row: row[0]))
+    return conflicts
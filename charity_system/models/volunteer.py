@@ -1,4 +1,10 @@
+from database.changes import emits_changes
 from database.db_connection import get_db
+from database.writer import writer
+from database.fts import match_query
+from models.cache import cached_by_id
+from models.dependencies import remove
+from models.records import CHUNK_SIZE, PAGE_SIZE, fetch_record, fetch_records, iter_records, record_cursor
 from datetime import datetime
 
 class Volunteer:
@@ -12,75 +18,94 @@ class Volunteer:
         self.join_date = join_date
 
     @staticmethod
+    @emits_changes
     def create(first_name, surname, phone_number, email, join_date=None):
         if join_date is None:
             join_date = datetime.now().strftime('%Y-%m-%d')
             
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO volunteers (first_name, surname, phone_number, email, join_date)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (first_name, surname, phone_number, email, join_date))
-            conn.commit()
-            return cursor.lastrowid
+        return writer.execute('''
+            INSERT INTO volunteers (first_name, surname, phone_number, email, join_date)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (first_name, surname, phone_number, email, join_date)).result().lastrowid
 
     @staticmethod
     def get_all():
         with get_db() as conn:
-            cursor = conn.cursor()
+            cursor = record_cursor(conn)
+            cursor.execute('SELECT * FROM volunteers')
+            return fetch_records(cursor, 'VolunteerRecord')
+
+    @staticmethod
+    def iter_all(chunk_size=CHUNK_SIZE):
+        """Stream every volunteer without building the full list"""
+        with get_db() as conn:
+            cursor = record_cursor(conn)
             cursor.execute('SELECT * FROM volunteers')
-            return cursor.fetchall()
+            yield from iter_records(cursor, 'VolunteerRecord', chunk_size)
 
     @staticmethod
+    def get_page(after=None, limit=PAGE_SIZE):
+        """Up to limit volunteers with ids above after, in id order"""
+        with get_db() as conn:
+            cursor = record_cursor(conn)
+            cursor.execute('SELECT * FROM volunteers WHERE volunteer_id > ? ORDER BY volunteer_id LIMIT ?',
+                           (after or 0, limit))
+            return fetch_records(cursor, 'VolunteerRecord')
+
+    @staticmethod
+    @cached_by_id('volunteers')
     def get_by_id(volunteer_id):
         with get_db() as conn:
-            cursor = conn.cursor()
+            cursor = record_cursor(conn)
             cursor.execute('SELECT * FROM volunteers WHERE volunteer_id = ?', (volunteer_id,))
-            return cursor.fetchone()
+            return fetch_record(cursor, 'VolunteerRecord')
 
     @staticmethod
+    @emits_changes
     def update(volunteer_id, first_name, surname, phone_number, email):
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE volunteers 
-                SET first_name=?, surname=?, phone_number=?, email=?
-                WHERE volunteer_id=?
-            ''', (first_name, surname, phone_number, email, volunteer_id))
-            conn.commit()
-            return cursor.rowcount > 0
+        return writer.execute('''
+            UPDATE volunteers 
+            SET first_name=?, surname=?, phone_number=?, email=?
+            WHERE volunteer_id=?
+        ''', (first_name, surname, phone_number, email, volunteer_id)).result().rowcount > 0
 
     @staticmethod
-    def delete(volunteer_id):
-        with get_db() as conn:
-            cursor = conn.cursor()
-            # Check if volunteer has any associated donations or events
-            cursor.execute('''
-                SELECT COUNT(*) FROM 
-                (SELECT collected_by FROM donations WHERE collected_by = ?
-                 UNION
-                 SELECT organizer_id FROM events WHERE organizer_id = ?
-                 UNION
-                 SELECT volunteer_id FROM event_volunteers WHERE volunteer_id = ?)
-            ''', (volunteer_id, volunteer_id, volunteer_id))
-            
-            if cursor.fetchone()[0] > 0:
-                return False  # Can't delete volunteer with associated records
-            
-            cursor.execute('DELETE FROM volunteers WHERE volunteer_id = ?', (volunteer_id,))
-            conn.commit()
-            return cursor.rowcount > 0
+    @emits_changes
+    def delete(volunteer_id, archive=False):
+        """Delete a volunteer with no donations or events.
+
+        With archive, move it and its event assignments to the archive tables instead.
+        """
+        return writer.submit(remove, 'volunteers', [volunteer_id], archive).result().removed > 0
+
+    @staticmethod
+    @emits_changes
+    def delete_many(volunteer_ids, archive=False):
+        """Delete or archive many volunteers in one transaction, skipping any still referenced.
+
+        Returns a DeleteResult.
+        """
+        return writer.submit(remove, 'volunteers', volunteer_ids, archive).result()
+
+    @staticmethod
+    def search(term, limit=None):
+        """Full-text search over name and email, best match first"""
+        return list(Volunteer.iter_search(term, limit))
 
     @staticmethod
-    def search(term):
+    def iter_search(term, limit=None, chunk_size=CHUNK_SIZE):
+        """Streaming variant of search"""
+        query = match_query(term)
+        if query is None:
+            yield from Volunteer.iter_all(chunk_size)
+            return
         with get_db() as conn:
-            cursor = conn.cursor()
-            search_term = f'%{term}%'
+            cursor = record_cursor(conn)
             cursor.execute('''
-                SELECT * FROM volunteers 
-                WHERE first_name LIKE ? 
-                OR surname LIKE ? 
-                OR email LIKE ?
-            ''', (search_term, search_term, search_term))
-            return cursor.fetchall()
+                SELECT v.* FROM volunteers_fts
+                JOIN volunteers v ON v.volunteer_id = volunteers_fts.rowid
+                WHERE volunteers_fts MATCH ?
+                ORDER BY volunteers_fts.rank
+                LIMIT ?
+            ''', (query, -1 if limit is None else limit))
+            yield from iter_records(cursor, 'VolunteerRecord', chunk_size)
@@ -0,0 +1,255 @@
+import threading
+from datetime import date
+
+from database.db_connection import get_db
+from database.partitions import union_source
+from database.versions import table_versions
+from models.records import fetch_records, record_cursor
+
+# Expression mapping a donation date (column "day") to its bucket; weeks
+# start on Monday and are labelled by that date
+BUCKETS = {
+    'day': 'day',
+    'week': "date(day, '-6 days', 'weekday 1')",
+    'month': 'substr(day, 1, 7)',
+}
+
+# Buckets averaged by the moving average column of rollup()
+MOVING_AVERAGE_WINDOW = 3
+
+
+class ReportCache:
+    """Report results keyed on their arguments and the tables they read.
+
+    A cached result is reused until one of its tables' change counters
+    moves, so repeat views of a report cost one table_versions lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = {}    # (name, args) -> (versions, result)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name, tables, compute, *args):
+        versions = table_versions(tables)
+        key = (name, args)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] == versions:
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        result = compute(*args)
+        with self._lock:
+            self._results[key] = (versions, result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+cache = ReportCache()
+
+
+def _rollup(bucket, date_from, date_to):
+    where = ['1=1']
+    params = []
+    if date_from:
+        where.append('d.donation_date >= ?')
+        params.append(date_from)
+    if date_to:
+        where.append('d.donation_date <= ?')
+        params.append(date_to)
+    if bucket == 'month' and not params:
+        # Whole-history monthly totals are already maintained by triggers
+        totals = '''
+            SELECT key AS bucket, donation_count, ROUND(total_amount, 2) AS total_amount,
+                   ROUND(gift_aid_amount, 2) AS gift_aid_amount
+            FROM donation_totals WHERE scope = 'month'
+        '''
+    else:
+        # Days are summed first, in index order, and only the few thousand
+        # daily rows are mapped to their week or month
+        totals = f'''
+            SELECT {BUCKETS[bucket]} AS bucket, SUM(donation_count) AS donation_count,
+                   ROUND(SUM(total_amount), 2) AS total_amount,
+                   ROUND(SUM(gift_aid_amount), 2) AS gift_aid_amount
+            FROM (
+                SELECT d.donation_date AS day, COUNT(*) AS donation_count,
+                       SUM(d.amount) AS total_amount,
+                       SUM(CASE WHEN d.gift_aid THEN d.amount ELSE 0 END) AS gift_aid_amount
+                FROM {{source}} d
+                WHERE {' AND '.join(where)}
+                GROUP BY d.donation_date
+            )
+            GROUP BY bucket
+        '''
+    with get_db() as conn:
+        # Only the closed years inside the range are read
+        totals = totals.format(source=union_source(conn, date_from, date_to))
+        cursor = record_cursor(conn)
+        cursor.execute(f'''
+            SELECT bucket, donation_count, total_amount, gift_aid_amount,
+                   ROUND(SUM(total_amount) OVER (ORDER BY bucket), 2) AS running_total,
+                   ROUND(total_amount - LAG(total_amount) OVER (ORDER BY bucket), 2) AS change,
+                   ROUND(AVG(total_amount) OVER (
+                       ORDER BY bucket ROWS BETWEEN {MOVING_AVERAGE_WINDOW - 1} PRECEDING AND CURRENT ROW
+                   ), 2) AS moving_average
+            FROM ({totals})
+            ORDER BY bucket
+        ''', params)
+        return fetch_records(cursor, 'RollupRecord')
+
+
+def rollup(bucket='month', date_from=None, date_to=None):
+    """Donation count and totals per day, week or month, oldest first.
+
+    Each bucket also carries the running total, the change from the
+    previous bucket and a moving average of the last few buckets.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}, got {bucket!r}")
+    return cache.get('rollup', ['donations'], _rollup, bucket, date_from, date_to)
+
+
+def _event_roi():
+    with get_db() as conn:
+        cursor = record_cursor(conn)
+        cursor.execute('''
+            SELECT e.event_id, e.event_name, e.booking_date, e.cost,
+                   COALESCE(t.donation_count, 0) AS donation_count,
+                   ROUND(COALESCE(t.total_amount, 0), 2) AS raised,
+                   ROUND(COALESCE(t.total_amount, 0) - e.cost, 2) AS net,
+                   CASE WHEN e.cost > 0
+                        THEN ROUND((COALESCE(t.total_amount, 0) - e.cost) / e.cost, 4)
+                   END AS roi,
+                   RANK() OVER (ORDER BY COALESCE(t.total_amount, 0) - e.cost DESC) AS net_rank
+            FROM events e
+            LEFT JOIN donation_totals t ON t.scope = 'event' AND t.key = e.event_id
+            ORDER BY net_rank, e.event_id
+        ''')
+        return fetch_records(cursor, 'EventRoiRecord')
+
+
+def event_roi():
+    """Every event with donations raised, net of its cost, and ROI, best first.
+
+    roi is net / cost, or None for events that cost nothing.
+    """
+    return cache.get('event_roi', ['events', 'donations'], _event_roi)
+
+
+def _collector_stats():
+    with get_db() as conn:
+        cursor = record_cursor(conn)
+        cursor.execute(f'''
+            SELECT v.volunteer_id, v.first_name || ' ' || v.surname AS collector_name,
+                   s.donation_count, ROUND(s.total_amount, 2) AS total_amount,
+                   ROUND(s.total_amount / s.donation_count, 2) AS average_amount,
+                   s.largest_amount, s.first_date, s.last_date, s.active_days,
+                   ROUND(100.0 * s.total_amount / SUM(s.total_amount) OVER (), 2) AS share_percent,
+                   RANK() OVER (ORDER BY s.total_amount DESC) AS total_rank,
+                   RANK() OVER (ORDER BY s.donation_count DESC) AS count_rank
+            FROM (
+                SELECT collected_by, COUNT(*) AS donation_count, SUM(amount) AS total_amount,
+                       MAX(amount) AS largest_amount, MIN(donation_date) AS first_date,
+                       MAX(donation_date) AS last_date,
+                       COUNT(DISTINCT donation_date) AS active_days
+                FROM {union_source(conn)}
+                GROUP BY collected_by
+            ) s
+            JOIN volunteers v ON v.volunteer_id = s.collected_by
+            ORDER BY total_rank, v.volunteer_id
+        ''')
+        return fetch_records(cursor, 'CollectorStatsRecord')
+
+
+def collector_stats():
+    """Per-volunteer collection totals, averages and ranks, top collector first"""
+    return cache.get('collector_stats', ['volunteers', 'donations'], _collector_stats)
+
+
+def _summary(month):
+    with get_db() as conn:
+        totals = conn.execute('''
+            SELECT COALESCE(SUM(donation_count), 0), COALESCE(SUM(total_amount), 0),
+                   COALESCE(SUM(gift_aid_amount), 0)
+            FROM donation_totals WHERE scope = 'month'
+        ''').fetchone()
+        this_month = conn.execute('''
+            SELECT donation_count, total_amount FROM donation_totals
+            WHERE scope = 'month' AND key = ?
+        ''', (month,)).fetchone()
+        donors = conn.execute(
+            "SELECT COUNT(*) FROM donation_totals WHERE scope = 'donor'").fetchone()[0]
+    count, total, gift_aid = totals
+    return {
+        'donation_count': count,
+        'total_amount': round(total, 2),
+        'gift_aid_amount': round(gift_aid, 2),
+        'gift_aid_share': round(100 * gift_aid / total, 1) if total else 0.0,
+        'active_donors': donors,
+        'month_count': this_month[0] if this_month else 0,
+        'month_amount': round(this_month[1], 2) if this_month else 0.0,
+    }
+
+
+def summary():
+    """Headline totals: all-time and this month, gift-aid share and active donors.
+
+    Read from donation_totals, so the cost does not grow with the number
+    of donations.
+    """
+    return cache.get('summary', ['donations'], _summary, date.today().strftime('%Y-%m'))
+
+
+def _top_donors(limit):
+    with get_db() as conn:
+        cursor = record_cursor(conn)
+        cursor.execute('''
+            SELECT dn.donor_id,
+                   CASE
+                       WHEN dn.business_name IS NOT NULL THEN dn.business_name
+                       ELSE dn.first_name || ' ' || dn.surname
+                   END AS donor_name,
+                   t.donation_count, ROUND(t.total_amount, 2) AS total_amount
+            FROM (
+                SELECT key, donation_count, total_amount FROM donation_totals
+                WHERE scope = 'donor' ORDER BY total_amount DESC LIMIT ?
+            ) t
+            JOIN donors dn ON dn.donor_id = t.key
+            ORDER BY t.total_amount DESC
+        ''', (limit,))
+        return fetch_records(cursor, 'TopDonorRecord')
+
+
+def top_donors(limit=10):
+    """Donors who have given the most in total, largest first"""
+    return cache.get('top_donors', ['donations', 'donors'], _top_donors, limit)
+
+
+def _upcoming_events(limit, today):
+    with get_db() as conn:
+        cursor = record_cursor(conn)
+        cursor.execute('''
+            SELECT e.event_id, e.event_name, e.room_name, e.booking_date, e.booking_time,
+                   v.first_name || ' ' || v.surname AS organizer_name,
+                   (SELECT COUNT(*) FROM event_volunteers ev
+                    WHERE ev.event_id = e.event_id) AS volunteer_count
+            FROM events e
+            LEFT JOIN volunteers v ON e.organizer_id = v.volunteer_id
+            WHERE e.booking_date >= ?
+            ORDER BY e.booking_date, e.booking_time
+            LIMIT ?
+        ''', (today, limit))
+        return fetch_records(cursor, 'UpcomingEventRecord')
+
+
+def upcoming_events(limit=10, today=None):
+    """Next events from today (YYYY-MM-DD, default the current date) onwards"""
+    # The date is part of the cache key, so results roll over at midnight
+    today = today or date.today().isoformat()
+    return cache.get('upcoming_events', ['events', 'volunteers', 'event_volunteers'],
+                     _upcoming_events, limit, today)
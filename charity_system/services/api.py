@@ -0,0 +1,480 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from database.changes import feed
+from database.db_connection import PoolTimeout, get_db, pool_stats
+from database.partitions import closed_until
+from database.versions import table_versions
+from database.writer import writer as write_queue
+from models.cache import records
+from models.donation import Donation
+from models.donor import Donor
+from models.event import Event
+from models.scheduling import InvalidBooking, SchedulingConflict
+from models.volunteer import Volunteer
+
+logger = logging.getLogger(__name__)
+
+# Largest page a client may ask for, and the default
+MAX_LIMIT = 500
+DEFAULT_LIMIT = 50
+
+# Largest request body accepted, in bytes
+MAX_BODY = 1 << 20
+
+
+def _integer(value):
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError('must be a whole number')
+    return int(value)
+
+
+def _positive(value):
+    value = float(value)
+    if not value > 0:
+        raise ValueError('must be greater than 0')
+    return value
+
+
+def _non_negative(value):
+    value = float(value)
+    if value < 0:
+        raise ValueError('must not be negative')
+    return value
+
+
+def _iso_date(value):
+    return date.fromisoformat(value).isoformat()
+
+
+def _flag(value):
+    if value not in (True, False, 0, 1):
+        raise ValueError('must be true or false')
+    return int(value)
+
+
+# Converters applied to client-supplied fields before they reach a model;
+# SQLite would store text in a numeric column, and CHECK(amount > 0) holds
+# for any text
+FIELD_TYPES = {
+    'amount': _positive,
+    'cost': _non_negative,
+    'gift_aid': _flag,
+    'donor_id': _integer,
+    'event_id': _integer,
+    'collected_by': _integer,
+    'organizer_id': _integer,
+    'duration_minutes': _integer,
+    'donation_date': _iso_date,
+    'booking_date': _iso_date,
+    'join_date': _iso_date,
+}
+
+
+class ApiError(Exception):
+    """Turned into a JSON error response with the given status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Resource:
+    """How one collection maps onto its model.
+
+    fields lists the arguments of model.create in order, required those
+    a new record must supply. update_fields are the arguments of
+    model.update after the id.
+    """
+
+    def __init__(self, model, key, tables, fields, required, update_fields=None):
+        self.model = model
+        self.key = key
+        self.tables = tables
+        self.fields = fields
+        self.required = required
+        self.update_fields = update_fields or fields
+
+    def parse(self, query):
+        """The listing's search term and cursor; raises ApiError when either is invalid"""
+        term, after = query.get('q'), query.get('after')
+        if term and after:
+            raise ApiError(HTTPStatus.BAD_REQUEST,
+                           'after cannot be combined with q: search results are one page')
+        try:
+            after = int(after) if after else None
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'invalid after cursor') from None
+        return {'term': term, 'after': after}
+
+    def list(self, listing, limit):
+        """Search results for a term, otherwise the page after the cursor"""
+        if listing['term']:
+            return self.model.search(listing['term'], limit), None
+        rows = self.model.get_page(listing['after'], limit)
+        return rows, (str(rows[-1][self.key]) if len(rows) == limit else None)
+
+
+class DonationResource(Resource):
+    """Donations page newest first on (date, id) and accept filters, with or without a term"""
+
+    FILTERS = ('donor_id', 'event_id', 'volunteer_id')
+
+    def parse(self, query):
+        after = None
+        if query.get('after'):
+            date, _, donation_id = query['after'].partition(',')
+            try:
+                after = (date, int(donation_id))
+            except ValueError:
+                raise ApiError(HTTPStatus.BAD_REQUEST, 'invalid after cursor') from None
+        filters = {}
+        for name in self.FILTERS:
+            if query.get(name):
+                try:
+                    filters[name] = int(query[name])
+                except ValueError:
+                    raise ApiError(HTTPStatus.BAD_REQUEST,
+                                   f'{name} must be an integer') from None
+        return {'term': query.get('q'), 'after': after, 'filters': filters}
+
+    def list(self, listing, limit):
+        rows = Donation.get_page(listing['after'], limit, term=listing['term'],
+                                 **listing['filters'])
+        next_cursor = None
+        if len(rows) == limit:
+            date, donation_id = Donation.page_key(rows[-1])
+            next_cursor = f'{date},{donation_id}'
+        return rows, next_cursor
+
+
+RESOURCES = {
+    'donors': Resource(
+        Donor, 'donor_id', ('donors',),
+        ('first_name', 'surname', 'business_name', 'postcode', 'house_number',
+         'phone_number', 'donor_type'),
+        ('postcode', 'phone_number', 'donor_type')),
+    'volunteers': Resource(
+        Volunteer, 'volunteer_id', ('volunteers',),
+        ('first_name', 'surname', 'phone_number', 'email', 'join_date'),
+        ('first_name', 'surname', 'phone_number', 'email'),
+        ('first_name', 'surname', 'phone_number', 'email')),
+    'events': Resource(
+        Event, 'event_id', ('events', 'volunteers'),
+        ('event_name', 'room_name', 'booking_date', 'booking_time', 'cost', 'organizer_id',
+         'duration_minutes'),
+        ('event_name', 'room_name', 'booking_date', 'booking_time', 'cost')),
+    'donations': DonationResource(
+        Donation, 'donation_id', ('donations', 'donors', 'events', 'volunteers'),
+        ('amount', 'donation_date', 'gift_aid', 'notes', 'donor_id', 'event_id', 'collected_by'),
+        ('amount', 'gift_aid', 'donor_id', 'collected_by')),
+}
+
+
+def as_dict(row):
+    return row.as_dict() if hasattr(row, 'as_dict') else dict(row)
+
+
+def record_etag(record):
+    digest = hashlib.sha1(json.dumps(record, sort_keys=True, default=str).encode()).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def collection_etag(versions, target):
+    """Weak tag that changes whenever a table behind the listing is written"""
+    state = ','.join(f'{table}:{versions.get(table)}' for table in sorted(versions))
+    digest = hashlib.sha1(f'{state}|{target}'.encode()).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+class ApiServer:
+    """JSON over HTTP/1.1 for donors, volunteers, events and donations.
+
+    Requests are handled on one asyncio loop. Blocking SQLite reads run
+    on a small thread pool. Writes call the model methods from their own
+    threads, which hand the SQL to the shared write queue
+    (database/writer.py); concurrent requests are committed together in
+    one transaction by its single writer thread.
+
+        GET    /<resource>?limit=&after=&q=    page or search
+        GET    /<resource>/<id>
+        POST   /<resource>                     create, returns the record
+        PUT    /<resource>/<id>                update the given fields
+        DELETE /<resource>/<id>
+        GET    /stats                          pool, cache and request counters
+
+    Listings carry a weak ETag derived from table_versions and records a
+    strong one from their content; If-None-Match answers 304 and If-Match
+    on PUT/DELETE answers 412 when the record has moved on.
+    """
+
+    def __init__(self, read_workers=4, write_workers=32):
+        self.readers = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix='api-read')
+        # These threads wait on write queue futures, then on the change feed
+        # poll every model write ends with. Concurrent polls share one read
+        # and one pooled connection, which cmd_serve sizes the pool for
+        self.writers = ThreadPoolExecutor(max_workers=write_workers, thread_name_prefix='api-write')
+        self.requests = 0
+        self.errors = 0
+        self.started = time.time()
+
+    async def read(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.readers, func, *args)
+
+    async def write(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.writers, func, *args)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                request_line, *header_lines = head.decode('latin-1').rstrip('\r\n').split('\r\n')
+                try:
+                    method, target, version = request_line.split(' ', 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    status, extra, payload = self.error(HTTPStatus.BAD_REQUEST, 'invalid Content-Length')
+                    keep_alive = False
+                elif length > MAX_BODY:
+                    status, extra, payload = self.error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'body too large')
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    status, extra, payload = await self.dispatch(method, target, headers, body)
+                    keep_alive = (version == 'HTTP/1.1'
+                                  and headers.get('connection', '').lower() != 'close')
+                writer.write(self.response(status, extra, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def response(self, status, extra, payload, keep_alive):
+        body = b'' if payload is None else json.dumps(payload, default=str).encode()
+        lines = [f'HTTP/1.1 {status.value} {status.phrase}',
+                 f'Content-Length: {len(body)}',
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if body:
+            lines.append('Content-Type: application/json')
+        lines.extend(f'{name}: {value}' for name, value in extra.items())
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+    def error(self, status, message):
+        self.errors += 1
+        return status, {}, {'error': message}
+
+    async def dispatch(self, method, target, headers, body):
+        self.requests += 1
+        url = urlsplit(target)
+        parts = [part for part in url.path.split('/') if part]
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            if parts == ['stats'] and method == 'GET':
+                return HTTPStatus.OK, {}, self.stats()
+            if not parts or parts[0] not in RESOURCES or len(parts) > 2:
+                raise ApiError(HTTPStatus.NOT_FOUND, f'no such resource: {url.path}')
+            resource = RESOURCES[parts[0]]
+            if len(parts) == 1:
+                if method == 'GET':
+                    return await self.list(resource, target, query, headers)
+                if method == 'POST':
+                    return await self.create(resource, self.parse_body(body))
+                raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f'{method} not allowed here')
+            try:
+                record_id = int(parts[1])
+            except ValueError:
+                raise ApiError(HTTPStatus.NOT_FOUND, f'invalid id: {parts[1]}') from None
+            if method == 'GET':
+                return await self.retrieve(resource, record_id, headers)
+            if method == 'PUT':
+                return await self.update(resource, record_id, self.parse_body(body), headers)
+            if method == 'DELETE':
+                return await self.delete(resource, record_id, headers,
+                                         query.get('archive') in ('1', 'true'))
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f'{method} not allowed here')
+        except ApiError as e:
+            return self.error(e.status, str(e))
+        except InvalidBooking as e:
+            return self.error(HTTPStatus.BAD_REQUEST, str(e))
+        except (sqlite3.IntegrityError, SchedulingConflict) as e:
+            return self.error(HTTPStatus.CONFLICT, str(e))
+        except (sqlite3.Error, PoolTimeout) as e:
+            return self.error(HTTPStatus.SERVICE_UNAVAILABLE, str(e))
+        except Exception:
+            logger.exception('%s %s failed', method, target)
+            return self.error(HTTPStatus.INTERNAL_SERVER_ERROR, 'internal error')
+
+    def parse_body(self, body):
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'body is not valid JSON') from None
+        if not isinstance(data, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'body must be a JSON object')
+        return data
+
+    async def list(self, resource, target, query, headers):
+        try:
+            limit = min(int(query.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'limit must be an integer') from None
+        if limit < 1:
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'limit must be positive')
+        etag, listing = await self.read(self.load_listing, resource, target,
+                                        resource.parse(query), limit, headers.get('if-none-match'))
+        if listing is None:
+            return HTTPStatus.NOT_MODIFIED, {'ETag': etag}, None
+        return HTTPStatus.OK, {'ETag': etag}, listing
+
+    def load_listing(self, resource, target, listing, limit, seen_etag):
+        """Reader thread: the listing's tag, and the page itself unless seen_etag is current"""
+        etag = collection_etag(table_versions(resource.tables), target)
+        if etag == seen_etag:
+            return etag, None
+        rows, next_cursor = resource.list(listing, limit)
+        return etag, {'items': [as_dict(row) for row in rows], 'next': next_cursor}
+
+    def load_record(self, resource, record_id):
+        """Reader thread: the record, after catching up with writes made elsewhere.
+
+        The record cache is only invalidated by polling the change feed,
+        and the GUI, CLI and imports write from other processes, so a
+        cached record (and the ETag If-Match is checked against) would
+        otherwise stay stale.
+        """
+        feed.poll()
+        return resource.model.get_by_id(record_id)
+
+    async def fetch(self, resource, record_id):
+        row = await self.read(self.load_record, resource, record_id)
+        if row is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f'{resource.key} {record_id} not found')
+        return as_dict(row)
+
+    async def retrieve(self, resource, record_id, headers):
+        record = await self.fetch(resource, record_id)
+        etag = record_etag(record)
+        if headers.get('if-none-match') == etag:
+            return HTTPStatus.NOT_MODIFIED, {'ETag': etag}, None
+        return HTTPStatus.OK, {'ETag': etag}, record
+
+    def convert(self, data):
+        """Client-supplied values in their column types; empty optional values become None"""
+        converted = {}
+        for name, value in data.items():
+            if name in FIELD_TYPES and value not in (None, ''):
+                try:
+                    value = FIELD_TYPES[name](value)
+                except (TypeError, ValueError) as e:
+                    raise ApiError(HTTPStatus.BAD_REQUEST, f'invalid {name} {value!r}: {e}') from None
+            elif name in FIELD_TYPES:
+                value = None
+            converted[name] = value
+        return converted
+
+    def check_fields(self, resource, data, fields):
+        unknown = set(data) - set(resource.fields)
+        if unknown:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"unknown fields: {', '.join(sorted(unknown))}")
+        missing = [name for name in resource.required if data.get(name) in (None, '')]
+        if missing:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"missing fields: {', '.join(missing)}")
+        return [data.get(name) for name in fields]
+
+    async def create(self, resource, data):
+        values = self.check_fields(resource, self.convert(data), resource.fields)
+        record_id = await self.write(resource.model.create, *values)
+        record = await self.fetch(resource, record_id)
+        return HTTPStatus.CREATED, {
+            'ETag': record_etag(record),
+            'Location': f'/{resource.tables[0]}/{record_id}',
+        }, record
+
+    def check_precondition(self, record, headers):
+        expected = headers.get('if-match')
+        if expected and expected != '*' and expected != record_etag(record):
+            raise ApiError(HTTPStatus.PRECONDITION_FAILED, 'record has changed')
+
+    async def update(self, resource, record_id, data, headers):
+        current = await self.fetch(resource, record_id)
+        self.check_precondition(current, headers)
+        merged = {name: current.get(name) for name in resource.fields}
+        merged.update(self.convert(data))
+        values = self.check_fields(resource, merged, resource.update_fields)
+        if not await self.write(resource.model.update, record_id, *values):
+            raise (await self.read(self.refusal, resource, record_id, current)
+                   or ApiError(HTTPStatus.CONFLICT, f'{resource.key} {record_id} was not updated'))
+        record = await self.fetch(resource, record_id)
+        return HTTPStatus.OK, {'ETag': record_etag(record)}, record
+
+    async def delete(self, resource, record_id, headers, archive=False):
+        current = await self.fetch(resource, record_id)
+        self.check_precondition(current, headers)
+        if archive and not hasattr(resource.model, 'delete_many'):
+            raise ApiError(HTTPStatus.BAD_REQUEST, f'{resource.tables[0]} cannot be archived')
+        args = (record_id, True) if archive else (record_id,)
+        if not await self.write(resource.model.delete, *args):
+            raise (await self.read(self.refusal, resource, record_id, current)
+                   or ApiError(HTTPStatus.CONFLICT, f'{resource.key} {record_id} is still referenced'))
+        return HTTPStatus.NO_CONTENT, {}, None
+
+    def refusal(self, resource, record_id, record):
+        """Reader thread: the error for a write that matched no row, if it is not the usual one.
+
+        Donations in a closed financial year are read-only, and the record
+        may have been deleted since it was read.
+        """
+        if resource.key == 'donation_id':
+            with get_db() as conn:
+                closed = closed_until(conn)
+            if closed and record['donation_date'] <= closed:
+                return ApiError(HTTPStatus.CONFLICT,
+                                f'donation {record_id} is in a closed financial year')
+        if self.load_record(resource, record_id) is None:
+            return ApiError(HTTPStatus.NOT_FOUND, f'{resource.key} {record_id} not found')
+        return None
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'uptime': round(time.time() - self.started, 1),
+            'pool': pool_stats(),
+            'record_cache': records.stats(),
+            'write_queue': write_queue.stats(),
+        }
+
+    async def serve(self, host='127.0.0.1', port=8080, ready=None):
+        """Accept connections until cancelled; ready(server) is called once listening"""
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        if ready:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.readers.shutdown(wait=False)
+        self.writers.shutdown(wait=True)
@@ -0,0 +1,314 @@
+import csv
+import json
+import time
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+
+from database import changes, partitions
+from database.db_connection import get_db
+
+CHUNK_SIZE = 5000
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f', ''}
+
+
+class RejectedRow(Exception):
+    """A source row that cannot be imported; the message goes to the rejects file"""
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows_read = 0
+        self.donations_inserted = 0
+        self.donors_created = 0
+        self.donors_matched = 0
+        self.rejected = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows_read / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f"{self.rows_read:,} rows in {self.elapsed:.2f}s "
+                f"({self.rows_per_second:,.0f} rows/s): "
+                f"{self.donations_inserted:,} donations inserted, "
+                f"{self.donors_created:,} donors created, "
+                f"{self.donors_matched:,} donors matched, "
+                f"{self.rejected:,} rejected")
+
+
+def read_rows(path, fmt=None):
+    """Stream rows from a CSV or JSONL file as dicts"""
+    path = Path(path)
+    fmt = fmt or ('jsonl' if path.suffix.lower() in ('.jsonl', '.json', '.ndjson') else 'csv')
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if fmt == 'csv':
+            for row in csv.DictReader(f):
+                yield {k.strip().lower(): (v.strip() if isinstance(v, str) else v)
+                       for k, v in row.items() if k}
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield {k.strip().lower(): v for k, v in json.loads(line).items()}
+
+
+def normalize_postcode(postcode):
+    """Canonical UK form: upper case, single space before the inward code"""
+    compact = ''.join(str(postcode or '').split()).upper()
+    if len(compact) > 3:
+        return f'{compact[:-3]} {compact[-3:]}'
+    return compact
+
+
+def donor_key(row):
+    """Identity used to match an incoming donor against existing ones"""
+    name = row.get('business_name') or f"{row.get('first_name') or ''} {row.get('surname') or ''}"
+    return normalize_postcode(row.get('postcode')), ' '.join(name.lower().split())
+
+
+def _text(row, field):
+    value = row.get(field)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _int(row, field):
+    value = _text(row, field)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise RejectedRow(f'{field} must be an integer, got {value!r}')
+
+
+def parse_donor(row):
+    """Validate the donor columns of a row against the donors table constraints"""
+    donor = {
+        'first_name': _text(row, 'first_name'),
+        'surname': _text(row, 'surname'),
+        'business_name': _text(row, 'business_name'),
+        'postcode': normalize_postcode(row.get('postcode')) or None,
+        'house_number': _text(row, 'house_number'),
+        'phone_number': _text(row, 'phone_number'),
+        'donor_type': (_text(row, 'donor_type') or '').lower() or None,
+    }
+    if donor['donor_type'] is None:
+        donor['donor_type'] = 'business' if donor['business_name'] else 'individual'
+    if donor['donor_type'] not in ('individual', 'business'):
+        raise RejectedRow(f"donor_type must be individual or business, got {donor['donor_type']!r}")
+    if not donor['postcode']:
+        raise RejectedRow('postcode is required to identify the donor')
+    if not (donor['business_name'] or donor['first_name'] or donor['surname']):
+        raise RejectedRow('donor name is required')
+    return donor
+
+
+def parse_donation(row, default_collector=None):
+    """Validate the donation columns of a row; amount must satisfy amount > 0"""
+    raw_amount = _text(row, 'amount')
+    if raw_amount is None:
+        raise RejectedRow('amount is required')
+    try:
+        amount = round(float(raw_amount.replace('£', '').replace(',', '')), 2)
+    except ValueError:
+        raise RejectedRow(f'amount is not a number: {raw_amount!r}')
+    if not amount > 0:
+        raise RejectedRow(f'amount must be positive, got {raw_amount!r}')
+
+    raw_date = _text(row, 'donation_date') or _text(row, 'date')
+    if raw_date is None:
+        raise RejectedRow('donation_date is required')
+    for date_format in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            donation_date = datetime.strptime(raw_date[:10], date_format).strftime('%Y-%m-%d')
+            break
+        except ValueError:
+            continue
+    else:
+        raise RejectedRow(f'donation_date is not a date: {raw_date!r}')
+
+    gift_aid = str(row.get('gift_aid') if row.get('gift_aid') is not None else '').strip().lower()
+    if gift_aid not in TRUE_VALUES | FALSE_VALUES:
+        raise RejectedRow(f'gift_aid must be yes/no, got {gift_aid!r}')
+
+    collected_by = _int(row, 'collected_by') or default_collector
+    if collected_by is None:
+        raise RejectedRow('collected_by is required')
+
+    return {
+        'amount': amount,
+        'donation_date': donation_date,
+        'gift_aid': gift_aid in TRUE_VALUES,
+        'notes': _text(row, 'notes'),
+        'donor_id': _int(row, 'donor_id'),
+        'event_id': _int(row, 'event_id'),
+        'collected_by': collected_by,
+    }
+
+
+class DonorResolver:
+    """Maps (postcode, name) keys to donor ids, creating donors as needed.
+
+    Lookups for a whole chunk are answered with one indexed query on
+    postcode, and every key seen is cached for the rest of the import.
+    """
+
+    def __init__(self, report):
+        self.report = report
+        self.cache = {}
+
+    def prefetch(self, conn, keys):
+        postcodes = list({postcode for postcode, name in keys if (postcode, name) not in self.cache})
+        for start in range(0, len(postcodes), 500):
+            batch = postcodes[start:start + 500]
+            variants = batch + [p.replace(' ', '') for p in batch]
+            placeholders = ', '.join('?' * len(variants))
+            rows = conn.execute(f'''
+                SELECT donor_id, first_name, surname, business_name, postcode
+                FROM donors WHERE postcode COLLATE NOCASE IN ({placeholders})
+                ORDER BY donor_id
+            ''', variants)
+            for row in rows:
+                self.cache.setdefault(donor_key(dict(row)), row['donor_id'])
+
+    def resolve(self, conn, donor):
+        key = donor_key(donor)
+        donor_id = self.cache.get(key)
+        if donor_id is not None:
+            self.report.donors_matched += 1
+            return donor_id
+        if not donor['phone_number']:
+            raise RejectedRow('phone_number is required to create a new donor')
+        cursor = conn.execute('''
+            INSERT INTO donors (first_name, surname, business_name, postcode,
+                                house_number, phone_number, donor_type)
+            VALUES (:first_name, :surname, :business_name, :postcode,
+                    :house_number, :phone_number, :donor_type)
+        ''', donor)
+        self.cache[key] = cursor.lastrowid
+        self.report.donors_created += 1
+        return cursor.lastrowid
+
+
+class RejectWriter:
+    """Writes rejected rows to a JSONL side file, opened on first use"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def write(self, line_number, row, error):
+        if self.path is None:
+            return
+        if self.file is None:
+            self.file = open(self.path, 'w', encoding='utf-8')
+        self.file.write(json.dumps({'line': line_number, 'error': error, 'row': row}) + '\n')
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def _chunks(rows, size):
+    numbered = enumerate(rows, start=1)
+    while True:
+        chunk = list(islice(numbered, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_file(path, kind='donations', reject_path=None, chunk_size=CHUNK_SIZE,
+                default_collector=None, fmt=None, progress=None):
+    """Stream a CSV/JSONL export into the database.
+
+    kind is 'donations' (each row is a gift plus its donor's details) or
+    'donors'. Each chunk is validated, donors are matched by postcode and
+    name or created, and the donations are inserted with executemany in a
+    single transaction per chunk. Returns an ImportReport.
+    """
+    report = ImportReport()
+    resolver = DonorResolver(report)
+    rejects = RejectWriter(reject_path)
+    started = time.perf_counter()
+
+    try:
+        with get_db() as conn:
+            volunteer_ids = {r[0] for r in conn.execute('SELECT volunteer_id FROM volunteers')}
+            event_ids = {r[0] for r in conn.execute('SELECT event_id FROM events')}
+            closed_until = partitions.closed_until(conn)
+
+            for chunk in _chunks(read_rows(path, fmt), chunk_size):
+                report.rows_read += len(chunk)
+                parsed = []
+                for line_number, row in chunk:
+                    try:
+                        donation = None
+                        if kind == 'donations':
+                            donation = parse_donation(row, default_collector)
+                            if donation['collected_by'] not in volunteer_ids:
+                                raise RejectedRow(f"unknown collector {donation['collected_by']}")
+                            if donation['event_id'] is not None and donation['event_id'] not in event_ids:
+                                raise RejectedRow(f"unknown event {donation['event_id']}")
+                            if closed_until and donation['donation_date'] <= closed_until:
+                                raise RejectedRow(f"donation_date {donation['donation_date']} "
+                                                  f"falls in a closed financial year")
+                        donor = None if donation and donation['donor_id'] else parse_donor(row)
+                        parsed.append((line_number, row, donor, donation))
+                    except RejectedRow as e:
+                        report.rejected += 1
+                        rejects.write(line_number, row, str(e))
+
+                # Rows naming an existing donor_id must point at a real donor
+                wanted = list({d['donor_id'] for _, _, _, d in parsed if d and d['donor_id']})
+                known = set()
+                for start in range(0, len(wanted), 500):
+                    batch = wanted[start:start + 500]
+                    known.update(r[0] for r in conn.execute(
+                        f"SELECT donor_id FROM donors WHERE donor_id IN ({', '.join('?' * len(batch))})",
+                        batch))
+
+                with conn:
+                    resolver.prefetch(conn, [donor_key(d) for _, _, d, _ in parsed if d])
+                    donations = []
+                    for line_number, row, donor, donation in parsed:
+                        try:
+                            if donor is None and donation['donor_id'] not in known:
+                                raise RejectedRow(f"unknown donor {donation['donor_id']}")
+                            if donor is not None:
+                                donor_id = resolver.resolve(conn, donor)
+                            if donation is not None:
+                                if donor is not None:
+                                    donation['donor_id'] = donor_id
+                                donations.append(donation)
+                        except RejectedRow as e:
+                            report.rejected += 1
+                            rejects.write(line_number, row, str(e))
+                    conn.executemany('''
+                        INSERT INTO donations (amount, donation_date, gift_aid, notes,
+                                               donor_id, event_id, collected_by)
+                        VALUES (:amount, :donation_date, :gift_aid, :notes,
+                                :donor_id, :event_id, :collected_by)
+                    ''', donations)
+                    report.donations_inserted += len(donations)
+
+                report.elapsed = time.perf_counter() - started
+                if progress:
+                    progress(report)
+
+            # A large import leaves one change_log row per write; subscribers
+            # see it as a bulk change, so the old rows are not needed
+            with conn:
+                changes.prune(conn)
+    finally:
+        rejects.close()
+
+    report.elapsed = time.perf_counter() - started
+    return report
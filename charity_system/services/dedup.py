@@ -0,0 +1,340 @@
+import functools
+import itertools
+import re
+import time
+from collections import namedtuple
+
+from database.changes import emits_changes, feed
+from database.db_connection import get_db
+from database.writer import writer
+from models.dependencies import blocked_ids
+from services.bulk_import import normalize_postcode
+
+# Pairs scoring at least MATCH_THRESHOLD are merged by merge_all; those
+# between REVIEW_THRESHOLD and it are only reported
+MATCH_THRESHOLD = 0.9
+REVIEW_THRESHOLD = 0.8
+
+# Score contributions: name similarity (0..1) times NAME_WEIGHT, plus a
+# fixed amount for each identifying field that agrees exactly
+NAME_WEIGHT = 0.55
+POSTCODE_WEIGHT = 0.15
+HOUSE_WEIGHT = 0.15
+PHONE_WEIGHT = 0.15
+
+# Blocks larger than this are not compared all-pairs; each donor is only
+# compared with its WINDOW nearest neighbours in name order
+MAX_BLOCK = 100
+WINDOW = 20
+
+# Rows fetched per round trip while scanning donors
+FETCH_SIZE = 10_000
+
+SOUNDEX_CODES = {letter: digit for digit, letters in (
+    ('1', 'bfpv'), ('2', 'cgjkqsxz'), ('3', 'dt'), ('4', 'l'), ('5', 'mn'), ('6', 'r'))
+    for letter in letters}
+
+NON_DIGITS = re.compile(r'\D')
+
+DONOR_COLUMNS = '''donor_id, first_name, surname, business_name, postcode,
+                   house_number, phone_number, donor_type'''
+
+# What a donor is compared on, normalized once per row
+Profile = namedtuple('Profile', 'donor_id kind name surname_key postcode house phone')
+
+# A likely duplicate: keep_id is the older (lower) id
+DuplicatePair = namedtuple('DuplicatePair', 'score keep_id duplicate_id')
+
+
+@functools.lru_cache(maxsize=100_000)
+def soundex(word):
+    """Four-character phonetic key, so Smith/Smyth and Davies/Davis block together"""
+    letters = [c for c in (word or '').lower() if 'a' <= c <= 'z']
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+        if letter not in 'hw':
+            previous = digit
+    return (code + '000')[:4]
+
+
+@functools.lru_cache(maxsize=200_000)
+def name_similarity(a, b):
+    """Jaro-Winkler similarity of two normalized names, 0..1"""
+    if a == b:
+        return 1.0
+    len_a, len_b = len(a), len(b)
+    if not len_a or not len_b:
+        return 0.0
+    window = max(max(len_a, len_b) // 2 - 1, 0)
+    matched_b = [False] * len_b
+    a_matches = []
+    for i, char in enumerate(a):
+        for j in range(max(0, i - window), min(i + window + 1, len_b)):
+            if not matched_b[j] and b[j] == char:
+                matched_b[j] = True
+                a_matches.append(char)
+                break
+    matches = len(a_matches)
+    if not matches:
+        return 0.0
+    b_matches = [char for char, matched in zip(b, matched_b) if matched]
+    transpositions = sum(x != y for x, y in zip(a_matches, b_matches)) // 2
+    jaro = (matches / len_a + matches / len_b + (matches - transpositions) / matches) / 3
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * 0.1 * (1 - jaro)
+
+
+def _clean(value):
+    return ' '.join(str(value or '').lower().split())
+
+
+def postcode_key(value):
+    """Postcode as compared: upper case, no whitespace at all"""
+    return ''.join(normalize_postcode(value).split())
+
+
+def phone_key(value):
+    """Phone number as compared: its digits only"""
+    return NON_DIGITS.sub('', str(value or ''))
+
+
+def profile(row):
+    """Normalized comparison fields for a donor row or dict"""
+    business_name = _clean(row['business_name'])
+    if business_name:
+        name = business_name
+        key_word = business_name.split()[0]
+    else:
+        name = _clean(f"{row['first_name'] or ''} {row['surname'] or ''}")
+        key_word = _clean(row['surname']) or name
+    return Profile(
+        row.get('donor_id'),
+        'business' if business_name else 'individual',
+        name,
+        soundex(key_word),
+        postcode_key(row['postcode']),
+        _clean(row['house_number']),
+        phone_key(row['phone_number']),
+    )
+
+
+def _field_score(a, b):
+    total = 0.0
+    if a.postcode and a.postcode == b.postcode:
+        total += POSTCODE_WEIGHT
+    if a.house and a.house == b.house:
+        total += HOUSE_WEIGHT
+    if a.phone and a.phone == b.phone:
+        total += PHONE_WEIGHT
+    return total
+
+
+def _name_score(a, b):
+    return NAME_WEIGHT * name_similarity(*sorted((a.name, b.name)))
+
+
+def score(a, b):
+    """Likelihood, 0..1, that two donor profiles are the same donor"""
+    if a.kind != b.kind:
+        return 0.0
+    return _field_score(a, b) + _name_score(a, b)
+
+
+def _candidate_pairs(block):
+    """Pairs within one block: all of them, or a sorted-neighbourhood window"""
+    if len(block) <= MAX_BLOCK:
+        return itertools.combinations(block, 2)
+    block = sorted(block, key=lambda p: p.name)
+    return ((block[i], block[j]) for i in range(len(block))
+            for j in range(i + 1, min(i + 1 + WINDOW, len(block))))
+
+
+class DedupReport:
+    def __init__(self):
+        self.donors = 0
+        self.blocks = 0
+        self.comparisons = 0
+        self.pairs = []
+        self.elapsed = 0.0
+
+    def summary(self):
+        matches = sum(pair.score >= MATCH_THRESHOLD for pair in self.pairs)
+        return (f"{self.donors:,} donors in {self.elapsed:.1f}s: {self.blocks:,} blocks, "
+                f"{self.comparisons:,} comparisons, {matches:,} likely duplicates, "
+                f"{len(self.pairs) - matches:,} to review")
+
+
+def _scan(conn, order_by, group_key, block_key, report, threshold, seen):
+    """One blocking pass over donors streamed in order_by order.
+
+    Consecutive rows with the same group_key are split into blocks by
+    block_key, and only donors in the same block are compared.
+    """
+    cursor = conn.execute(f'SELECT {DONOR_COLUMNS} FROM donors ORDER BY {order_by}')
+    profiles = (profile(dict(row)) for chunk in iter(lambda: cursor.fetchmany(FETCH_SIZE), [])
+                for row in chunk)
+    for key, group in itertools.groupby(profiles, key=group_key):
+        if not key:
+            continue
+        blocks = {}
+        for donor in group:
+            blocks.setdefault(block_key(donor), []).append(donor)
+        for block in blocks.values():
+            if len(block) < 2:
+                continue
+            report.blocks += 1
+            for a, b in _candidate_pairs(block):
+                report.comparisons += 1
+                # Exact field matches are cheap; only pairs that could still
+                # reach the threshold get the name comparison
+                pair_score = _field_score(a, b)
+                if a.kind != b.kind or pair_score + NAME_WEIGHT < threshold:
+                    continue
+                pair_score += _name_score(a, b)
+                if pair_score < threshold:
+                    continue
+                keep_id, duplicate_id = sorted((a.donor_id, b.donor_id))
+                if (keep_id, duplicate_id) not in seen:
+                    seen.add((keep_id, duplicate_id))
+                    report.pairs.append(DuplicatePair(round(pair_score, 3), keep_id, duplicate_id))
+
+
+def find_duplicates(threshold=REVIEW_THRESHOLD):
+    """Scan every donor for likely duplicates, returning a DedupReport.
+
+    Two blocking passes keep the work near linear: donors are compared
+    only with others at the same normalized postcode and phonetic surname,
+    and with others sharing a phone number (which catches a donor whose
+    postcode was mistyped). Rows are streamed in block order, so memory
+    holds one block at a time.
+    """
+    report = DedupReport()
+    started = time.perf_counter()
+    seen = set()
+    with get_db() as conn:
+        # Rows are ordered by the very keys they are grouped on, so donors
+        # whose numbers differ only in punctuation end up next to each other
+        conn.create_function('dedup_postcode_key', 1, postcode_key, deterministic=True)
+        conn.create_function('dedup_phone_key', 1, phone_key, deterministic=True)
+        report.donors = conn.execute('SELECT COUNT(*) FROM donors').fetchone()[0]
+        _scan(conn, 'dedup_postcode_key(postcode)',
+              lambda p: p.postcode, lambda p: p.surname_key, report, threshold, seen)
+        _scan(conn, 'dedup_phone_key(phone_number)',
+              lambda p: p.phone, lambda p: None, report, threshold, seen)
+    report.pairs.sort(key=lambda pair: (-pair.score, pair.keep_id))
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def likely_duplicates(donor, threshold=REVIEW_THRESHOLD, limit=5):
+    """Existing donors that a donor about to be saved probably duplicates.
+
+    donor is a dict of the donors columns; an existing donor_id in it is
+    excluded from the results. Only the donor's postcode block is read,
+    through the postcode index, so this is cheap enough to run on save.
+    Returns (score, row) pairs, best first.
+    """
+    candidate = profile(dict(donor, donor_id=donor.get('donor_id')))
+    postcode = normalize_postcode(donor.get('postcode'))
+    if not postcode:
+        return []
+    with get_db() as conn:
+        rows = conn.execute(f'''
+            SELECT {DONOR_COLUMNS} FROM donors
+            WHERE postcode COLLATE NOCASE IN (?, ?)
+        ''', (postcode, postcode.replace(' ', ''))).fetchall()
+    matches = []
+    for row in rows:
+        if row['donor_id'] == candidate.donor_id:
+            continue
+        row_score = score(candidate, profile(dict(row)))
+        if row_score >= threshold:
+            matches.append((round(row_score, 3), row))
+    matches.sort(key=lambda match: -match[0])
+    return matches[:limit]
+
+
+def clusters(pairs, threshold=MATCH_THRESHOLD):
+    """Group pairs at or above threshold into {keep_id: [duplicate ids]}"""
+    parent = {}
+
+    def find(donor_id):
+        root = donor_id
+        while parent.get(root, root) != root:
+            root = parent[root]
+        parent[donor_id] = root
+        return root
+
+    for pair in pairs:
+        if pair.score >= threshold:
+            a, b = find(pair.keep_id), find(pair.duplicate_id)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+    groups = {}
+    for donor_id in list(parent):
+        root = find(donor_id)
+        if root != donor_id:
+            groups.setdefault(root, []).append(donor_id)
+    return groups
+
+
+def _merge(cursor, keep_id, duplicate_ids):
+    placeholders = ', '.join('?' * len(duplicate_ids))
+    cursor.execute(f'UPDATE donations SET donor_id = ? WHERE donor_id IN ({placeholders})',
+                   [keep_id, *duplicate_ids])
+    moved = cursor.rowcount
+    # Fill a missing house number from the oldest duplicate that has one
+    cursor.execute(f'''
+        UPDATE donors SET house_number = (
+            SELECT house_number FROM donors
+            WHERE donor_id IN ({placeholders}) AND COALESCE(house_number, '') != ''
+            ORDER BY donor_id LIMIT 1)
+        WHERE donor_id = ? AND COALESCE(house_number, '') = ''
+          AND EXISTS (SELECT 1 FROM donors WHERE donor_id IN ({placeholders})
+                      AND COALESCE(house_number, '') != '')
+    ''', [*duplicate_ids, keep_id, *duplicate_ids])
+    # Duplicates with donations in a closed financial year keep their
+    # record; those donations cannot move
+    kept = blocked_ids(cursor, 'donors', duplicate_ids)
+    removed = [donor_id for donor_id in duplicate_ids if int(donor_id) not in kept]
+    if not removed:
+        return 0, moved
+    cursor.execute(f"DELETE FROM donors WHERE donor_id IN ({', '.join('?' * len(removed))})",
+                   removed)
+    return cursor.rowcount, moved
+
+
+@emits_changes
+def merge(keep_id, duplicate_ids):
+    """Move the duplicates' donations to keep_id and delete them, in one transaction.
+
+    Duplicates with donations in a closed financial year are kept. Returns
+    (donors removed, donations moved).
+    """
+    duplicate_ids = [donor_id for donor_id in duplicate_ids if donor_id != keep_id]
+    if not duplicate_ids:
+        return 0, 0
+    return writer.submit(_merge, keep_id, duplicate_ids).result()
+
+
+def merge_all(pairs, threshold=MATCH_THRESHOLD):
+    """Merge every cluster of pairs scoring at least threshold.
+
+    Returns (donors removed, donations moved).
+    """
+    groups = clusters(pairs, threshold)
+    futures = [writer.submit(_merge, keep_id, duplicate_ids)
+               for keep_id, duplicate_ids in groups.items()]
+    results = [future.result() for future in futures]
+    feed.poll()
+    return sum(removed for removed, _ in results), sum(moved for _, moved in results)
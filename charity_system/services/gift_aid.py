@@ -0,0 +1,242 @@
+import csv
+import json
+import shutil
+import tempfile
+import time
+from array import array
+from datetime import datetime
+from operator import itemgetter
+from pathlib import Path
+
+from database.db_connection import get_db
+from database.writer import writer
+from models.records import record_cursor
+
+CHUNK_SIZE = 20000
+
+# Rows per claim file; large claims are split across numbered files
+ROWS_PER_FILE = 100_000
+
+# Basic rate income tax, in percent. The charity reclaims the tax the donor
+# paid on the gross gift: amount * rate / (100 - rate), i.e. 25p per pound
+BASIC_RATE = 20
+
+# Column headings of the HMRC Gift Aid donations schedule
+HEADINGS = ['Title', 'First name', 'Last name', 'House name or number', 'Postcode',
+            'Aggregated donations', 'Sponsored event', 'Donation date', 'Amount']
+
+# Only gifts from individuals with a home address qualify, and each
+# donation is claimed once
+ELIGIBLE = '''
+    FROM donations d
+    JOIN donors dn ON d.donor_id = dn.donor_id
+    WHERE d.gift_aid = 1
+      AND d.donation_date BETWEEN ? AND ?
+      AND dn.donor_type = 'individual'
+      AND NOT EXISTS (SELECT 1 FROM gift_aid_claimed c WHERE c.donation_id = d.donation_id)
+'''
+HAS_ADDRESS = "COALESCE(dn.house_number, '') <> '' AND COALESCE(dn.postcode, '') <> ''"
+
+# Formatting and pence conversion are done by SQLite, so the Python side
+# only moves finished tuples; the trailing pence and id columns feed the
+# totals and the claim record. Rows come straight off the covering
+# idx_donations_gift_aid index
+CLAIM_ROWS = f'''
+    SELECT '', dn.first_name, dn.surname, dn.house_number, upper(dn.postcode), '', 'No',
+           substr(d.donation_date, 9, 2) || '/' || substr(d.donation_date, 6, 2) || '/'
+               || substr(d.donation_date, 3, 2),
+           printf('%.2f', d.amount),
+           CAST(round(d.amount * 100) AS INTEGER), d.donation_id
+    {ELIGIBLE} AND {HAS_ADDRESS}
+    ORDER BY d.donation_date
+'''
+
+_schedule_columns = itemgetter(*range(len(HEADINGS)))
+_pence_column = itemgetter(len(HEADINGS))
+_id_column = itemgetter(len(HEADINGS) + 1)
+
+
+def reclaim_pence(gross_pence):
+    """Tax reclaimable on a total of gross_pence, rounded down to the penny"""
+    return gross_pence * BASIC_RATE // (100 - BASIC_RATE)
+
+
+def quarter_bounds(quarter):
+    """('2024-01-01', '2024-03-31') for '2024Q1'"""
+    try:
+        year, number = quarter.upper().split('Q')
+        year, number = int(year), int(number)
+    except ValueError:
+        raise ValueError(f'quarter must look like 2024Q1, got {quarter!r}') from None
+    if not 1 <= number <= 4:
+        raise ValueError(f'quarter must be Q1 to Q4, got {quarter!r}')
+    last_day = {1: '03-31', 2: '06-30', 3: '09-30', 4: '12-31'}[number]
+    return f'{year}-{(number - 1) * 3 + 1:02d}-01', f'{year}-{last_day}'
+
+
+class ClaimReport:
+    def __init__(self, period_start, period_end):
+        self.period_start = period_start
+        self.period_end = period_end
+        self.claim_id = None
+        self.donation_count = 0
+        self.gross_pence = 0
+        self.missing_address = 0
+        self.files = []
+        self.elapsed = 0.0
+
+    @property
+    def reclaim_pence(self):
+        return reclaim_pence(self.gross_pence)
+
+    def summary(self):
+        if not self.donation_count:
+            return f'No unclaimed Gift Aid donations for {self.period_start} to {self.period_end}'
+        claim = f'Claim {self.claim_id}' if self.claim_id else 'Draft claim'
+        lines = [
+            f"{claim} for {self.period_start} to {self.period_end}: "
+            f"{self.donation_count:,} donations, £{self.gross_pence / 100:,.2f} gross, "
+            f"£{self.reclaim_pence / 100:,.2f} reclaimable ({self.elapsed:.2f}s)",
+        ]
+        if self.missing_address:
+            lines.append(f"{self.missing_address:,} eligible donations skipped: "
+                         f"donor has no house number or postcode")
+        lines.extend(f'  {path}' for path in self.files)
+        return '\n'.join(lines)
+
+
+class ClaimFileWriter:
+    """Writes schedule rows to numbered CSV files of at most rows_per_file rows"""
+
+    def __init__(self, out_dir, prefix, rows_per_file):
+        self.out_dir = Path(out_dir)
+        self.prefix = prefix
+        self.rows_per_file = rows_per_file
+        self.paths = []
+        self.file = None
+        self.writer = None
+        self.rows_in_file = 0
+
+    def _next_file(self):
+        self.close()
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / f'{self.prefix}_{len(self.paths) + 1:03d}.csv'
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(HEADINGS)
+        self.paths.append(path)
+        self.rows_in_file = 0
+
+    def write(self, rows):
+        while rows:
+            if self.file is None or self.rows_in_file >= self.rows_per_file:
+                self._next_file()
+            room = self.rows_per_file - self.rows_in_file
+            self.writer.writerows(map(_schedule_columns, rows[:room]))
+            self.rows_in_file += len(rows[:room])
+            rows = rows[room:]
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class AlreadyClaimed(Exception):
+    """Donations in a claim were recorded by another claim while its files were written"""
+
+
+def _record(cursor, period_start, period_end, donation_ids, report):
+    ids = json.dumps(donation_ids)
+    cursor.execute('''
+        SELECT COUNT(*) FROM json_each(?) AS ids
+        WHERE EXISTS (SELECT 1 FROM gift_aid_claimed c WHERE c.donation_id = ids.value)
+    ''', (ids,))
+    taken = cursor.fetchone()[0]
+    if taken:
+        raise AlreadyClaimed(f'{taken:,} of these donations were claimed meanwhile; '
+                             f'run the claim again')
+    cursor.execute('''
+        INSERT INTO gift_aid_claims (period_start, period_end, created_at, donation_count,
+                                     gross_amount, reclaim_amount)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (period_start, period_end, datetime.now().isoformat(timespec='seconds'),
+          report.donation_count, report.gross_pence / 100, report.reclaim_pence / 100))
+    claim_id = cursor.lastrowid
+    cursor.execute('''
+        INSERT INTO gift_aid_claimed (donation_id, claim_id)
+        SELECT value, ? FROM json_each(?)
+    ''', (claim_id, ids))
+    return claim_id
+
+
+def create_claim(period_start, period_end, out_dir, dry_run=False,
+                 rows_per_file=ROWS_PER_FILE, chunk_size=CHUNK_SIZE):
+    """Write the Gift Aid schedule for a period and record it as claimed.
+
+    Eligible donations are streamed in chunks from one read snapshot
+    straight into draft claim files; per chunk the pence column is summed
+    as one array. The drafts go to a new gift_aid_draft_* directory under
+    out_dir, so concurrent runs never share files. The claim and its
+    donations are then recorded in one short write through the write
+    queue, which raises AlreadyClaimed if another claim took any of them
+    meanwhile, and the files are moved into out_dir named after the claim.
+    If anything fails the drafts are removed. With dry_run the drafts are
+    kept in their directory but nothing is recorded, and a period with
+    nothing left to claim records nothing either. Returns a ClaimReport.
+    """
+    report = ClaimReport(period_start, period_end)
+    started = time.perf_counter()
+    period = (period_start, period_end)
+    donation_ids = array('q')
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    draft_dir = Path(tempfile.mkdtemp(prefix='gift_aid_draft_', dir=out_dir))
+
+    try:
+        with get_db() as conn:
+            # One read transaction keeps the files and the skipped count in
+            # step without holding the write lock while the files are written
+            conn.execute('BEGIN')
+            try:
+                files = ClaimFileWriter(draft_dir, 'gift_aid_draft', rows_per_file)
+                cursor = record_cursor(conn)
+                cursor.execute(CLAIM_ROWS, period)
+                try:
+                    while True:
+                        rows = cursor.fetchmany(chunk_size)
+                        if not rows:
+                            break
+                        report.gross_pence += sum(array('q', map(_pence_column, rows)))
+                        report.donation_count += len(rows)
+                        donation_ids.extend(map(_id_column, rows))
+                        files.write(rows)
+                finally:
+                    files.close()
+                report.files = files.paths
+
+                report.missing_address = conn.execute(
+                    f'SELECT COUNT(*) {ELIGIBLE} AND NOT ({HAS_ADDRESS})', period).fetchone()[0]
+            finally:
+                conn.rollback()
+
+        if not dry_run and report.donation_count:
+            report.claim_id = writer.submit(_record, period_start, period_end,
+                                            donation_ids.tolist(), report).result()
+            report.files = [path.replace(out_dir / path.name.replace(
+                                'gift_aid_draft', f'gift_aid_claim_{report.claim_id}'))
+                            for path in report.files]
+    except BaseException:
+        shutil.rmtree(draft_dir, ignore_errors=True)
+        raise
+    if not (dry_run and report.files):
+        shutil.rmtree(draft_dir, ignore_errors=True)
+
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def get_claims():
+    """Claims made so far, newest first"""
+    with get_db() as conn:
+        return conn.execute('SELECT * FROM gift_aid_claims ORDER BY claim_id DESC').fetchall()
@@ -0,0 +1,238 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from itertools import islice, takewhile
+
+from database.changes import feed
+from database.db_connection import get_db
+from database.versions import table_versions
+
+# Display label for each lookup table: (query, label(row)). Queries may be
+# extended with a WHERE clause on id
+SOURCES = {
+    'donors': (
+        'SELECT donor_id AS id, first_name, surname, business_name FROM donors',
+        lambda r: r['business_name'] or f"{r['first_name'] or ''} {r['surname'] or ''}".strip(),
+    ),
+    'volunteers': (
+        'SELECT volunteer_id AS id, first_name, surname FROM volunteers',
+        lambda r: f"{r['first_name']} {r['surname']}",
+    ),
+    'events': (
+        'SELECT event_id AS id, event_name FROM events',
+        lambda r: r['event_name'],
+    ),
+}
+
+# Matches returned per query by default
+TOP_N = 20
+
+
+def _words(text):
+    return text.lower().split()
+
+
+# Ids relabelled since an index was built are kept in a small overlay;
+# past this many the index is rebuilt from scratch
+OVERLAY_LIMIT = 1000
+
+_MISSING = object()
+
+
+class _Labels:
+    """Read-only id -> label mapping: the built labels with an overlay on top.
+
+    An overlay value of None means the id was removed.
+    """
+
+    def __init__(self, base, overlay):
+        self.base = base
+        self.overlay = overlay
+
+    def get(self, label_id, default=None):
+        if label_id in self.overlay:
+            label = self.overlay[label_id]
+            return default if label is None else label
+        return self.base.get(label_id, default)
+
+    def __getitem__(self, label_id):
+        label = self.get(label_id, _MISSING)
+        if label is _MISSING:
+            raise KeyError(label_id)
+        return label
+
+    def __contains__(self, label_id):
+        return self.get(label_id, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        for label_id in self.base:
+            if label_id not in self.overlay:
+                yield label_id
+        for label_id, label in self.overlay.items():
+            if label is not None:
+                yield label_id
+
+    def items(self):
+        return ((label_id, self[label_id]) for label_id in self)
+
+
+class PrefixIndex:
+    """Sorted word -> id index over the display labels of one table.
+
+    Every word of a label is an entry, so "smi" finds "John Smith". Words
+    are kept in one sorted list with a parallel array of ids, and a prefix
+    query is a bisect to the first match plus a scan that stops early.
+    Labels changed since the index was built live in a small overlay with
+    its own sorted entries, merged into each scan.
+    """
+
+    def __init__(self, labels, words=None, ids=None, overlay=None, extra=None):
+        if words is None:
+            entries = sorted((word, label_id) for label_id, label in labels.items()
+                             for word in set(_words(label)))
+            words = [word for word, _ in entries]
+            ids = array('q', (label_id for _, label_id in entries))
+        self.base = labels
+        self.words = words
+        self.ids = ids
+        self.overlay = overlay or {}
+        self.extra = extra or []
+        self.labels = _Labels(labels, self.overlay) if self.overlay else labels
+
+    def patched(self, updates):
+        """New index with updates ({id: label, or None to remove}) applied.
+
+        The built words and ids are shared, not copied: only the overlay of
+        changed ids is rebuilt, so a patch costs O(overlay) until the
+        overlay passes OVERLAY_LIMIT and the whole index is rebuilt. The
+        index itself is left as it was for searches already running on
+        other threads.
+        """
+        overlay = {**self.overlay, **updates}
+        if len(overlay) > OVERLAY_LIMIT:
+            return PrefixIndex(dict(_Labels(self.base, overlay).items()))
+        extra = sorted((word, label_id) for label_id, label in overlay.items()
+                       if label is not None for word in set(_words(label)))
+        return PrefixIndex(self.base, self.words, self.ids, overlay, extra)
+
+    def _built_entries(self, prefix):
+        overlay = self.overlay
+        for index in range(bisect_left(self.words, prefix), len(self.words)):
+            word = self.words[index]
+            if not word.startswith(prefix):
+                return
+            if self.ids[index] not in overlay:
+                yield word, self.ids[index]
+
+    def _entries(self, prefix):
+        """(word, id) entries whose word starts with prefix, in order"""
+        if not self.extra:
+            return self._built_entries(prefix)
+        extra = islice(self.extra, bisect_left(self.extra, (prefix,)), None)
+        return heapq.merge(self._built_entries(prefix),
+                           takewhile(lambda entry: entry[0].startswith(prefix), extra))
+
+    def search(self, text, limit=TOP_N):
+        """Ids whose label has a word starting with each word of text"""
+        words = _words(text)
+        if not words:
+            return list(islice(self.labels, limit))
+        first, rest = words[0], words[1:]
+        # Also allow typing the id itself, e.g. "42" or "42: Jo"
+        found = []
+        if first.rstrip(':').isdigit() and int(first.rstrip(':')) in self.labels:
+            found.append(int(first.rstrip(':')))
+            if not rest:
+                return found
+        seen = set(found)
+        for _, label_id in self._entries(first):
+            if label_id in seen:
+                continue
+            seen.add(label_id)
+            label_words = _words(self.labels[label_id])
+            if all(any(w.startswith(prefix) for w in label_words) for prefix in rest):
+                found.append(label_id)
+                if len(found) >= limit:
+                    break
+        return found
+
+
+class LookupService:
+    """In-memory prefix indexes shared by every lookup widget.
+
+    An index is rebuilt only when its table's change counter has moved
+    since it was built, so writes invalidate just the affected table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes = {}    # table -> (version, PrefixIndex)
+        self._subscribed = False
+
+    def index(self, table):
+        version = table_versions([table]).get(table)
+        with self._lock:
+            cached = self._indexes.get(table)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            query, label = SOURCES[table]
+            with get_db() as conn:
+                labels = {row['id']: label(row) for row in conn.execute(query)}
+            index = PrefixIndex(labels)
+            self._indexes[table] = (version, index)
+            if not self._subscribed:
+                feed.subscribe(self.apply_changes, SOURCES)
+                self._subscribed = True
+            return index
+
+    def apply_changes(self, changes):
+        """Patch built indexes from change feed events instead of rebuilding"""
+        by_table = {}
+        for change in changes:
+            by_table.setdefault(change.table, []).append(change)
+        for table, table_changes in by_table.items():
+            with self._lock:
+                if table not in self._indexes:
+                    continue
+                if any(change.key is None for change in table_changes):
+                    del self._indexes[table]
+                    continue
+            removed = {change.key for change in table_changes if change.op == 'delete'}
+            changed = {change.key for change in table_changes if change.op != 'delete'} - removed
+            query, label = SOURCES[table]
+            updates = dict.fromkeys(removed)
+            with get_db() as conn:
+                if changed:
+                    changed = list(changed)
+                    rows = conn.execute(
+                        f"SELECT * FROM ({query}) WHERE id IN ({', '.join('?' * len(changed))})",
+                        changed)
+                    updates.update((row['id'], label(row)) for row in rows)
+                version = table_versions([table]).get(table)
+            with self._lock:
+                cached = self._indexes.get(table)
+                if cached is not None:
+                    self._indexes[table] = (version, cached[1].patched(updates))
+
+    def search(self, table, text, limit=TOP_N):
+        """Top matches as 'id: label' strings, the format the views parse"""
+        index = self.index(table)
+        return [f"{label_id}: {index.labels[label_id]}" for label_id in index.search(text, limit)]
+
+    def label(self, table, label_id):
+        """'id: label' display string for one id, or '' if unknown"""
+        if label_id is None:
+            return ''
+        name = self.index(table).labels.get(label_id)
+        return f"{label_id}: {name}" if name is not None else ''
+
+    def invalidate(self, table=None):
+        with self._lock:
+            if table is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(table, None)
+
+
+lookups = LookupService()
@@ -0,0 +1,46 @@
+from database.db_connection import get_db
+from models.donor import Donor
+from models.event import Event
+
+# Records archived per transaction, so other writes are not held up behind
+# one long archive run
+ARCHIVE_CHUNK = 5_000
+
+# Records with no activity on or after a date: table -> (query, model)
+STALE = {
+    # Donors whose every donation is older; donors with none are left alone,
+    # they may just have been added
+    'donors': ('''
+        SELECT donor_id FROM donors d
+        WHERE EXISTS (SELECT 1 FROM donations WHERE donor_id = d.donor_id)
+          AND NOT EXISTS (SELECT 1 FROM donations
+                          WHERE donor_id = d.donor_id AND donation_date >= ?)
+        ORDER BY donor_id
+    ''', Donor),
+    'events': ('SELECT event_id FROM events WHERE booking_date < ? ORDER BY event_id', Event),
+}
+
+
+def stale_ids(table, before):
+    query, _ = STALE[table]
+    with get_db() as conn:
+        return [row[0] for row in conn.execute(query, (before,))]
+
+
+def archive_stale(table, before, progress=None):
+    """Archive the table's records untouched since before, with their dependent rows.
+
+    Archived donations drop out of donation_totals and the reports until
+    their batch is restored. Returns (records archived, archive batch ids).
+    """
+    _, model = STALE[table]
+    ids = stale_ids(table, before)
+    archived, batches = 0, []
+    for start in range(0, len(ids), ARCHIVE_CHUNK):
+        result = model.delete_many(ids[start:start + ARCHIVE_CHUNK], archive=True)
+        archived += result.removed
+        if result.batch_id is not None:
+            batches.append(result.batch_id)
+        if progress:
+            progress(archived, len(ids))
+    return archived, batches
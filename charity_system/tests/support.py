@@ -0,0 +1,33 @@
+import os
+import tempfile
+import unittest
+
+from database import db_connection
+from database.changes import feed, latest_change_id
+from database_init import create_database
+from models.cache import records
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """Each test runs against a freshly migrated database in a temp directory"""
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._dir.name, 'charity.db')
+        create_database(self.db_path)
+        db_connection.configure(self.db_path)
+        records.clear()
+        with db_connection.get_db() as conn:
+            feed.last_id = latest_change_id(conn)
+
+    def tearDown(self):
+        db_connection.get_pool().close()
+        self._dir.cleanup()
+
+    def add_donor(self, surname='Smith'):
+        from models.donor import Donor
+        return Donor.create('Ann', surname, None, 'AB1 2CD', '1', '01234 567890', 'individual')
+
+    def add_volunteer(self):
+        from models.volunteer import Volunteer
+        return Volunteer.create('Val', 'Jones', '01234 000000', 'val@example.org')
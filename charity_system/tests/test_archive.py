@@ -0,0 +1,27 @@
+from database import archive
+from database.db_connection import get_db
+from models.donation import Donation
+from models.donor import Donor
+from models.event import Event
+from models.volunteer import Volunteer
+from tests.support import DatabaseTestCase
+
+
+class ArchiveRestoreTest(DatabaseTestCase):
+    def test_archived_rows_keep_their_parents(self):
+        donor_id = self.add_donor()
+        volunteer_id = self.add_volunteer()
+        event_id = Event.create('Quiz', 'Hall', '2024-05-01', '19:00', 10, volunteer_id)
+        Donation.create(5, '2024-05-01', 0, None, donor_id, event_id, volunteer_id)
+
+        result = Event.delete_many([event_id], archive=True)
+        self.assertEqual(result.removed, 1)
+        # The archived donation still needs its donor and collector
+        self.assertFalse(Donor.delete(donor_id))
+        self.assertFalse(Volunteer.delete(volunteer_id))
+
+        self.assertEqual(archive.restore(result.batch_id), 2)
+        with get_db() as conn:
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM donations').fetchone()[0], 1)
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM donations_archive').fetchone()[0], 0)
+        self.assertEqual(Event.get_by_id(event_id).event_name, 'Quiz')
@@ -0,0 +1,30 @@
+import json
+import os
+
+from database import partitions
+from database.db_connection import get_db
+from services.bulk_import import import_file
+from tests.support import DatabaseTestCase
+
+
+class ClosedYearImportTest(DatabaseTestCase):
+    def test_rows_in_closed_year_are_rejected(self):
+        volunteer_id = self.add_volunteer()
+        partitions.close_year(2014)
+        source = os.path.join(self._dir.name, 'donations.csv')
+        rejects = os.path.join(self._dir.name, 'rejects.jsonl')
+        with open(source, 'w', encoding='utf-8') as f:
+            f.write('amount,donation_date,first_name,surname,postcode,phone_number,collected_by\n')
+            f.write(f'5.00,2015-01-01,Ann,Smith,AB1 2CD,01234 567890,{volunteer_id}\n')
+            f.write(f'7.50,2015-04-01,Ann,Smith,AB1 2CD,01234 567890,{volunteer_id}\n')
+
+        report = import_file(source, reject_path=rejects)
+
+        self.assertEqual((report.donations_inserted, report.rejected), (1, 1))
+        with open(rejects, encoding='utf-8') as f:
+            rejected = [json.loads(line) for line in f]
+        self.assertEqual([r['line'] for r in rejected], [1])
+        self.assertIn('closed financial year', rejected[0]['error'])
+        with get_db() as conn:
+            self.assertEqual(conn.execute('SELECT donation_date FROM donations').fetchall()[0][0],
+                             '2015-04-01')
@@ -0,0 +1,18 @@
+from models.donation import Donation
+from models.donor import Donor
+from tests.support import DatabaseTestCase
+
+
+class RecordCacheTest(DatabaseTestCase):
+    def test_string_id_sees_update(self):
+        donor_id = self.add_donor()
+        volunteer_id = self.add_volunteer()
+        donation_id = Donation.create(2.92, '2024-05-01', 0, None, donor_id, None, volunteer_id)
+
+        self.assertEqual(Donation.get_by_id(str(donation_id)).amount, 2.92)
+        Donation.update(donation_id, 99, '2024-05-01', 0, None, donor_id, None, volunteer_id)
+        self.assertEqual(Donation.get_by_id(str(donation_id)).amount, 99)
+
+        self.assertEqual(Donor.get_by_id(str(donor_id)).surname, 'Smith')
+        Donor.update(donor_id, 'Ann', 'Brown', None, 'AB1 2CD', '1', '01234 567890', 'individual')
+        self.assertEqual(Donor.get_by_id(str(donor_id)).surname, 'Brown')
@@ -0,0 +1,61 @@
+from database import partitions
+from models.donation import Donation
+from models.donor import Donor
+from services import dedup
+from tests.support import DatabaseTestCase
+
+
+class FindDuplicatesTest(DatabaseTestCase):
+    def add(self, first_name, surname, postcode, phone_number, house_number='1'):
+        return Donor.create(first_name, surname, None, postcode, house_number, phone_number,
+                            'individual')
+
+    def pair_ids(self):
+        return {(pair.keep_id, pair.duplicate_id) for pair in dedup.find_duplicates().pairs}
+
+    def test_phone_punctuation_variants_are_compared(self):
+        first = self.add('Ann', 'Smith', 'AB1 2CD', '(01234) 567890')
+        second = self.add('Ann', 'Smith', 'AB1 2CE', '01234 567890')
+        # Sorts between the two in SQL's punctuation-stripping order
+        self.add('Bob', 'Other', 'ZZ9 9ZZ', '01234 56789')
+        self.assertIn((first, second), self.pair_ids())
+
+    def test_casing_and_postcode_spacing_variants_are_found(self):
+        first = self.add('Ann', 'Smith', 'AB1 2CD', '01234 567890')
+        second = self.add('ANN', 'smith', 'ab12cd', '07000 000000')
+        self.add('Carl', 'Jones', 'AB1 2CD', '01111 111111')
+        self.assertEqual(self.pair_ids(), {(first, second)})
+
+
+class MergeTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.keep_id = self.add_donor()
+        self.duplicate_id = self.add_donor()
+        self.collector = self.add_volunteer()
+
+    def give(self, donor_id, donation_date, amount=10):
+        return Donation.create(amount, donation_date, 0, None, donor_id, None, self.collector)
+
+    def test_merge_moves_donations_and_removes_duplicate(self):
+        self.give(self.keep_id, '2024-05-01')
+        self.give(self.duplicate_id, '2024-06-01', 5)
+
+        self.assertEqual(dedup.merge(self.keep_id, [self.duplicate_id]), (1, 1))
+        self.assertIsNone(Donor.get_by_id(self.duplicate_id))
+        self.assertEqual(Donation.get_total_by_donor(self.keep_id), 15)
+
+    def test_merge_all_counts_removed_donors(self):
+        self.give(self.duplicate_id, '2024-06-01')
+        pairs = dedup.find_duplicates().pairs
+        self.assertEqual(dedup.merge_all(pairs), (1, 1))
+        self.assertIsNone(Donor.get_by_id(self.duplicate_id))
+
+    def test_duplicate_with_closed_year_donations_is_kept(self):
+        self.give(self.duplicate_id, '2014-06-01')
+        self.give(self.duplicate_id, '2024-06-01')
+        partitions.close_year(2014)
+
+        self.assertEqual(dedup.merge(self.keep_id, [self.duplicate_id]), (0, 1))
+        self.assertIsNotNone(Donor.get_by_id(self.duplicate_id))
+        self.assertEqual(Donation.get_total_by_donor(self.keep_id), 10)
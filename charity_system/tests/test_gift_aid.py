@@ -0,0 +1,39 @@
+import os
+from unittest import mock
+
+from models.donation import Donation
+from services import gift_aid
+from tests.support import DatabaseTestCase
+
+
+class CreateClaimTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.out_dir = os.path.join(self._dir.name, 'claims')
+        donor_id = self.add_donor()
+        volunteer_id = self.add_volunteer()
+        for day in range(1, 4):
+            Donation.create(10, f'2024-01-0{day}', 1, None, donor_id, None, volunteer_id)
+
+    def test_claim_files_are_named_after_the_claim(self):
+        report = gift_aid.create_claim('2024-01-01', '2024-03-31', self.out_dir, rows_per_file=2)
+
+        self.assertEqual(report.donation_count, 3)
+        self.assertEqual(sorted(os.listdir(self.out_dir)),
+                         [f'gift_aid_claim_{report.claim_id}_001.csv',
+                          f'gift_aid_claim_{report.claim_id}_002.csv'])
+
+    def test_dry_runs_keep_their_drafts_apart(self):
+        first = gift_aid.create_claim('2024-01-01', '2024-03-31', self.out_dir, dry_run=True)
+        second = gift_aid.create_claim('2024-01-01', '2024-03-31', self.out_dir, dry_run=True)
+
+        self.assertNotEqual(first.files[0].parent, second.files[0].parent)
+        self.assertTrue(all(path.exists() for path in first.files + second.files))
+
+    def test_drafts_are_removed_when_the_claim_is_refused(self):
+        refused = gift_aid.AlreadyClaimed('claimed meanwhile')
+        with mock.patch.object(gift_aid, '_record', side_effect=refused):
+            with self.assertRaises(gift_aid.AlreadyClaimed):
+                gift_aid.create_claim('2024-01-01', '2024-03-31', self.out_dir)
+
+        self.assertEqual(os.listdir(self.out_dir), [])
@@ -0,0 +1,23 @@
+from models.event import Event
+from tests.support import DatabaseTestCase
+
+
+class EventSearchTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        volunteer_id = self.add_volunteer()
+        self.long_name = Event.create('Summer fair with games, cake stall and a quiz', 'Hall',
+                                      '2024-06-01', '10:00', 0, None)
+        self.short_name = Event.create('Quiz', 'Hall', '2024-06-02', '10:00', 0, None)
+        self.organized = Event.create('Bake sale', 'Kitchen', '2024-06-03', '10:00', 0,
+                                      volunteer_id)
+
+    def test_best_match_first(self):
+        events = Event.search('quiz')
+        self.assertEqual([event['event_id'] for event in events],
+                         [self.short_name, self.long_name])
+
+    def test_matches_organizer_and_accepts_limit(self):
+        self.assertEqual([event['event_id'] for event in Event.search('jones')], [self.organized])
+        self.assertEqual(len(Event.search('hall', limit=1)), 1)
+        self.assertEqual(len(Event.search('', limit=2)), 2)
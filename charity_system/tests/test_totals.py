@@ -0,0 +1,14 @@
+from models.donation import Donation
+from tests.support import DatabaseTestCase
+
+
+class DonationTotalsTest(DatabaseTestCase):
+    def test_string_ids_match_integer_keys(self):
+        donor_id = self.add_donor()
+        volunteer_id = self.add_volunteer()
+        Donation.create(10.5, '2024-05-01', 0, None, donor_id, None, volunteer_id)
+
+        self.assertEqual(Donation.get_total_by_donor(donor_id), 10.5)
+        self.assertEqual(Donation.get_total_by_donor(str(donor_id)), 10.5)
+        self.assertEqual(Donation.get_totals('collector', str(volunteer_id))['donation_count'], 1)
+        self.assertEqual(Donation.get_total_by_donor('not an id'), 0.0)